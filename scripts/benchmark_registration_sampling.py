@@ -0,0 +1,53 @@
+import time
+
+import numpy as np
+import SimpleITK as sitk
+
+from src.neuroframe.registrator import Registrator
+
+
+# Known rigid misalignment of a synthetic brain-like volume
+SHAPE = (96, 96, 96)
+TRUE_TRANSFORM = sitk.Euler3DTransform((48, 48, 48), 0.05, -0.08, 0.1, (3.0, -2.0, 4.0))
+CONFIGURATIONS = [
+    ('none', 1.0),
+    ('random', 0.1),
+    ('random', 0.02),
+    ('regular', 0.1),
+    ('regular', 0.02),
+]
+
+
+def build_volumes() -> tuple[sitk.Image, sitk.Image, np.ndarray]:
+    z, y, x = np.indices(SHAPE)
+    brain = ((z - 48) / 30) ** 2 + ((y - 48) / 38) ** 2 + ((x - 48) / 26) ** 2 < 1
+    ventricle = ((z - 52) / 6) ** 2 + ((y - 44) / 14) ** 2 + ((x - 40) / 5) ** 2 < 1
+    fixed = sitk.SmoothingRecursiveGaussian(sitk.GetImageFromArray((brain * 1.0 - ventricle * 0.6).astype(np.float32)), 1.5)
+    moving = sitk.Resample(fixed, TRUE_TRANSFORM.GetInverse(), sitk.sitkLinear, 0.0)
+
+    return fixed, moving, sitk.GetArrayFromImage(sitk.BinaryDilate(sitk.GetImageFromArray(brain.astype(np.uint8)), [3] * 3))
+
+
+def transform_error(transform: sitk.Transform) -> float:
+    # Mean distance (in voxels) between where the found and the true transforms send a grid of points
+    points = np.stack(np.meshgrid(*[np.linspace(20, 76, 5)] * 3), axis=-1).reshape(-1, 3)
+    return float(np.mean([np.linalg.norm(np.subtract(transform.TransformPoint(point), TRUE_TRANSFORM.TransformPoint(point))) for point in points]))
+
+
+def main():
+    fixed, moving, mask = build_volumes()
+
+    print(f"{'strategy':>10} {'percentage':>10} {'mask':>5} {'time (s)':>9} {'error (vx)':>10}")
+    for use_mask in (False, True):
+        for strategy, percentage in CONFIGURATIONS:
+            registrator = Registrator(method='rigid', multiple_resolutions=True, sampling_strategy=strategy, sampling_percentage=percentage)
+
+            start_time = time.time()
+            _, transform = registrator.register(fixed, moving, fixed_mask=mask if use_mask else None)
+            elapsed = time.time() - start_time
+
+            print(f"{strategy:>10} {percentage:>10} {str(use_mask):>5} {elapsed:>9.2f} {transform_error(transform):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
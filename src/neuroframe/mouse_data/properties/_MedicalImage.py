@@ -5,6 +5,7 @@ import os
 
 import numpy as np
 
+from ...utils.cache_utils import fingerprint_array
 
 
 class Properties:
@@ -33,6 +34,9 @@ class Properties:
     @property
     def shape(self): return self.data.shape
 
+    @property
+    def fingerprint(self): return fingerprint_array(self.data)
+
 
 
     # ================================================================
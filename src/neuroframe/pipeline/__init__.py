@@ -4,4 +4,5 @@ from .extract_bl import *
 from .align_bl import *
 from .layer_colapse import *
 from .process_reference import *
+from .ontology import OntologyIndex
 from .extract_frame import stereotaxic_coordinates
@@ -8,7 +8,7 @@ from scipy.ndimage import zoom
 from ..logger import logger
 from ..mouse import Mouse
 from ..mouse_data import Segmentation
-from ..registrator import Registrator
+from ..registrator import Registrator, build_registration_mask, axis_rotation_starts, conversion_cache
 from ..utils import count_voxels, enlarge_shape
 
 # ──────────────────────────────────────────────────────
@@ -17,12 +17,17 @@ from ..utils import count_voxels, enlarge_shape
 ALLEN_TEMPLATE = Segmentation(
     "src/neuroframe/templates/allen_brain_25μm_ccf_2017.nii.gz"
 )
+# Dilation (in voxels) of the brain masks, so that the metric also sees the border of the brain
+MASK_DILATION = 5
+TRANSFORM_CACHE_FOLDER = ".transform_cache"
+# Initial rotations (in degrees, about each axis) of the multi-start registration
+MULTI_START_ANGLE = 15
 
 
 # ================================================================
 # 1. Section: Align the Mouse to the Allen Template
 # ================================================================
-def align_to_allen(mouse: Mouse, template: Segmentation = ALLEN_TEMPLATE) -> Mouse:
+def align_to_allen(mouse: Mouse, template: Segmentation = ALLEN_TEMPLATE, use_masks: bool = True, use_cache: bool = False, multi_start: bool = False, use_icp: bool = False) -> Mouse:
     """Aligns a mouse brain segmentation to a template volume using rigid registration.
 
     This function performs a rigid alignment of a given mouse's segmentation
@@ -39,6 +44,22 @@ def align_to_allen(mouse: Mouse, template: Segmentation = ALLEN_TEMPLATE) -> Mou
     template : Segmentation, optional
         The target segmentation template for alignment. If not provided, the
         default Allen Brain Atlas template (`ALLEN_TEMPLATE`) is used.
+    use_masks : bool, optional
+        If True (default), the registration metric is only evaluated around
+        each brain (the dilated segmentation and template), instead of on the
+        whole field of view.
+    use_cache : bool, optional
+        If True, the transform is stored in a hidden folder of the mouse
+        (`.transform_cache`) and reused when the same mouse is registered
+        again with the same template and parameters. Defaults to False.
+    multi_start : bool, optional
+        If True, the registration is also started from ±15° about each axis
+        (`MULTI_START_ANGLE`) and the start with the best final metric is
+        kept. Useful when the brain was acquired strongly rotated.
+    use_icp : bool, optional
+        If True, the registration starts from the alignment of the surfaces
+        of both binary volumes (trimmed ICP, in seconds) instead of their
+        centers of mass, and the intensity registration only refines it.
 
     Returns
     -------
@@ -108,10 +129,23 @@ def align_to_allen(mouse: Mouse, template: Segmentation = ALLEN_TEMPLATE) -> Mou
     template_volume = adapt_template(mouse, template)
 
     # Does the rigid registration
-    rigid_registration = Registrator(method="rigid", multiple_resolutions=True)
-    _, transform = rigid_registration.register(
-        template_volume, mouse.segmentation.volume
-    )
+    cache_folder = f"{mouse.folder}/{TRANSFORM_CACHE_FOLDER}" if use_cache else None
+    start_rotations = axis_rotation_starts(MULTI_START_ANGLE, 3) if multi_start else None
+    rigid_registration = Registrator(method="rigid", multiple_resolutions=True, cache_folder=cache_folder, start_rotations=start_rotations,
+                                    rigid_type="icp" if use_icp else "moments")
+
+    # Each volume is converted to SimpleITK once (for its mask and for the registration)
+    mouse_volume = mouse.segmentation.volume
+    with conversion_cache():
+        masks = {}
+        if use_masks:
+            masks = {
+                "fixed_mask": build_registration_mask(template_volume, MASK_DILATION),
+                "moving_mask": build_registration_mask(mouse_volume, MASK_DILATION),
+            }
+        _, transform = rigid_registration.register(
+            template_volume, mouse_volume, **masks
+        )
 
     logger.detail(f"Obtained Transform: {transform.GetParameters()}")
 
@@ -345,12 +379,14 @@ def register_mice(
     reg_transform = Registrator(res_interpolator="linear")
     reg_transform_nearest = Registrator(res_interpolator="nearest")
 
-    # Apply the rigid transformation to the template and mice volumes
-    mri_aligned = reg_transform.resample(template, mouse.mri.data, transform)
-    ct_aligned = reg_transform.resample(template, mouse.micro_ct.data, transform)
-    seg_aligned = reg_transform_nearest.resample(
-        template, mouse.segmentation.data, transform
-    )
+    # Apply the rigid transformation to the template and mice volumes (the template is only converted once)
+    with conversion_cache():
+        mri_aligned, ct_aligned = reg_transform.resample_many(
+            template, [mouse.mri.data, mouse.micro_ct.data], transform
+        )
+        seg_aligned = reg_transform_nearest.resample(
+            template, mouse.segmentation.data, transform
+        )
 
     # Convert back to numpy arrays
     mri_aligned = sitk.GetArrayFromImage(mri_aligned)
@@ -5,13 +5,14 @@ import numpy as np
 
 from ..mouse import Mouse
 from ..utils import compute_separation, rotate_mice, transform_points, xy_fine_tune, logg_separation
+from .stereotaxic_step import CoordinateFrame
 
 
 
 # ================================================================
 # 1. Section: Put the Mouse in the Bregma-Lambda Orientation
 # ================================================================
-def align_to_bl(mouse: Mouse, bregma_coords: np.array, lambda_coords: np.array, deviation: int = 5) -> tuple[np.array, np.array]:
+def align_to_bl(mouse: Mouse, bregma_coords: np.array, lambda_coords: np.array, deviation: int = 5, return_frame: bool = False) -> tuple[np.array, np.array] | tuple[np.array, np.array, CoordinateFrame]:
     """Aligns the mouse brain data to the Bregma-Lambda axis.
 
     This function rotates the mouse's MRI and segmentation data so that the
@@ -30,12 +31,16 @@ def align_to_bl(mouse: Mouse, bregma_coords: np.array, lambda_coords: np.array,
     deviation : int, optional
         The maximum deviation in pixels for the fine-tuning alignment in the
         XY plane. If set to 0, fine-tuning is skipped. Default is 5.
+    return_frame : bool, optional
+        If True, also returns the `CoordinateFrame` that converts points between
+        the original voxel, aligned voxel and bregma-lambda spaces. Default is False.
 
     Returns
     -------
     tuple[np.array, np.array]
         A tuple containing the updated integer coordinates of bregma and lambda
-        after the alignment and transformation.
+        after the alignment and transformation (followed by the coordinate frame
+        if `return_frame` is True).
 
     Side Effects
     ------------
@@ -58,7 +63,7 @@ def align_to_bl(mouse: Mouse, bregma_coords: np.array, lambda_coords: np.array,
     >>> # Create a mock Mouse object for demonstration
     >>> mock_mouse = MagicMock()
     >>> mock_mouse.data_shape = (100, 100, 100)
-    >>> mock_mouse.segmentation.volume = np.zeros((100, 100, 100))
+    >>> mock_mouse.segmentation.data = np.zeros((100, 100, 100))
     >>> bregma = np.array([50, 40, 50])
     >>> lambd = np.array([50, 60, 50])
     >>> # This is a conceptual example; real usage requires a valid Mouse object
@@ -72,7 +77,7 @@ def align_to_bl(mouse: Mouse, bregma_coords: np.array, lambda_coords: np.array,
     mri_shape = mouse.data_shape
 
     # Get the current separation (amount of brain in each side of the midline in %)
-    previous_t = logg_separation(mouse.segmentation.volume, "start")
+    previous_t = logg_separation(mouse.segmentation.data, "start")
 
     # Rotate the mice according to the Bregma and Lambda coordinates
     bl_vector = np.array(lambda_coords) - np.array(bregma_coords)
@@ -83,21 +88,24 @@ def align_to_bl(mouse: Mouse, bregma_coords: np.array, lambda_coords: np.array,
     lambda_coords = np.round(transform_points(lambda_coords, mri_shape, rotation_matrix, offset)).astype(int)
 
     # Compute the new separation
-    previous_t = logg_separation(mouse.segmentation.volume, "after BL alignment", previous_t)
+    previous_t = logg_separation(mouse.segmentation.data, "after BL alignment", previous_t)
 
     # Fine tune the alignment in the XY plane
-    if(deviation > 0): bl_fine_tune(mouse, bregma_coords, lambda_coords, deviation)
-        
-    return np.round(bregma_coords).astype(int), np.array(lambda_coords).astype(int)
+    steps = [(rotation_matrix, offset)]
+    if(deviation > 0): steps.append(bl_fine_tune(mouse, bregma_coords, lambda_coords, deviation)[2])
+
+    bregma_coords, lambda_coords = np.round(bregma_coords).astype(int), np.array(lambda_coords).astype(int)
+    if(return_frame): return bregma_coords, lambda_coords, CoordinateFrame.from_steps(bregma_coords, lambda_coords, mouse.voxel_size, steps)
+    return bregma_coords, lambda_coords
 
 
 # ──────────────────────────────────────────────────────
 # 1.1 Subsection: Bregma-Lambda Fine Tuning
 # ──────────────────────────────────────────────────────
-def bl_fine_tune(mouse: Mouse, bregma_coords: np.array, lambda_coords: np.array, deviation: int) -> tuple[np.array, np.array]:
+def bl_fine_tune(mouse: Mouse, bregma_coords: np.array, lambda_coords: np.array, deviation: int) -> tuple[np.array, np.array, tuple[np.array, np.array]]:
     # Extract needed data
     mri_shape = mouse.data_shape
-    previous_t = compute_separation(mouse.segmentation.volume)
+    previous_t = compute_separation(mouse.segmentation.data)
 
     # Fine tune the alignment in the XY plane
     align_matrix, align_offset = xy_fine_tune(mouse, bregma_coords, deviation)
@@ -105,6 +113,6 @@ def bl_fine_tune(mouse: Mouse, bregma_coords: np.array, lambda_coords: np.array,
     lambda_coords = np.round(transform_points(lambda_coords, mri_shape, align_matrix, align_offset)).astype(int)
 
     # Compute the new separation
-    _ = logg_separation(mouse.segmentation.volume, "after BL fine-tuning", previous_t)
+    _ = logg_separation(mouse.segmentation.data, "after BL fine-tuning", previous_t)
 
-    return bregma_coords, lambda_coords
\ No newline at end of file
+    return bregma_coords, lambda_coords, (align_matrix, align_offset)
\ No newline at end of file
@@ -8,7 +8,7 @@ import SimpleITK as sitk
 
 from ..utils import get_z_coord
 from ..logger import logger
-from ..registrator import Registrator, SUTURE_REGISTRATOR, convert_input, apply_shape
+from ..registrator import Registrator, SUTURE_REGISTRATOR, convert_input, build_registration_mask, inverse_transform_point
 from ..mouse import Mouse
 
 
@@ -19,13 +19,16 @@ SUTURE_TEMPLATE = cv2.imread("src/neuroframe/templates/suture_template_t14.png",
 BREGMA_TEMPLATE = convert_input(cv2.imread("src/neuroframe/templates/bregma_template_t14.png", cv2.IMREAD_GRAYSCALE))
 LAMBDA_TEMPLATE = convert_input(cv2.imread("src/neuroframe/templates/lambda_template_t14.png", cv2.IMREAD_GRAYSCALE))
 REF_TEMPLATES = (BREGMA_TEMPLATE, LAMBDA_TEMPLATE)
+# Each landmark is the centroid of its template, as an (x, y) physical point of the suture template
+REF_POINTS = tuple(np.argwhere(sitk.GetArrayFromImage(template) > 0).mean(axis=0)[::-1] for template in REF_TEMPLATES)
+TRANSFORM_CACHE_FOLDER = ".transform_cache"
 
 
 
 # ================================================================
 # 1. Section: Extract Bregma and Lambda Points
 # ================================================================
-def get_bregma_lambda(mouse: Mouse, skull_surface: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+def get_bregma_lambda(mouse: Mouse, skull_surface: np.ndarray, use_cache: bool = False) -> tuple[np.ndarray, np.ndarray]:
     """Computes the 3D coordinates of bregma and lambda on a mouse skull.
     
     This function identifies the bregma and lambda landmarks by applying a
@@ -45,6 +48,10 @@ def get_bregma_lambda(mouse: Mouse, skull_surface: np.ndarray) -> tuple[np.ndarr
     skull_surface : np.ndarray
         A NumPy array representing the skull surface, used to derive the
         deformation map and locate the landmarks.
+    use_cache : bool, optional
+        If True, the suture transform is stored in a hidden folder of the
+        mouse (`.transform_cache`) and reused when the same skull surface is
+        registered again with the same parameters. Defaults to False.
 
     Returns
     -------
@@ -93,17 +100,13 @@ def get_bregma_lambda(mouse: Mouse, skull_surface: np.ndarray) -> tuple[np.ndarr
     >>> # lambda_coords = (105, 400, 255)
     """
     
-    transform = extract_deformation_map(skull_surface)
+    cache_folder = f"{mouse.folder}/{TRANSFORM_CACHE_FOLDER}" if use_cache else None
+    transform = extract_deformation_map(skull_surface, cache_folder=cache_folder)
 
-    # Unpacks the templates
-    bregma_template, lambda_template = REF_TEMPLATES
-    reference_slide = convert_input(mouse.segmentation.volume[100,:,:])
-    bregma_template = apply_shape(reference_slide, bregma_template)
-    lambda_template = apply_shape(reference_slide, lambda_template)
-
-    # Get the bregma and lambda coordinates (x, y)
-    bregma_coords = np.round(get_reference_point(bregma_template, skull_surface, transform)).astype(int)
-    lambda_coords = np.round(get_reference_point(lambda_template, skull_surface, transform)).astype(int)
+    # Get the bregma and lambda coordinates (y, x), mapping the template landmarks to the skull surface
+    bregma_point, lambda_point = REF_POINTS
+    bregma_coords = np.round(get_reference_point(bregma_point, transform)).astype(int)
+    lambda_coords = np.round(get_reference_point(lambda_point, transform)).astype(int)
     
     # Get the z coordinates
     bregma_z = get_z_coord(mouse.micro_ct.data, bregma_coords)
@@ -129,9 +132,10 @@ def get_bregma_lambda(mouse: Mouse, skull_surface: np.ndarray) -> tuple[np.ndarr
 # ──────────────────────────────────────────────────────
 # 1.1 Subsection: Deformation Map Extraction
 # ──────────────────────────────────────────────────────
-def extract_deformation_map(skull_surface: np.ndarray, sutures_registration: Registrator = SUTURE_REGISTRATOR) -> sitk.Transform:    
-    # Bspline registration to the suture template
-    _, sutures_transform = sutures_registration.register(skull_surface, SUTURE_TEMPLATE)
+def extract_deformation_map(skull_surface: np.ndarray, sutures_registration: Registrator = SUTURE_REGISTRATOR, use_mask: bool = True, cache_folder: str | None = None) -> sitk.Transform:    
+    # Bspline registration to the suture template (only evaluated on the skull surface, and reused from the cache if possible)
+    fixed_mask = build_registration_mask(skull_surface) if use_mask else None
+    _, sutures_transform = sutures_registration.register(skull_surface, SUTURE_TEMPLATE, fixed_mask=fixed_mask, cache_folder=cache_folder)
 
     logger.detail(f"Obtained Transform Parameters: {sutures_transform.GetParameters()}")
 
@@ -139,19 +143,14 @@ def extract_deformation_map(skull_surface: np.ndarray, sutures_registration: Reg
 
 
 # ──────────────────────────────────────────────────────
-# 1.2 Subsection: Apply Deformation Map to Reference Templates
+# 1.2 Subsection: Apply Deformation Map to Reference Points
 # ──────────────────────────────────────────────────────
-def get_reference_point(reference_template: np.ndarray | sitk.Image, skull_surface: np.ndarray | sitk.Image, transform: sitk.Transform) -> np.ndarray:
-    # Apply the same transformation to the reference template that was used to get the template
-    resampler = Registrator(res_interpolator = 'nearest')
-    deformed_template = resampler.resample(convert_input(skull_surface), convert_input(reference_template), transform)
-    deformed_template = sitk.GetArrayFromImage(deformed_template)
-
-    # Get the coordinates of the reference points
-    points = np.argwhere(deformed_template > 0)
-    reference_coords = np.mean(points, axis=0)
-    
-    return reference_coords
+def get_reference_point(reference_point: np.ndarray, transform: sitk.Transform) -> np.ndarray:
+    # The transform maps the skull surface to the template, so the template landmark is brought back with its inverse
+    skull_point = inverse_transform_point(transform, reference_point)
+
+    # From an (x, y) point to (row, column) coordinates
+    return skull_point[::-1]
 
 
 # ──────────────────────────────────────────────────────
@@ -9,13 +9,25 @@ import numpy as np
 
 from tqdm import tqdm
 from multiprocessing import Pool
-from scipy.ndimage import label
+from scipy.ndimage import label, distance_transform_edt
 from skimage.filters import threshold_otsu
 from skimage.morphology import ball, opening
-from sklearn.cluster import KMeans
 
 from ..mouse import Mouse
-from ..utils import separate_volume, compute_inner_center
+from ..utils import build_hemisphere_index, trivial_separations, compute_inner_center, crop_to_content, uncrop
+from .stereotaxic_step import SeparationCache, StereotaxicResults, ResultLog
+from .stereotaxic_step.coordinate_frame import BL_AXIS_SIGNS
+from .ontology import OntologyIndex
+
+
+# ──────────────────────────────────────────────────────
+# 0.1 Subsection: Universal Constants
+# ──────────────────────────────────────────────────────
+SEPARATION_CACHE_FOLDER = ".separation_cache"
+MODE_SUFFIXES = {'full_mean': 'MEAN', 'full_inner': 'INNER'}
+OUTPUT_FORMATS = ('csv', 'npz')
+RESULT_LOG_SUFFIX = ".partial.jsonl"
+RESULT_CACHE_NAME = "results.jsonl"
 
 
 
@@ -29,96 +41,227 @@ def stereotaxic_coordinates(
     group_folder: str | None = None,
     is_parallelized: bool = True,
     file_name: str = "stereotaxic_coordinates",
-    mode: str = "full_mean"
-) -> pd.DataFrame:
-
-    # 1. Extracts the needed data
+    mode: str | list[str] = "full_mean",
+    use_cache: bool = False,
+    cache_folder: str | None = None,
+    output_format: str | list[str] = "csv",
+    resume: bool = True,
+    structures: list[int | str] | None = None,
+    include_descendants: bool = False,
+    ontology: OntologyIndex | None = None
+) -> pd.DataFrame | dict[str, pd.DataFrame]:
+
+    # 1. Extracts the needed data (only for the requested structures, if any)
     labels = mouse.segmentation.labels
+    if(structures is not None): labels = select_structures(labels, structures, ontology if ontology is not None else reference_df, include_descendants)
     voxel_size = mouse.voxel_size
     folder = mouse.folder
 
-    # Get the path where the data will be stored
-    if(group_folder is None): results_path = f'{folder}/{file_name}.csv'
-    else: results_path = f"{group_folder}/{mouse.id.lower()}_{file_name}.csv"
+    # Several modes can be computed in the same pass (the separation is shared between them)
+    modes = [mode] if isinstance(mode, str) else list(mode)
+    output_formats = [output_format] if isinstance(output_format, str) else list(output_format)
+    assert_output_formats(output_formats)
 
-    # TODO: Remove this separation
-    hemispheres = separate_volume(mouse.segmentation.data)
+    # Reuse the separations of previous runs on the same segmentation
+    separation_cache = None
+    if(use_cache):
+        if(cache_folder is None): cache_folder = f'{folder}/{SEPARATION_CACHE_FOLDER}'
+        separation_cache = SeparationCache(cache_folder, mouse.segmentation.fingerprint)
+
+    # Each result is logged as soon as it is computed, so an interrupted run can skip the segments already processed
+    # With the cache, the log is kept next to the separations and reused by any later run (and subset of structures)
+    if(use_cache): log_path = f"{separation_cache.folder}/{RESULT_CACHE_NAME}"
+    else: log_path = f"{folder if group_folder is None else group_folder}/{'' if group_folder is None else f'{mouse.id.lower()}_'}{file_name}{RESULT_LOG_SUFFIX}"
+    result_log = ResultLog(log_path, header={'fingerprint': mouse.segmentation.fingerprint, 'voxel_size': [float(size) for size in voxel_size]})
+    if(not resume): result_log.remove()
+    done_results = result_log.load()
+
+    # A segment is done when it has the results of every mode
+    is_done = lambda segment: all(current_mode in done_results.get(int(segment), {}) for current_mode in modes)
+    pending_labels = np.array([segment for segment in labels if not is_done(segment)], dtype=labels.dtype)
+
+    # Index every voxel by its label and side of the midline once (trivial separations are found for all segments at once)
+    hemisphere_index = HemisphereIndex(*build_hemisphere_index(mouse.segmentation.data))
 
     # Calculates the coordinates of the segments in bregma-lambda space (parallelized or not)
-    if(is_parallelized): results = parallelized_process(hemispheres, labels, ref_coords, voxel_size, mode, verbose=0)
-    else: results = non_parallelized_process(mouse, hemispheres, labels, ref_coords, voxel_size, mode, verbose=0)
+    with result_log:
+        if(is_parallelized): new_results = parallelized_process(hemisphere_index, pending_labels, voxel_size, modes, verbose=0, separation_cache=separation_cache, result_log=result_log)
+        else: new_results = non_parallelized_process(mouse, hemisphere_index, pending_labels, voxel_size, modes, verbose=0, separation_cache=separation_cache, result_log=result_log)
+
+    # Assemble the results of every segment (logged and new) in the order of the labels
+    done_results.update({int(next(iter(result.values()))['id']): result for result in new_results})
+    results = [done_results[int(segment)] for segment in labels]
+
+    # Only keep the reference rows of the requested structures
+    if(structures is not None): reference_df = reference_df[reference_df['id'].isin(labels)]
+
+    data_per_mode = {}
+    for current_mode in modes:
+        # Get the path where the data will be stored (one file per mode if several are asked)
+        mode_file_name = file_name if isinstance(mode, str) else f"{file_name}_{MODE_SUFFIXES.get(current_mode, current_mode)}"
+        if(group_folder is None): results_path = f'{folder}/{mode_file_name}'
+        else: results_path = f"{group_folder}/{mouse.id.lower()}_{mode_file_name}"
+
+        # Convert the centroids of every segment at once
+        mode_results = build_results([result[current_mode] for result in results], ref_coords, voxel_size, verbose=0)
+
+        # Save them as a typed columnar file and/or merged into the reference as the legacy CSV
+        if('npz' in output_formats): mode_results.save_npz(f"{results_path}.npz", mouse_id=mouse.id, mode=current_mode)
+        if('csv' in output_formats): data_per_mode[current_mode] = mode_results.to_csv(f"{results_path}.csv", reference_df)
+        else: data_per_mode[current_mode] = reference_df.merge(mode_results.to_legacy_dataframe(), on='id', how='left')
+
+    # The final files are written, so the log is no longer needed (unless it is the result cache)
+    if(not use_cache): result_log.remove()
+
+    if(isinstance(mode, str)): return data_per_mode[mode]
+    return data_per_mode
+
+
+def select_structures(labels: np.ndarray, structures: list[int | str], reference: pd.DataFrame | OntologyIndex, include_descendants: bool = False) -> np.ndarray:
+    """
+    Select the labels of the requested structures (given by id, name or acronym).
+
+    Parameters:
+        labels (np.ndarray): The labels of the segmentation.
+        structures (list[int | str]): Ids, names or acronyms (case insensitive) of the structures.
+        reference (pd.DataFrame | OntologyIndex): Table used to resolve the names (and the subtrees).
+        include_descendants (bool): If True, every structure of the ontology subtree of each requested one is also selected.
+
+    Returns:
+        np.ndarray: The labels (in the segmentation order) of the requested structures.
+    """
+    table = reference.table if isinstance(reference, OntologyIndex) else reference
+
+    # Resolve the names and acronyms to ids
+    structure_ids, unknown = [], []
+    for structure in ([structures] if isinstance(structures, (int, str, np.integer)) else structures):
+        if(not isinstance(structure, str)): structure_ids.append(int(structure)); continue
+
+        is_match = np.zeros(len(table), dtype=bool)
+        for column in ('name', 'acronym'):
+            if column in table.columns: is_match |= (table[column].astype(str).str.lower() == structure.lower()).to_numpy()
+        if not is_match.any(): unknown.append(structure)
+        structure_ids.extend(table['id'].to_numpy()[is_match].astype(int))
+    if unknown: raise ValueError(f"Unknown structures {unknown}")
+
+    # Add the subtree of each structure (the ontology needs every ancestor, so it should be built from the full table)
+    if(include_descendants):
+        ontology = reference if isinstance(reference, OntologyIndex) else OntologyIndex(reference)
+        structure_ids = np.concatenate([ontology.descendants(structure_id) for structure_id in structure_ids] + [structure_ids])
+
+    return labels[np.isin(labels, structure_ids)]
+
+def assert_output_formats(output_formats: list[str]) -> None:
+    unknown_formats = set(output_formats) - set(OUTPUT_FORMATS)
+    if unknown_formats: raise ValueError(f"Unknown output formats {sorted(unknown_formats)}, expected any of {OUTPUT_FORMATS}")
+
+
+
+# ================================================================
+# 2. Section: Hemisphere Index
+# ================================================================
+class HemisphereIndex:
+    """Label x side index of the segmentation, shared by every worker.
+
+        Holds the compact index volume of ``build_hemisphere_index`` (2 * compact_label + side) and
+        whether each label is trivially separated by the midline, so that the workers only build
+        the masks of their segment from a single (small integer) volume.
+    """
+
+    def __init__(self, index: np.ndarray, labels: np.ndarray) -> None:
+        self.index = index
+        self.labels = labels
+        self.is_trivial = trivial_separations(index, len(labels))
 
-    # Create a DataFrame from the list of result dictionaries and merge the results into your original DataFrame
-    res_df = pd.DataFrame(results)
-    data = reference_df.merge(res_df, on='id', how='left')
+    def __repr__(self) -> str:
+        return f"HemisphereIndex(shape={self.index.shape}, labels={len(self.labels)})"
 
-    # Save the updated CSV file
-    data.to_csv(results_path, index=False)
+    def compact_label(self, segment: int) -> int:
+        return int(np.searchsorted(self.labels, segment))
 
-    return data
+    def masks(self, segment: int) -> tuple[np.ndarray, np.ndarray]:
+        # Binary masks of the segment in the left and right side of the midline
+        code = 2 * self.compact_label(segment)
+        return np.where(self.index == code, 1, 0), np.where(self.index == code + 1, 1, 0)
+
+_HEMISPHERE_INDEX: HemisphereIndex | None = None
+
+def _init_worker(hemisphere_index: HemisphereIndex) -> None:
+    # Sent once to each process instead of once per segment
+    global _HEMISPHERE_INDEX
+    _HEMISPHERE_INDEX = hemisphere_index
 
 
 
 # ================================================================
 # 3. Section: Paralelized Processing of Center Coordinates
 # ================================================================
-def parallelized_process(hemispheres: np.ndarray, labels: np.ndarray, ref_coords: tuple, voxel_size: float, mode: str, verbose: int) -> list:
+def parallelized_process(hemisphere_index: HemisphereIndex, labels: np.ndarray, voxel_size: float, modes: list[str], verbose: int, separation_cache: SeparationCache | None = None,
+                         result_log: ResultLog | None = None) -> list:
     """
     Parallelize processing of segments by computing their center coordinates.
 
     This function distributes the computation across multiple processes using a pool
     of workers. It processes each segment from the 'labels' array using the parameters
-    provided, including hemisphere data, reference coordinates, voxel size, and mode,
+    provided, including hemisphere data, voxel size, and modes,
     and returns a list with the computed results.
 
     Parameters:
-        hemispheres (np.ndarray): Array representing hemisphere data.
+        hemisphere_index (HemisphereIndex): Label x side index of the segmentation (sent once to each process).
         labels (np.ndarray): Array of segments (labels) to be processed.
-        ref_coords (tuple): Reference coordinates used for center coordinate calculation.
         voxel_size (float): The size of the voxel used in the computation.
-        mode (str): Processing mode that dictates how the computation is performed.
+        modes (list[str]): Processing modes that dictate how the centroids are computed.
         verbose (int): Verbosity level for printing progress and timing information.
+        separation_cache (SeparationCache | None): Cache with the separations of previous runs.
+        result_log (ResultLog | None): Log where each result is appended as soon as its worker finishes.
 
     Returns:
-        list: A list of computed center coordinates for each segment.
+        list: A list with, for each segment, a dictionary of the computed coordinates per mode.
     """
     if(verbose >= 2): print(f"    🔄 Starting PARALLELIZED processing of {len(labels)} segments...")
-    args_list = [(segment, hemispheres, ref_coords, voxel_size, mode, verbose) for segment in labels]
+    args_list = [(segment, voxel_size, modes, verbose, separation_cache) for segment in labels]
 
     start_time = time.time()
-    with Pool() as pool:
-        results = list(tqdm(pool.imap_unordered(center_coord_worker, args_list), total=len(args_list)))
+    results = []
+    with Pool(initializer=_init_worker, initargs=(hemisphere_index,)) as pool:
+        for result in tqdm(pool.imap_unordered(center_coord_worker, args_list), total=len(args_list)):
+            if(result_log is not None): result_log.append(result)
+            results.append(result)
     if(verbose >= 2): print(f"    ✅ Processed {len(labels)} segments in {time.time() - start_time:.2f} s.\n")
 
     return results
 
-def non_parallelized_process(mouse: Mouse, hemispheres: np.ndarray, labels: np.ndarray, ref_coords: tuple, voxel_size: float, mode: str, verbose: int) -> list:
+def non_parallelized_process(mouse: Mouse, hemisphere_index: HemisphereIndex, labels: np.ndarray, voxel_size: float, modes: list[str], verbose: int, separation_cache: SeparationCache | None = None,
+                             result_log: ResultLog | None = None) -> list:
     """
     Process segments in a non-parallelized manner using the center_coord_worker.
     It processes each segment from the 'labels' array using the parameters
-    provided, including hemisphere data, reference coordinates, voxel size, and mode,
+    provided, including hemisphere data, voxel size, and modes,
     and returns a list with the computed results.
 
     Parameters:
         mice (Mice): The Mice object containing necessary data for processing.
-        hemispheres (np.ndarray): An array indicating the hemispheres information.
+        hemisphere_index (HemisphereIndex): Label x side index of the segmentation.
         labels (np.ndarray): An array of segments to be processed.
-        ref_coords (tuple): A tuple of reference coordinates.
         voxel_size (float): The voxel size to be used in the processing.
-        mode (str): Mode identifier that controls specific processing behavior.
+        modes (list[str]): Mode identifiers that control how the centroids are computed.
         verbose (int): Verbosity level that dictates the amount of logging information.
+        separation_cache (SeparationCache | None): Cache with the separations of previous runs.
+        result_log (ResultLog | None): Log where each result is appended as soon as it is computed.
 
     Returns:
-        list: A list of dictionaries, each containing the processing results for a segment.
+        list: A list with, for each segment, a dictionary of the processing results per mode.
     """
     if(verbose >= 2): print(f"    🔄 Starting NON-PARALLELIZED processing of {len(labels)} segments...")
     results = []
 
     start_time = time.time()
+    _init_worker(hemisphere_index)
     for segment in labels:
         # Gets the dictionary with all coordinates of a given segment
-        args_item = (segment, hemispheres, ref_coords, voxel_size, mode, verbose)
+        args_item = (segment, voxel_size, modes, verbose, separation_cache)
         result_dict: dict = center_coord_worker(args_item)
+        if(result_log is not None): result_log.append(result_dict)
         results.append(result_dict)
 
     if(verbose >= 2): print(f"    ✅ Processed {len(labels)} segments in {time.time() - start_time:.2f} s.\n")
@@ -128,120 +271,194 @@ def center_coord_worker(args: tuple) -> dict:
     """
     Compute the center coordinates of a given segment across two hemispheres.
     This function creates binary masks for the left and right hemispheres based on
-    the provided segment and then computes the center of the segment by calling
-    an external function, extract_coords. The processing behavior can be modified
-    using the mode parameter, and verbose output is optionally printed.
+    the provided segment, separates them once (or loads the separation from the cache)
+    and then computes the center of the segment for every mode by calling
+    an external function, extract_coords. Verbose output is optionally printed.
 
     Parameters:
         args (tuple): A tuple containing the following elements
             - segment: The identifier for the segment.
-            - hemispheres: A tuple of two numpy arrays corresponding to the left and
-              right hemisphere data.
-            - ref_coords: Reference coordinates used in the center extraction process.
-            - voxel_size: The size of the voxel used for scaling the coordinates.
-            - mode: The mode specifying how the center should be computed.
+            - voxel_size: The size of the voxel (used as sampling by the inner center).
+            - modes: The modes specifying how the center should be computed.
             - verbose: An integer controlling the verbosity of the output (e.g., debug information).
+            - separation_cache: The SeparationCache to read from and write to (or None).
 
     Returns:
-        dict: A dictionary containing the segment identifier ('id') and the computed
-        center coordinates along with any additional data returned by extract_coords.
+        dict: A dictionary with, for each mode, a dictionary containing the segment
+        identifier ('id') and the voxel centroids and volumes returned by extract_coords.
     """
-    segment, hemispheres, ref_coords, voxel_size, mode, verbose = args
+    segment, voxel_size, modes, verbose, separation_cache = args
     if(verbose >= 5): print(f"                → Processing segment {segment}...")
 
-    # Create binary mask for each hemisphere of the segment
-    left_hemisphere = np.where(hemispheres[0] == segment, 1, 0)
-    right_hemisphere = np.where(hemispheres[1] == segment, 1, 0)
+    # Create binary mask for each hemisphere of the segment (from the index set by _init_worker)
+    left_hemisphere, right_hemisphere = _HEMISPHERE_INDEX.masks(segment)
+    is_trivial = bool(_HEMISPHERE_INDEX.is_trivial[_HEMISPHERE_INDEX.compact_label(segment)])
 
-    # Create a dictionary to store the results
-    rec = {'id': segment}
+    # Create a dictionary to store the results of each mode
+    recs = {mode: {'id': segment} for mode in modes}
 
     try:
-        # Compute the center of the segment. First check if it is separable, then compute the center accordingly
-        rec = extract_coords((left_hemisphere, right_hemisphere), rec, ref_coords, voxel_size, mode, verbose)
+        # Separate the segment once, then compute the center of every mode from that separation
+        separation = get_separation(segment, (left_hemisphere, right_hemisphere), separation_cache, verbose, is_trivial)
+        for mode in modes: recs[mode] = extract_coords((left_hemisphere, right_hemisphere), recs[mode], voxel_size, mode, verbose, separation)
     except Exception as e:
         if(verbose >= 2):
             print(f"    🚨 Error processing segment {segment}: {e}")
             print(f"    🚨 Running segment with higher verbosity for debugging")
             try:
-                rec = extract_coords((left_hemisphere, right_hemisphere), rec, ref_coords, voxel_size, mode, verbose=10)
+                for mode in modes: recs[mode] = extract_coords((left_hemisphere, right_hemisphere), recs[mode], voxel_size, mode, verbose=10)
             except Exception as e:
                 print(f"    🚨 Error processing segment {segment} with high verbosity: {e}")
 
-    return rec
+    return recs
+
+def get_separation(segment: int, hemispheres: tuple, separation_cache: SeparationCache | None, verbose: int, is_trivial: bool | None = None) -> tuple:
+    """
+    Get the separated hemispheres of a segment, from the cache when available.
+
+    The separations that can be rebuilt from the midline split ('Trivial' and
+    'Not separable') only store their method in the cache.
+
+    Parameters:
+        segment (int): The identifier for the segment.
+        hemispheres (tuple): The binary masks of the segment in each side of the midline.
+        separation_cache (SeparationCache | None): Cache with the separations of previous runs.
+        verbose (int): Verbosity level.
+        is_trivial (bool | None): Whether the midline separates the segment (computed if None).
 
+    Returns:
+        tuple: A tuple containing
+            - tuple: The binary masks of the left and right hemispheres.
+            - str: The separation method used.
+    """
+    cached = separation_cache.load(segment) if separation_cache is not None else None
 
+    # Rebuild the separation from the cache
+    if(cached is not None):
+        separation_method, separated_hemispheres = cached
+        if(verbose >= 8): print(f"                            💾 Separation loaded from cache ({separation_method})")
+        if(separation_method == 'Trivial'): separated_hemispheres = hemispheres
+        elif(separation_method == 'Not separable'): separated_hemispheres = (hemispheres[0] + hemispheres[1],) * 2
+        return separated_hemispheres, separation_method
 
+    # Separate the segment and store the separation
+    separated_hemispheres, separation_method = separate_hemispheres(hemispheres, verbose, is_trivial)
+    if(separation_cache is not None):
+        is_rebuildable = separation_method in ('Trivial', 'Not separable')
+        separation_cache.save(segment, separation_method, None if is_rebuildable else separated_hemispheres)
 
+    return separated_hemispheres, separation_method
 
-# ================================================================
-# 4. Section: Each Segement Center Coordinates Extraction
-# ================================================================
-def extract_coords(hemispheres: tuple, rec: dict, ref_coords: np.ndarray, voxel_size: float, mode: str, verbose: int) -> dict:
-    # Extract the centroids in voxel and um coordinates
-    centroids, volumes_sizes, separation_method = get_centroid(hemispheres, mode, verbose=verbose)
-    ref_centroids, volumes_um = convert_to_ref(centroids, ref_coords, voxel_size, volumes_sizes, verbose=verbose)
 
-    # Unpack the centroids
-    left_centroid, right_centroid = centroids
-    left_ref_centroid, right_ref_centroid = ref_centroids
 
-    # Extract the statistics for the um coordinates
-    mean_um, std_um, ste_um = extract_statistics(ref_centroids, verbose=verbose)
 
-    # Reorder from [z, y, x] to [x, y, z]
-    left_ref_centroid, right_ref_centroid, mean_um, std_um, ste_um = map(lambda coords: reorder_coords(coords, 3), [left_ref_centroid,
-                                                                                                                    right_ref_centroid, mean_um, std_um, ste_um])
-    left_centroid, right_centroid = map(lambda coords: reorder_coords(coords, 0), [left_centroid, right_centroid])
 
-    # Update the dictionary with the computed values
+# ================================================================
+# 4. Section: Each Segement Center Coordinates Extraction
+# ================================================================
+def extract_coords(hemispheres: tuple, rec: dict, voxel_size: float, mode: str, verbose: int, separation: tuple | None = None) -> dict:
+    # Extract the centroids in voxel coordinates (the conversion to um is done for all segments in build_results)
+    centroids, volumes_sizes, separation_method = get_centroid(hemispheres, mode, verbose=verbose, separation=separation, voxel_size=voxel_size)
+
+    # Update the dictionary with the computed values ([z, y, x] order)
     rec.update({
         'Separation Method': separation_method,
-        'xyz (um) - L': left_ref_centroid, 'xyz (um) - R': right_ref_centroid, 'mean xyz (um)': mean_um, 'ste xyz (um)': ste_um, 'std xyz (um)': std_um,
-        'volume (um^3) - L': volumes_um[0], 'volume (um^3) - R': volumes_um[1],
-        'xyz (voxel) - L': left_centroid, 'xyz (voxel) - R': right_centroid,
-        'volume (voxel) - L': volumes_sizes[0], 'volume (voxel) - R': volumes_sizes[1]
+        'centroids': np.array(centroids, dtype=float),
+        'volumes': np.array(volumes_sizes, dtype=float)
     })
 
     return rec
 
+def build_results(records: list[dict], ref_coords: tuple, voxel_size: float, verbose: int) -> StereotaxicResults:
+    """
+    Gather the records of every segment into a StereotaxicResults, converting the
+    coordinates to the bregma-lambda space and computing their statistics in one go.
+
+    Parameters:
+        records (list[dict]): The records returned by extract_coords (segments that failed only have their 'id').
+        ref_coords (tuple): A tuple containing the bregma and lambda coordinates.
+        voxel_size (float): The size of a voxel in micrometers.
+        verbose (int): Verbosity level.
+
+    Returns:
+        StereotaxicResults: The coordinates, statistics and volumes of every segment.
+    """
+    # Stack the voxel centroids and volumes of each segment, as (N, 2, 3) and (N, 2) arrays
+    ids = np.array([rec['id'] for rec in records], dtype=np.int64)
+    is_valid = np.array(['centroids' in rec for rec in records], dtype=bool)
+    separation_methods = np.array([rec.get('Separation Method', '') for rec in records], dtype=str)
+    centroids = np.full((len(records), 2, 3), np.nan)
+    volumes_sizes = np.full((len(records), 2), np.nan)
+    if(is_valid.any()):
+        centroids[is_valid] = np.stack([rec['centroids'] for rec in records if 'centroids' in rec])
+        volumes_sizes[is_valid] = np.stack([rec['volumes'] for rec in records if 'volumes' in rec])
+
+    # Convert the centroids to um and extract the statistics for all segments at once
+    ref_centroids, volumes_um = np.full_like(centroids, np.nan), np.full_like(volumes_sizes, np.nan)
+    mean_um, std_um, ste_um = (np.full((len(records), 3), np.nan) for _ in range(3))
+    if(is_valid.any()):
+        ref_centroids[is_valid], volumes_um[is_valid] = convert_to_ref(centroids[is_valid], ref_coords, voxel_size, volumes_sizes[is_valid], verbose=verbose)
+        mean_um[is_valid], std_um[is_valid], ste_um[is_valid] = extract_statistics(ref_centroids[is_valid], verbose=verbose)
+
+    # Reorder from [z, y, x] to [x, y, z]
+    ref_centroids, centroids, mean_um, std_um, ste_um = map(lambda coords: np.ascontiguousarray(coords[..., ::-1]), [ref_centroids, centroids, mean_um, std_um, ste_um])
+
+    return StereotaxicResults(
+        id=ids, separation_method=separation_methods,
+        xyz_um_left=ref_centroids[:, 0], xyz_um_right=ref_centroids[:, 1], xyz_um_mean=mean_um, xyz_um_std=std_um, xyz_um_ste=ste_um,
+        volume_um_left=volumes_um[:, 0], volume_um_right=volumes_um[:, 1],
+        xyz_voxel_left=centroids[:, 0], xyz_voxel_right=centroids[:, 1],
+        volume_voxel_left=volumes_sizes[:, 0], volume_voxel_right=volumes_sizes[:, 1]
+    )
+
 
 
 # ──────────────────────────────────────────────────────
 # 4.1 Subsection: Each Segement Center Coordinates Extraction - Centroid
 # ──────────────────────────────────────────────────────
-def get_centroid(hemispheres: np.ndarray, mode: str, verbose: int):
+def get_centroid(hemispheres: np.ndarray, mode: str, verbose: int, separation: tuple | None = None, voxel_size: float | tuple | None = None):
     if(verbose >= 6): print(f"                    Extracting the Centroid Coordinates")
 
+    # Separate the hemispheres (unless an already computed separation is given)
+    if(separation is None): separation = separate_hemispheres(hemispheres, verbose)
+    separated_hemispheres, separation_method = separation
+
+    # Compute the centroids according to the mode
+    centroids, volumes_sizes = mode_centroid_calculation(separated_hemispheres, mode, voxel_size)
+
+    return centroids, volumes_sizes, separation_method
+
+def separate_hemispheres(hemispheres: np.ndarray, verbose: int, is_trivial: bool | None = None) -> tuple:
     # Extract the hemispheres and other data
     left_hemisphere, right_hemisphere = hemispheres
     volume = left_hemisphere + right_hemisphere
-    midline_x = left_hemisphere.shape[2] // 2
 
-    # Check if any of the hemispheres is empty, by counting the non-zero elements
-    hemisphere_not_empty = (np.count_nonzero(left_hemisphere) != 0) and (np.count_nonzero(right_hemisphere) != 0)
+    # The trivial check may already be done for every segment at once (see HemisphereIndex)
+    if(is_trivial is None):
+        midline_x = left_hemisphere.shape[2] // 2
 
-    # Check if the midline cuts any segment
-    is_cut = (np.count_nonzero(volume[:, :, midline_x]) != 0)
+        # Check if any of the hemispheres is empty, by counting the non-zero elements
+        hemisphere_not_empty = (np.count_nonzero(left_hemisphere) != 0) and (np.count_nonzero(right_hemisphere) != 0)
 
-    # Debugging output
-    if(verbose >= 7):
-        print(f"                        ? Is the Hemisphere Empty? {not hemisphere_not_empty}")
-        print(f"                        ? Is the Midline Cutting the Segments? {is_cut}")
-        print(f"                        ? Inspecting separation: Left: {np.count_nonzero(left_hemisphere)} — Right: {np.count_nonzero(right_hemisphere)}")
+        # Check if the midline cuts any segment
+        is_cut = (np.count_nonzero(volume[:, :, midline_x]) != 0)
+
+        # Debugging output
+        if(verbose >= 7):
+            print(f"                        ? Is the Hemisphere Empty? {not hemisphere_not_empty}")
+            print(f"                        ? Is the Midline Cutting the Segments? {is_cut}")
+            print(f"                        ? Inspecting separation: Left: {np.count_nonzero(left_hemisphere)} — Right: {np.count_nonzero(right_hemisphere)}")
+
+        is_trivial = hemisphere_not_empty and not is_cut
 
     # Because the separation is clean, just use midline for trivial separation
-    if hemisphere_not_empty and not is_cut:
+    if is_trivial:
         if(verbose >= 8): print("                            😁 Trivial separated centroids")
-        centroids, volumes_sizes = mode_centroid_calculation(hemispheres, mode)
-        separation_method = 'Trivial'
+        return hemispheres, 'Trivial'
 
     # This handles the other cases (separable, non separable, and complex separations)
-    else:
-        if(verbose >= 8): print("                            😅 Separation was not trivial, complex approach needed")
-        centroids, volumes_sizes, separation_method = complex_separated_centroids(volume, mode, verbose)
-
-    return centroids, volumes_sizes, separation_method
+    if(verbose >= 8): print("                            😅 Separation was not trivial, complex approach needed")
+    return complex_separation(volume, verbose)
 
 def get_centroid_tip(hemispheres: np.ndarray, mode: str, verbose: int, tip: str):
     # Extract the hemispheres and other data
@@ -266,19 +483,16 @@ def get_centroid_tip(hemispheres: np.ndarray, mode: str, verbose: int, tip: str)
     return centroids, volumes_sizes
 
 
-def complex_separated_centroids(volume: np.ndarray, mode: str, verbose: int) -> tuple:
+def complex_separation(volume: np.ndarray, verbose: int) -> tuple:
     # Assess if is true separable, if they are it rebuilds the hemispheres
     hemispheres, separation_method = evaluate_cluster_separability(volume, verbose=verbose)
 
-    # if not separable, send it and classify it the same for the left and right
-    if(not isinstance(hemispheres, tuple)): centroids, volumes_sizes = mode_centroid_calculation((hemispheres, hemispheres), mode)
-
-    # If true separable then send both of the hemispheres to the compute_inner_center function
-    else: centroids, volumes_sizes = mode_centroid_calculation(hemispheres, mode)
+    # if not separable, classify it the same for the left and right
+    if(not isinstance(hemispheres, tuple)): hemispheres = (hemispheres, hemispheres)
 
-    return centroids, volumes_sizes, separation_method
+    return hemispheres, separation_method
 
-def mode_centroid_calculation(hemispheres: tuple, mode: str) -> tuple:
+def mode_centroid_calculation(hemispheres: tuple, mode: str, voxel_size: float | tuple | None = None) -> tuple:
     """
     Calculates the centroids and volume sizes of the left and right hemispheres
     based on the specified mode.
@@ -289,6 +503,7 @@ def mode_centroid_calculation(hemispheres: tuple, mode: str) -> tuple:
         mode (str): A string specifying the calculation mode. Supported modes include
             - 'full_inner': Calculates the centroid using the inner center method.
             - 'full_mean': Calculates the centroid as the mean of the indices of non-zero elements.
+        voxel_size (float | tuple | None): Voxel size used as sampling by the inner center method.
 
     Returns:
         tuple: A tuple containing
@@ -300,8 +515,9 @@ def mode_centroid_calculation(hemispheres: tuple, mode: str) -> tuple:
 
     # Compute the center of the left and right hemisphere according to the mode
     if(mode == 'full_inner'):
-        left_centroid = compute_inner_center(left_hemisphere)
-        right_centroid = compute_inner_center(right_hemisphere)
+        # Each hemisphere is cropped to its own bounding box (not separable segments use the same volume for both)
+        left_centroid = compute_inner_center(left_hemisphere, voxel_size=voxel_size)
+        right_centroid = left_centroid.copy() if left_hemisphere is right_hemisphere else compute_inner_center(right_hemisphere, voxel_size=voxel_size)
     elif(mode == 'full_mean'):
         left_centroid = np.mean(np.argwhere(left_hemisphere), axis=0)
         right_centroid = np.mean(np.argwhere(right_hemisphere), axis=0)
@@ -361,17 +577,20 @@ def evaluate_cluster_separability(volume: np.ndarray, verbose: int):
 # ››››››››››››››››››››››››››››››››››››››››››››››››
 # 4.1.2 Sub-subsection: Complex Separated Centroids - Clustering Approach
 # ›››››››››››››››››››››››››››››››››››››››››››››››››
-def try_clustering_hemispheres(volume: np.ndarray, verbose:int, nr_centers: int = 30) -> np.ndarray:
+def try_clustering_hemispheres(volume: np.ndarray, verbose:int, nr_centers: int = 30, max_samples: int = 20000, seed: int = 0) -> np.ndarray:
     """
     This function attempts to segment a volume into hemispheres by generating multiple sets of initial
     cluster centers based on lateralized means and performing k-means clustering on each set.
-    It verifies that the clustering satisfies the lateralized condition. If a valid clustering is found,
-    the hemispheres are built from the clustering labels and returned. Otherwise, the original volume
-    is returned.
+    Every set of centers is fitted at once (batched Lloyd iterations) on a stratified subsample of the
+    voxels, and the first set that satisfies the lateralized condition is used to assign every voxel
+    to its closest center. If a valid clustering is found, the hemispheres are built from the clustering
+    labels and returned. Otherwise, the original volume is returned.
 
     Parameters:
         volume (np.ndarray): A numpy array representing the volume to be segmented.
-        nr_centers (int): The number of cluster centers to generate. Default value is 20.
+        nr_centers (int): The number of cluster centers to generate. Default value is 30.
+        max_samples (int): Maximum number of voxels used to fit the clusters. Default value is 20000.
+        seed (int): Seed for the initial centers and the subsample, making the clustering deterministic.
     Returns:
         np.ndarray: An array with the segmented hemispheres if a valid lateralized clustering is found,
                     or the original volume if no valid clustering is achieved.
@@ -380,15 +599,18 @@ def try_clustering_hemispheres(volume: np.ndarray, verbose:int, nr_centers: int
     if(np.count_nonzero(volume) <= 1): return volume
 
     # Generates a set of initial starting points based on the lateralized means
-    random_centers = generate_initial_centers(volume, nr_centers=nr_centers)
+    random_centers = generate_initial_centers(volume, nr_centers=nr_centers, seed=seed)
 
-    # Loop until the centers obtained follow the lateralized condition
-    for centers in random_centers:
-        # Perform kmeans
-        cluster_centers, cluster_labels, is_centers_found = perform_kmeans(volume, centers)
+    # Perform kmeans for every set of centers on a subsample of the voxels
+    voxel_coords = np.argwhere(volume)
+    sampled_coords = stratified_subsample(voxel_coords, max_samples, seed=seed)
+    fitted_centers = perform_batched_kmeans(sampled_coords, random_centers)
 
-        if(is_centers_found):
+    # Go through the fitted centers until one follows the lateralized condition
+    for cluster_centers in fitted_centers:
+        if(check_lateralization_condition(cluster_centers)):
             if(verbose >= 8): print(f"                            🤓 KMeans clustering method found separation! → Most Complex but Separable")
+            cluster_labels = assign_to_closest_center(voxel_coords, cluster_centers)
             labeled_array = build_hemispheres_from_clustering(volume, cluster_labels)
             return labeled_array
 
@@ -427,39 +649,126 @@ def build_hemispheres_from_clustering(volume: np.ndarray, cluster_labels: np.nda
 
     return reconstruced_volume
 
-def perform_kmeans(volume: np.ndarray, centers: np.ndarray | list) -> tuple:
+def perform_batched_kmeans(points: np.ndarray, centers: np.ndarray, tol: float = 1e-2, max_iter: int = 300) -> np.ndarray:
     """
-    Perform k-means clustering on a non-zero volume and check lateralization of the resulting cluster centers.
+    Perform two-cluster k-means (Lloyd iterations) for several sets of initial centers at once.
 
-    This function adapts the input volume by extracting the indices of its non-zero elements,
-    performs k-means clustering with a fixed number of clusters and provided initial centroids,
-    and then evaluates whether the calculated cluster centers satisfy a lateralization condition.
+    Each set of centers is updated independently and stops once the squared shift of its centers is
+    below the tolerance (relative to the mean variance of the points, as in sklearn's KMeans) or its
+    labels stop changing. Empty clusters are moved to the point furthest from its center.
 
     Parameters:
-        volume (np.ndarray): A multidimensional NumPy array representing the input volume data.
-        centers (np.ndarray | list): Initial centroids for the k-means algorithm.
+        points (np.ndarray): An (N, 3) array with the coordinates to cluster.
+        centers (np.ndarray): An (S, 2, 3) array with the S sets of initial centers.
+        tol (float): Relative tolerance used to declare convergence. Default value is 1e-2.
+        max_iter (int): Maximum number of Lloyd iterations. Default value is 300.
 
     Returns:
-        tuple: A tuple containing
-            - np.ndarray: The cluster centers computed by k-means.
-            - np.ndarray: The labels assigned to each point in the volume by k-means.
-            - bool: True if the cluster centers meet the lateralization condition, False otherwise.
+        np.ndarray: An (S, 2, 3) array with the fitted centers of each set.
     """
-    # prepares the volume for kmeans
-    kmeans = KMeans(n_clusters=2, init=centers, n_init=1, tol=1e-2)
-    adapted_vol = np.argwhere(volume)
+    points = np.asarray(points, dtype=float)
+    centers = np.array(centers, dtype=float)
+    tolerance = np.mean(np.var(points, axis=0)) * tol
+
+    labels = None
+    is_active = np.ones(len(centers), dtype=bool)
+    for _ in range(max_iter):
+        # Assign every point to the closest center of each set, shape (N, S)
+        new_labels = assign_to_closest_center(points, centers)
+
+        # Recompute the centers from the sums of the points of each cluster
+        counts_second = new_labels.sum(axis=0)
+        counts_first = len(points) - counts_second
+        sums_second = new_labels.T.astype(float) @ points
+        sums_first = points.sum(axis=0) - sums_second
+
+        # Empty clusters are moved to the point furthest from its center (as sklearn's KMeans does)
+        for set_index in np.flatnonzero((counts_first == 0) | (counts_second == 0)):
+            set_labels = new_labels[:, set_index]
+            distances = ((points - centers[set_index][set_labels])**2).sum(axis=1)
+            furthest_point = points[np.argmax(distances)]
+
+            moving_sign = 1 if counts_second[set_index] == 0 else -1
+            sums_second[set_index] += moving_sign * furthest_point
+            counts_second[set_index] += moving_sign
+            sums_first[set_index] -= moving_sign * furthest_point
+            counts_first[set_index] -= moving_sign
+
+        new_centers = centers.copy()
+        new_centers[:, 0] = sums_first / counts_first[:, None]
+        new_centers[:, 1] = sums_second / counts_second[:, None]
+
+        # Only the sets that did not converge yet are updated
+        center_shift = ((new_centers - centers)**2).sum(axis=(1, 2))
+        centers[is_active] = new_centers[is_active]
+
+        is_converged = center_shift <= tolerance
+        if(labels is not None): is_converged |= np.all(new_labels == labels, axis=0)
+        is_active &= ~is_converged
+        labels = new_labels
+
+        if(not np.any(is_active)): break
+
+    return centers
+
+def assign_to_closest_center(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """
+    Assign points to the closest of two centers, for one or several sets of centers.
+
+    A point is closer to the second center when its projection on the line between both centers
+    lies past their midpoint, so the assignment is a single matrix product.
+
+    Parameters:
+        points (np.ndarray): An (N, 3) array with the coordinates to assign.
+        centers (np.ndarray): A (2, 3) array with one set of centers, or an (S, 2, 3) array with S sets.
+
+    Returns:
+        np.ndarray: The labels (0 or 1) with shape (N,) for a single set, or (N, S) for S sets.
+    """
+    centers = np.asarray(centers, dtype=float)
+    first_centers, second_centers = centers[..., 0, :], centers[..., 1, :]
+
+    # Direction between the centers and the projection of their midpoint
+    direction = second_centers - first_centers
+    midpoint_projection = ((second_centers**2).sum(axis=-1) - (first_centers**2).sum(axis=-1)) / 2
 
-    # Performs kmeans clustering on the adapted volume
-    kmeans.fit(adapted_vol)
+    labels = (np.asarray(points, dtype=float) @ direction.T) > midpoint_projection
+    return labels.astype(int)
 
-    # Extract the data from the kmeans clustering
-    cluster_labels = kmeans.labels_
-    cluster_centers = kmeans.cluster_centers_
+def stratified_subsample(coords: np.ndarray, max_samples: int, nr_strata: int = 16, seed: int = 0) -> np.ndarray:
+    """
+    Subsample voxel coordinates keeping the proportion of voxels along the lateral (x) axis.
+
+    The coordinates are split in slabs along the x-axis and each slab is sampled proportionally
+    to its size, so both hemispheres keep their weight in the clustering.
+
+    Parameters:
+        coords (np.ndarray): An (N, 3) array with the voxel coordinates.
+        max_samples (int): Maximum number of coordinates to keep.
+        nr_strata (int): Number of slabs along the x-axis. Default value is 16.
+        seed (int): Seed for the random generator. Default value is 0.
+
+    Returns:
+        np.ndarray: The subsampled coordinates (all of them if there are fewer than max_samples).
+    """
+    if(len(coords) <= max_samples): return coords
+    rng = np.random.default_rng(seed)
+
+    # Split the coordinates in slabs along the x-axis
+    edges = np.linspace(coords[:, 2].min(), coords[:, 2].max() + 1, nr_strata + 1)
+    strata = np.clip(np.searchsorted(edges, coords[:, 2], side='right') - 1, 0, nr_strata - 1).astype(np.int16)
+
+    # Number of samples to keep in each slab
+    strata_sizes = np.bincount(strata, minlength=nr_strata)
+    strata_samples = np.round(strata_sizes * max_samples / len(coords)).astype(int)
+    strata_starts = np.concatenate([[0], np.cumsum(strata_sizes)[:-1]])
 
-    # Check lateralization condition
-    is_correct_cluster_centers = check_lateralization_condition(cluster_centers)
+    # Group the coordinates by slab and randomly pick the samples of each one
+    order = np.argsort(strata, kind='stable')
+    selected = [order[start + rng.choice(size, nr_samples, replace=False)]
+                for start, size, nr_samples in zip(strata_starts, strata_sizes, strata_samples)]
 
-    return cluster_centers, cluster_labels, is_correct_cluster_centers
+    return coords[np.sort(np.concatenate(selected))]
 
 def check_lateralization_condition(centers: np.ndarray) -> bool:
     """
@@ -490,7 +799,7 @@ def check_lateralization_condition(centers: np.ndarray) -> bool:
 
     return False
 
-def generate_initial_centers(volume: np.ndarray, nr_centers: int = 20, range_val: int = 15) -> np.ndarray:
+def generate_initial_centers(volume: np.ndarray, nr_centers: int = 20, range_val: int = 15, seed: int | None = None) -> np.ndarray:
     """
     Generate initial centers for segmenting a 3D volume.
     This function computes the mean coordinates of all non-zero elements in the volume
@@ -502,11 +811,14 @@ def generate_initial_centers(volume: np.ndarray, nr_centers: int = 20, range_val
         volume (numpy.ndarray): A 3D array representing the volume data.
         nr_centers (int, optional): The number of centers to generate (default is 20). Note that
             the algorithm starts with two centers and updates them iteratively with random offsets.
+        seed (int | None, optional): Seed for the random offsets (default is None, not reproducible).
 
     Returns:
         numpy.ndarray: An array containing the generated center points. Each center is represented
         by its 3D coordinates.
     """
+    rng = np.random.default_rng(seed)
+
     # Get artificial center of segment
     mean_point = np.mean(np.argwhere(volume), axis=0)
 
@@ -517,8 +829,8 @@ def generate_initial_centers(volume: np.ndarray, nr_centers: int = 20, range_val
 
     # Generate random points around the starting points to create more centers
     for i in range(nr_centers - 1):
-        random_value_y = np.random.random()*(range_val*2) - range_val
-        ranndom_value_z = np.random.random()*(range_val*2) - range_val
+        random_value_y = rng.random()*(range_val*2) - range_val
+        ranndom_value_z = rng.random()*(range_val*2) - range_val
 
         random_left = start_left + np.array([ranndom_value_z, random_value_y, 0])
         random_right = start_right + np.array([ranndom_value_z, random_value_y, 0])
@@ -569,7 +881,8 @@ def loop_opening(volume, method: str, verbose: int) -> None:
     a maximum opening size is reached.
     The function applies morphological opening repeatedly on the given volume with an increasing kernel size (opening_size)
     until the computed similarity between the original volume and the eroded volume falls below a predefined threshold or
-    until more than one relevant feature is detected.
+    until more than one relevant feature is detected. The search runs on the segment's bounding box and, for the BALL
+    method, every opening is read from a single Euclidean Distance Transform of the segment.
 
     Parameters:
         volume: The input volume to be processed.
@@ -580,25 +893,39 @@ def loop_opening(volume, method: str, verbose: int) -> None:
             - found_separation (bool): True if more than one relevant feature is detected indicating a separation, False otherwise.
             - labeled_array: The array output from the morphological opening function that labels identified features.
     """
-    # Set threshold for similarity
+    # Set threshold for similarity and the biggest opening tried
     similarity_threshold = 90
+    max_opening_size = 20
+
+    # Crop to the segment (the margin keeps the borders of the volume behaving as in the full volume)
+    cropped_volume, crop_slices = crop_to_content(volume, margin=max_opening_size + 1)
+    volume_size = np.count_nonzero(cropped_volume)
 
     # Initialize variables
-    eroded_volume, similarity_value = initiate_eroded_volume(volume)
+    eroded_volume, similarity_value = initiate_eroded_volume(cropped_volume)
     found_separation = False
 
-    # Set the initial opening size based on the method
+    # Set the initial opening size based on the method (the ball openings all come from the same EDT)
+    distances = None
     if(method == 'z_directed'): opening_size = 2
-    elif(method == 'ball'): opening_size = 1
+    elif(method == 'ball'):
+        opening_size = 1
+        distances = distance_transform_edt(cropped_volume)
 
     # Loop until either less than 90% of similar volume is kept or the hemispheres are separable
-    while similarity_value >= similarity_threshold and opening_size <= 20 and not found_separation:
-        eroded_volume, labeled_array, relevant_features = perform_morphological_opening(volume, opening_size, method)
-        similarity_value = compute_volume_similarity(volume, eroded_volume)
+    while similarity_value >= similarity_threshold and opening_size <= max_opening_size and not found_separation:
+        eroded_volume, labeled_array, relevant_features = perform_morphological_opening(cropped_volume, opening_size, method, distances)
+
+        # The opening never adds voxels, so the similarity is the percentage of voxels kept
+        similarity_value = np.round(np.count_nonzero(eroded_volume)/volume_size*100, 2)
 
+        if(verbose >= 10): print(f"                                    → Opening size {opening_size}: {similarity_value}% kept, {len(relevant_features)} relevant features")
         if(len(relevant_features) > 1): found_separation = True
         else: opening_size += 1
 
+    # Bring the labels back to the full volume
+    labeled_array = uncrop(labeled_array, crop_slices, volume.shape)
+
     return found_separation, labeled_array
 
 def initiate_eroded_volume(volume: np.ndarray) -> tuple:
@@ -639,7 +966,7 @@ def extract_relevant_features_otsu(features: np.ndarray) -> np.ndarray:
 
     return relevant_features
 
-def perform_morphological_opening(volume: np.ndarray, opening_size: int, method: str) -> np.ndarray:
+def perform_morphological_opening(volume: np.ndarray, opening_size: int, method: str, distances: np.ndarray | None = None) -> np.ndarray:
     """
     Perform morphological opening and extract relevant features from a volumetric image.
     This function applies a morphological opening operation on a given volume using a
@@ -653,18 +980,22 @@ def perform_morphological_opening(volume: np.ndarray, opening_size: int, method:
         method (str): Technique to create the structuring element. Options are
             - 'ball': Uses a ball-shaped structuring element.
             - 'z_directed': Uses a structuring element with ones in the first dimension.
+        distances (np.ndarray | None): Euclidean Distance Transform of the volume. When given with the
+            'ball' method, the opening is computed from it instead of with the structuring element.
     Returns:
         tuple
             - np.ndarray: The volume after morphological opening.
             - np.ndarray: Array with labeled connected components.
             - np.ndarray: Array containing the relevant features extracted based on Otsu's threshold.
     """
-    # Define the structuring element based on the method
-    if(method == 'ball'): selem = ball(opening_size)
-    elif(method == 'z_directed'): selem = np.ones((opening_size, 1, 1), dtype=bool)
+    # Perform morphological opening (the ball opening can be read from the distance transform)
+    if(method == 'ball' and distances is not None): eroded_volume = ball_opening_from_distances(distances, opening_size)
+    else:
+        # Define the structuring element based on the method
+        if(method == 'ball'): selem = ball(opening_size)
+        elif(method == 'z_directed'): selem = np.ones((opening_size, 1, 1), dtype=bool)
 
-    # Perform morphological opening
-    eroded_volume = opening(volume, selem)
+        eroded_volume = opening(volume, selem)
 
     if(np.count_nonzero(eroded_volume) == 0):
         return eroded_volume, eroded_volume, np.array([])
@@ -678,7 +1009,31 @@ def perform_morphological_opening(volume: np.ndarray, opening_size: int, method:
 
     return eroded_volume, labeled_array, relevant_features
 
-def reorder_labels_array(labeled_array: np.ndarray) -> tuple:
+def ball_opening_from_distances(distances: np.ndarray, radius: int) -> np.ndarray:
+    """
+    Compute the morphological opening by a ball of a given radius from the Euclidean Distance Transform.
+
+    A voxel survives the erosion by ball(radius) when its distance to the background is bigger than
+    the radius, and the dilation recovers every voxel within the radius of an eroded voxel. This gives
+    the same result as `opening(volume, ball(radius))` without sliding the structuring element.
+
+    Parameters:
+        distances (np.ndarray): Euclidean Distance Transform of the binary volume.
+        radius (int): Radius of the ball used in the opening.
+
+    Returns:
+        np.ndarray: The binary volume (uint8) after the opening.
+    """
+    # Erosion: voxels whose closest background voxel is outside the ball
+    eroded_volume = distances > radius
+    if(not np.any(eroded_volume)): return eroded_volume.astype(np.uint8)
+
+    # Dilation: voxels that have an eroded voxel inside the ball
+    opened_volume = distance_transform_edt(~eroded_volume) <= radius
+
+    return opened_volume.astype(np.uint8)
+
+def reorder_labels_array(labeled_array: np.ndarray, top_k: int | None = None) -> tuple:
     """
     Reorder the labels in a labeled array based on their size.
 
@@ -686,10 +1041,12 @@ def reorder_labels_array(labeled_array: np.ndarray) -> tuple:
     background, and reassigns label values so that the region with the largest size
     is given label 1, the second largest is given label 2, and so on.
     The original labels are mapped to new labels accordingly, and the background (0)
-    is preserved.
+    is preserved. The new labels are built with a single lookup table (the inverse of
+    the size ordering) gathered over the array.
 
     Parameters:
         labeled_array (np.ndarray): A numpy array of integer labels. The background should be denoted by 0.
+        top_k (int | None): If given, only the top_k biggest regions are kept and the rest are set to background.
 
     Returns:
         tuple: A tuple containing
@@ -698,20 +1055,22 @@ def reorder_labels_array(labeled_array: np.ndarray) -> tuple:
               excluding the background.
     """
     # Extract sizes without background count
-    sizes = np.bincount(labeled_array.ravel())
+    label_counts = np.bincount(labeled_array.ravel())
+    sizes = label_counts.copy()
     sizes[0] = 0
 
     # Get the sorted positions
     sorted_old_labels = np.argsort(sizes)[::-1]
 
-    # Remap the labels by size starting in voxel 1
+    # Remap the labels by size starting in voxel 1 (inverse permutation of the ordering)
     new_label_map = np.zeros_like(sizes, dtype=int)
-    for new_lbl, old_lbl in enumerate(sorted_old_labels[:-1], start=1):
-        new_label_map[old_lbl] = new_lbl
+    new_label_map[sorted_old_labels[:-1]] = np.arange(1, len(sizes))
+    if(top_k is not None): new_label_map[new_label_map > top_k] = 0
 
-    # Assign to variables
+    # Assign to variables (the new sizes come from the old counts, not from the volume)
     sorted_labels = new_label_map[labeled_array]
-    sizes = np.bincount(sorted_labels.ravel())[1:]
+    new_sizes = np.bincount(new_label_map, weights=label_counts, minlength=len(sizes)).astype(int)
+    sizes = new_sizes[1:np.max(new_label_map[label_counts > 0], initial=0) + 1]
 
     return sorted_labels, sizes
 
@@ -774,34 +1133,81 @@ def assign_side(hemispheres, centers):
     return (left_hemisphere, right_hemisphere), (left_center, right_center)
 
 def rebuild_hemispheres(labeled_array: np.ndarray, verbose: int):
-    first_hemisphere = np.where(labeled_array == 1, 1, 0)
-    second_hemisphere = np.where(labeled_array == 2, 1, 0)
+    """
+    Rebuild the left and right hemispheres from a labeled array ordered by size.
+
+    The two biggest pieces (labels 1 and 2) start the hemispheres, and every other piece is merged
+    into the hemisphere with the closest centroid, updating that centroid as a running mean. The
+    merge only uses the size and coordinate sums of each piece (gathered in a single pass), and the
+    hemispheres are built at the end with one lookup over the labeled array.
+
+    Parameters:
+        labeled_array (np.ndarray): Array with the labeled pieces (1 being the biggest). Values
+            bellow 1 are treated as background.
+        verbose (int): Verbosity level, controlling the amount of runtime output.
 
-    first_center = np.mean(np.argwhere(first_hemisphere), axis=0)
-    second_center = np.mean(np.argwhere(second_hemisphere), axis=0)
+    Returns:
+        tuple: A tuple with the binary masks of the left and right hemispheres.
+    """
+    # Size and coordinate sums of every piece
+    sizes, coord_sums = compute_pieces_statistics(labeled_array)
+    with np.errstate(invalid='ignore'): centers = coord_sums / sizes[:, None]
 
     # Assign the left most hemisphere as the left hemisphere (it is mirrored)
-    (left_hemisphere, right_hemisphere), (left_center, right_center) = assign_side((first_hemisphere, second_hemisphere), (first_center, second_center))
+    (left_labels, right_labels), (left_center, right_center) = assign_side(([1], [2]), (centers[1], centers[2]))
+    left_size, left_sum = sizes[left_labels[0]], coord_sums[left_labels[0]].copy()
+    right_size, right_sum = sizes[right_labels[0]], coord_sums[right_labels[0]].copy()
 
-    for i in range(3, np.max(labeled_array) + 1):
+    for i in range(3, len(sizes)):
         if(verbose >= 10): print(f"                                    → Processing piece {i}...")
-        piece = np.where(labeled_array == i, 1, 0)
-        piece_center = np.mean(np.argwhere(piece), axis=0)
+        if(sizes[i] == 0): continue
+        piece_center = centers[i]
 
         if np.linalg.norm(piece_center - left_center) < np.linalg.norm(piece_center - right_center):
             # Update the left hemisphere center
-            left_hemisphere += piece
-            left_center = np.mean(np.argwhere(left_hemisphere), axis=0)
+            left_labels.append(i)
+            left_size, left_sum = left_size + sizes[i], left_sum + coord_sums[i]
+            left_center = left_sum / left_size
         else:
-            # Update the right hemisphere
-            right_hemisphere += piece
-            right_center = np.mean(np.argwhere(right_hemisphere), axis=0)
+            # Update the right hemisphere center
+            right_labels.append(i)
+            right_size, right_sum = right_size + sizes[i], right_sum + coord_sums[i]
+            right_center = right_sum / right_size
 
-    left_hemisphere = np.where(left_hemisphere > 0, 1, 0)
-    right_hemisphere = np.where(right_hemisphere > 0, 1, 0)
+    # Relabel every piece to its hemisphere in a single pass (0 background, 1 left, 2 right)
+    side_lut = np.zeros(len(sizes), dtype=np.uint8)
+    side_lut[left_labels] = 1
+    side_lut[right_labels] = 2
+    sides = side_lut[np.maximum(labeled_array, 0)]
+
+    left_hemisphere = np.where(sides == 1, 1, 0)
+    right_hemisphere = np.where(sides == 2, 1, 0)
 
     return left_hemisphere, right_hemisphere
 
+def compute_pieces_statistics(labeled_array: np.ndarray) -> tuple:
+    """
+    Compute the size and the coordinate sums of every labeled piece in a single pass.
+
+    Parameters:
+        labeled_array (np.ndarray): Array with the labeled pieces. Values bellow 1 are treated as background.
+
+    Returns:
+        tuple: A tuple containing
+            - sizes (np.ndarray): The number of voxels of each label (index 0 is the background).
+            - coord_sums (np.ndarray): An (L, 3) array with the sum of the coordinates of each label.
+    """
+    # Coordinates and labels of the labeled voxels
+    labeled_coords = np.nonzero(labeled_array > 0)
+    labels = labeled_array[labeled_coords]
+
+    # Always report at least the background and the two hemispheres
+    nr_labels = max(int(labels.max(initial=0)) + 1, 3)
+    sizes = np.bincount(labels, minlength=nr_labels)
+    coord_sums = np.stack([np.bincount(labels, weights=axis_coords, minlength=nr_labels) for axis_coords in labeled_coords], axis=1)
+
+    return sizes, coord_sums
+
 # ››››››››››››››››››››››››››››››››››››››››››››››››
 # 4.1.5 Sub-subsection: Alerts and Warnings
 # ›››››››››››››››››››››››››››››››››››››››››››››››››
@@ -829,12 +1235,13 @@ def convert_to_ref(old_coords: np.ndarray, reference: np.ndarray, voxel_size: fl
     Convert coordinates to the bregma-lambda plane and adjust for voxel size.
 
     Parameters:
-        old_coords (numpy.ndarray): An Nx3 array of coordinates to be converted.
+        old_coords (numpy.ndarray): A 2x3 (left and right) or Nx2x3 (for N segments) array of coordinates to be converted.
         reference (tuple): A tuple containing the bregma and lambda coordinates.
         voxel_size (float): The size of a voxel in micrometers.
+        volumes_sizes (tuple): The voxel count of each hemisphere (with shape 2 or Nx2).
 
     Returns:
-        numpy.ndarray: An Nx3 array of converted coordinates in micrometers.
+        tuple: The converted coordinates in micrometers (same shape as old_coords) and the volumes in um^3.
 
     Notes:
         - The function inverts the x-axis and y-axis for all coordinates.
@@ -856,8 +1263,7 @@ def convert_to_ref(old_coords: np.ndarray, reference: np.ndarray, voxel_size: fl
         print(f"                        → Centroid Voxel Coordinates in BL Space (No XY Invertion): {new_coords}")
 
     # Invert the x-axis and y-axis
-    new_coords[:, 2] = new_coords[:, 2] * -1
-    new_coords[:, 1] = new_coords[:, 1] * -1
+    new_coords = new_coords * BL_AXIS_SIGNS
 
     if(verbose >= 7): print(f"                        → Centroid Voxel Coordinates in BL Space (After XY Invertion): {new_coords}")
 
@@ -884,26 +1290,26 @@ def convert_to_ref(old_coords: np.ndarray, reference: np.ndarray, voxel_size: fl
 # 4.2.1 Sub-subsection: Alert and Warnings
 # ›››››››››››››››››››››››››››››››››››››››››››››››››
 def alert_inconsistent_convertion(old_coords: np.ndarray, new_coords: np.ndarray, mode: str):
-    # Initiate the conditions
-    have_old_equal_coord = (old_coords[0] == old_coords[1]).any()
-    have_new_equal_coords = (new_coords[0] == new_coords[1]).any()
+    # Initiate the conditions (for every pair of left and right coordinates)
+    have_old_equal_coord = (old_coords[..., 0, :] == old_coords[..., 1, :]).any(axis=-1)
+    have_new_equal_coords = (new_coords[..., 0, :] == new_coords[..., 1, :]).any(axis=-1)
 
     # Warn if they are met
-    if(have_old_equal_coord and not have_new_equal_coords):
+    if np.any(have_old_equal_coord & ~have_new_equal_coords):
         if(mode == 'voxel'): warnings.warn("WARNING: The conversion between the coordinates and the reference is not consistent (Voxel-Voxel Convertion).")
         elif(mode == 'um'): warnings.warn("WARNING: The conversion between the coordinates and the reference is not consistent (Voxel-um Convertion).")
         else: warnings.warn("WARNING: The conversion between the coordinates and the reference is not consistent")
 
 def alert_non_negative_z(old_coords: np.ndarray, new_coords: np.ndarray, reference: np.ndarray):
-    # Initiate the condition
-    is_z_not_negative = np.any(new_coords[:, 0] > 0)
+    # Initiate the condition (for every pair of left and right coordinates)
+    is_z_not_negative = np.any(new_coords[..., 0] > 0, axis=-1)
 
-    # Warn if they are met
-    if is_z_not_negative:
+    # Warn if they are met (only showing the pairs with non negative z)
+    if np.any(is_z_not_negative):
         warnings.warn(f'WARNING: Some Z values are not negative')
-        warnings.warn(f'Voxel Centroid Coords (Before Any Change) - {old_coords}')
+        warnings.warn(f'Voxel Centroid Coords (Before Any Change) - {old_coords[is_z_not_negative] if old_coords.ndim == 3 else old_coords}')
         warnings.warn(f'Begma-lambda Coords - {reference}')
-        warnings.warn(f'Converted Centroid Coords - {new_coords}')
+        warnings.warn(f'Converted Centroid Coords - {new_coords[is_z_not_negative] if new_coords.ndim == 3 else new_coords}')
 
 def alert_not_isotropic_voxel(voxel_size: np.ndarray):
     # Initiate the condition
@@ -924,9 +1330,10 @@ def extract_statistics(ref_centroids: np.array, verbose: int) -> tuple:
     for a pair of reference centroids in micrometer (um) coordinates.
 
     Parameters:
-        ref_centroids (np.array): A 2D numpy array containing two centroids
+        ref_centroids (np.array): A 2x3 numpy array containing two centroids
                                   (left and right) as rows, where each centroid
                                   is represented by a 3D coordinate (x, y, z).
+                                  An Nx2x3 array computes the statistics of N pairs at once.
 
     Returns:
         tuple: A tuple containing:
@@ -936,35 +1343,17 @@ def extract_statistics(ref_centroids: np.array, verbose: int) -> tuple:
     """
     if(verbose >= 6): print("                    Extracting the Centroid Statistics")
     # Unpack the centroids
-    left_ref_centroid, right_ref_centroid = ref_centroids
+    left_ref_centroid, right_ref_centroid = ref_centroids[..., 0, :], ref_centroids[..., 1, :]
 
-    # Prepares the um coordinates to have some statistical analysis
-    if((right_ref_centroid == left_ref_centroid).all()):
-        right_ref_centroid_mean = right_ref_centroid.copy()
-    else:
-        right_ref_centroid_mean = right_ref_centroid.copy()
-        right_ref_centroid_mean[2] = right_ref_centroid_mean[2] * -1
-    centroids_um = np.stack([left_ref_centroid, right_ref_centroid_mean], axis=0)
+    # Prepares the um coordinates to have some statistical analysis (mirror the right one, unless both are the same)
+    is_same_centroid = (right_ref_centroid == left_ref_centroid).all(axis=-1)
+    right_ref_centroid_mean = right_ref_centroid.copy()
+    right_ref_centroid_mean[..., 2] = np.where(is_same_centroid, 1, -1) * right_ref_centroid_mean[..., 2]
+    centroids_um = np.stack([left_ref_centroid, right_ref_centroid_mean], axis=-2)
 
     # Compute the mean, standard error and standard deviation of um coordinates
-    mean_um = np.mean(centroids_um, axis=0)
-    std_um = np.std(centroids_um, axis=0, ddof=1)
-    ste_um = std_um / np.sqrt(centroids_um.shape[0])
+    mean_um = np.mean(centroids_um, axis=-2)
+    std_um = np.std(centroids_um, axis=-2, ddof=1)
+    ste_um = std_um / np.sqrt(centroids_um.shape[-2])
 
     return mean_um, std_um, ste_um
-
-# ››››››››››››››››››››››››››››››››››››››››››››››››
-# 4.3.1 Sub-subsection: Format Data
-# ›››››››››››››››››››››››››››››››››››››››››››››››››
-def reorder_coords(coords: np.array, rounding: int):
-    """
-    Reorders the coordinates by swapping their positions and rounds them to the specified precision.
-
-    Parameters:
-        coords (np.array): A NumPy array containing the coordinates to be reordered.
-        rounding (int): The number of decimal places to round the reordered coordinates.
-
-    Returns:
-        list: A list of reordered and rounded coordinates.
-    """
-    return str([float(x) for x in np.round(coords[[2, 1, 0]], rounding)])
@@ -7,13 +7,14 @@ import numpy as np
 from ..logger import logger
 from ..mouse import Mouse
 from ..assertions import assert_all_from_same_parent
+from .ontology import OntologyIndex
 
 
 
 # ================================================================
 # 1. Section: Preparing Volume - Layer Collapsing
 # ================================================================
-def layer_colapsing(mouse: Mouse, data: pd.DataFrame) -> np.ndarray:
+def layer_colapsing(mouse: Mouse, data: pd.DataFrame | OntologyIndex) -> np.ndarray:
     """Collapse contiguous layer segments into their shared parent segment and update labels.
 
         Iterates over segment metadata to detect entries labeled as layers that share the
@@ -25,10 +26,10 @@ def layer_colapsing(mouse: Mouse, data: pd.DataFrame) -> np.ndarray:
         mouse : Mouse
             Mouse object containing the segmentation volume (`mouse.segmentation.data`) and
             labels (`mouse.segmentation.labels`) to be updated in place.
-        data : pandas.DataFrame
-            Table with segment metadata. Expected to contain at least ``'id'``, ``'name'``,
-            and ``'parent_id'`` columns; entries with ``'name'`` containing ``"layer"``
-            (case-insensitive) are considered for collapsing.
+        data : pandas.DataFrame | OntologyIndex
+            Table with segment metadata (or the ontology index built from it). Expected to
+            contain at least ``'id'``, ``'name'``, and ``'parent_id'`` columns; entries with
+            ``'name'`` containing ``"layer"`` (case-insensitive) are considered for collapsing.
 
         Returns
         -------
@@ -43,14 +44,16 @@ def layer_colapsing(mouse: Mouse, data: pd.DataFrame) -> np.ndarray:
 
         Side Effects
         ------------
-        Mutates ``mouse.segmentation.data`` when layers are collapsed and emits log messages
-        via the module logger.
+        Replaces ``mouse.segmentation.data`` (by a relabeled copy) when layers are collapsed and
+        emits log messages via the module logger.
 
         Notes
         -----
-        Assumes that layer segments are contiguous in ``data`` and share a common
-        ``parent_id``. Background segment is excluded when counting segments before and
-        after collapsing. Behavior is undefined if ``data`` lacks required columns.
+        Layer runs are consecutive ``data`` rows containing ``"layer"`` in their name and sharing
+        the same ``parent_id``. Every layer ID is mapped to its final parent in a lookup table
+        (later runs are applied on top of earlier ones), which is then applied in a single pass
+        over the volume. Background segment is excluded when counting segments before and after
+        collapsing. Behavior is undefined if ``data`` lacks required columns.
 
         Examples
         --------
@@ -67,87 +70,124 @@ def layer_colapsing(mouse: Mouse, data: pd.DataFrame) -> np.ndarray:
         >>> layer_colapsing(mock_mouse, df)  # doctest: +SKIP
         array([...])"""
 
+    if(isinstance(data, OntologyIndex)): data = data.table
     segments = mouse.segmentation.data
     original_nr_segments = len(mouse.segmentation.labels)
-    layer_indexs = []
 
-    # Goes through every row in the processed data, if the name contains "Layer" it will store the index
-    for entry in range(len(data)):
-        logger.debug(f"Checking segment {data['id'].iloc[entry]} - {data['name'].iloc[entry]} Has layer? {'layer' in data['name'].iloc[entry].lower()}")
+    # Find every run of contiguous layers from the same parent, and map their IDs to the parent
+    layer_runs = find_layer_runs(data)
+    layer_ids, parent_ids = build_layer_lookup(data, layer_runs)
 
-        # Initiate, continue or terminate a layer if conditions are met
-        segments, layer_indexs = check_and_build_layer(segments, data, layer_indexs, entry)
-
-    # Finish any layer that could be left open
-    if(len(layer_indexs)> 0): segments, layer_indexs = terminate_layer(segments, data, layer_indexs)
+    # Relabel the layers in a single pass over the volume
+    segments = apply_layer_lookup(segments, layer_ids, parent_ids)
 
     # Updates the mice only if the segments have changed
     labels = update_mouse_segments(mouse, segments, original_nr_segments)
     return labels
 
+def ontology_colapsing(mouse: Mouse, ontology: OntologyIndex, depth: int | None = None, level_ids: np.ndarray | None = None) -> np.ndarray:
+    """Collapse every segment into its ancestor at an ontology level and update labels.
+
+        Parameters
+        ----------
+        mouse : Mouse
+            Mouse object whose segmentation is relabeled.
+        ontology : OntologyIndex
+            Index of the ontology the segmentation labels belong to.
+        depth : int | None
+            Depth of the ontology to collapse to (segments that are not deeper are kept).
+        level_ids : numpy.ndarray | None
+            Structures to collapse to (each segment goes to its closest ancestor among them).
+            Used when ``depth`` is None.
+
+        Returns
+        -------
+        numpy.ndarray
+            Updated segmentation labels after collapsing.
+
+        Examples
+        --------
+        >>> ontology = OntologyIndex.from_csv("data/annotations_info.csv")  # doctest: +SKIP
+        >>> ontology_colapsing(mouse, ontology, depth=6)  # doctest: +SKIP"""
+
+    if(depth is None and level_ids is None): raise ValueError("Either the depth or the level ids must be given")
+    labels = mouse.segmentation.labels
+    original_nr_segments = len(labels)
+
+    # Map every label to its ancestor (only over the labels) and relabel in a single pass
+    new_labels = ontology.collapse_to_depth(labels, depth) if depth is not None else ontology.collapse_to(labels, level_ids)
+    segments = apply_layer_lookup(mouse.segmentation.data, labels, new_labels.astype(labels.dtype))
+
+    return update_mouse_segments(mouse, segments, original_nr_segments)
+
 
 # ──────────────────────────────────────────────────────
 # 1.1 Subsection: Preparing Volume - Helpers
 # ──────────────────────────────────────────────────────
-def check_and_build_layer(segments: np.ndarray, data: pd.DataFrame, layer_indexs: list, entry: int) -> tuple:
-    # Start if the layer_indexs is empty and the name contains "Layer"
-    is_start_layer = len(layer_indexs) == 0 and 'layer' in data['name'].iloc[entry].lower()
-    # Or if the layer_indexs is not empty and the parent_id of the current entry is the same as the parent_id of the first layer in the layer_indexs
-    is_continue_layer = len(layer_indexs) > 0 and data['parent_id'].iloc[entry] == data['parent_id'].iloc[layer_indexs[0]] and 'layer' in data['name'].iloc[entry].lower()
-    # Or if nothing checks, but layer index is not empty (finishing the layer)
-    is_terminate_layer = len(layer_indexs) > 0 and not (is_start_layer or is_continue_layer)
+def find_layer_runs(data: pd.DataFrame) -> pd.Series:
+    # A run starts at each layer whose previous row is not a layer or has a different parent
+    is_layer = data['name'].str.lower().str.contains('layer', na=False).to_numpy()
+    parent_ids = data['parent_id'].to_numpy()
+    is_new_parent = np.concatenate(([True], parent_ids[1:] != parent_ids[:-1]))
+    is_run_start = is_layer & (is_new_parent | ~np.concatenate(([False], is_layer[:-1])))
+
+    # Number the runs and keep only the layer rows (positional index → run number)
+    run_numbers = pd.Series(np.cumsum(is_run_start), index=np.arange(len(data)))
+    return run_numbers[is_layer]
+
+def build_layer_lookup(data: pd.DataFrame, layer_runs: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    # The lookup starts as the identity over every layer ID (sorted, for searchsorted)
+    layer_ids = np.unique(data['id'].to_numpy()[layer_runs.index])
+    final_ids = layer_ids.copy()
 
-    # Start a Layer or Continue a Layer
-    if(is_start_layer or is_continue_layer): layer_indexs.append(entry)
+    for _, run in layer_runs.groupby(layer_runs):
+        layer_indexs = list(run.index)
+        logger.debug(f"All layer names in layer_indexs: {[data['name'].iloc[i] for i in layer_indexs]}")
 
-    # Finish a Layer
-    elif(is_terminate_layer):
-        # Update the segments (colpasing the layers)
-        segments = terminate_layer(segments, data, layer_indexs)
-        layer_indexs = initiate_new_layer(data, layer_indexs, entry)
+        # Check if every layer has the same parent_id
+        assert_all_from_same_parent(data, layer_indexs)
 
-    return segments, layer_indexs
+        # Get the new voxel value for the colpased layer
+        parent_id = data['parent_id'].iloc[layer_indexs[0]].astype(int)
 
-def terminate_layer(segments: np.ndarray, data: pd.DataFrame, layer_indexs: list) -> None:
-    logger.debug(f"All layer names in layer_indexs: {[data['name'].iloc[i] for i in layer_indexs]}")
+        # Remove evrything after the str layer in the layer name
+        layer_name = data['name'].iloc[layer_indexs[0]]
+        layer_name = layer_name.split('layer')[0].strip()
 
-    # Check if every layer has the same parent_id
-    assert_all_from_same_parent(data, layer_indexs)
+        # Every voxel currently labeled as one of the layers becomes the parent (as if relabeling the volume in order)
+        for layer_id in data['id'].iloc[layer_indexs]: final_ids[final_ids == layer_id] = parent_id
 
-    # Get the new voxel value for the colpased layer
-    parent_id = data['parent_id'].iloc[layer_indexs[0]].astype(int)
+        logger.debug(f'Layer: {layer_name} - Parent: {parent_id}')
 
-    # Remove evrything after the str layer in the layer name
-    layer_name = data['name'].iloc[layer_indexs[0]]
-    layer_name = layer_name.split('layer')[0].strip()
+    return layer_ids, final_ids
 
-    # Updates the layer voxel values to the parent_id
-    for index in layer_indexs: segments[segments == data['id'].iloc[index]] = parent_id
+def apply_layer_lookup(segments: np.ndarray, layer_ids: np.ndarray, parent_ids: np.ndarray) -> np.ndarray:
+    if(len(layer_ids) == 0): return segments
 
-    logger.debug(f'Layer: {layer_name} - Parent: {parent_id}')
-    return segments
+    # Find the position of each voxel in the lookup (only the layer voxels are hits)
+    positions = np.searchsorted(layer_ids, segments)
+    np.minimum(positions, len(layer_ids) - 1, out=positions)
+    is_layer_voxel = layer_ids[positions] == segments
+    if(not is_layer_voxel.any()): return segments
+
+    # Relabel a copy of the volume, only where the layers are
+    new_segments = segments.copy()
+    new_segments[is_layer_voxel] = parent_ids[positions[is_layer_voxel]]
+
+    return new_segments
 
 def update_mouse_segments(mouse: Mouse, segments: np.ndarray, original_nr_labels: int) -> np.ndarray:
     # Get the number of segments before and after the colapsing
     new_nr_segments = len(np.unique(segments)) - 1  # Exclude background segment
 
-    # Only updates the segments if the number of segments has changed
-    if(original_nr_labels != new_nr_segments):
-        logger.info(f"Reduced from {original_nr_labels} to {new_nr_segments} segments")
-        mouse.segmentation.data = segments
+    # Report if the number of segments has changed
+    if(original_nr_labels != new_nr_segments): logger.info(f"Reduced from {original_nr_labels} to {new_nr_segments} segments")
     else: logger.info("No layers found to colapse.")
 
+    # Only updates the segments if any voxel has changed
+    if(segments is not mouse.segmentation.data): mouse.segmentation.data = segments
+
     # Get the updated labels after colapsing (or no colapsing)
     labels = mouse.segmentation.labels
     logger.debug(f"Labels after collapsing: {labels}")
     return labels
-
-def initiate_new_layer(data: pd.DataFrame, layer_indexs: list, entry: int) -> list:
-    layer_indexs = []
-
-    # In the case of the entry that activated the termination is part of another layer, it will start a new layer storage
-    if('layer' in data['name'].iloc[entry].lower()):
-        logger.debug(f"Initiating, right away, a new layer with entry {entry} - {data['name'].iloc[entry]}")
-        layer_indexs.append(entry)
-
-    return layer_indexs
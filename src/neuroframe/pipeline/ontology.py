@@ -0,0 +1,217 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import os
+
+import pandas as pd
+import numpy as np
+
+from ..logger import logger
+from ..utils.cache_utils import fingerprint_file
+
+
+
+# ──────────────────────────────────────────────────────
+# 0.1 Subsection: Universal Constants
+# ──────────────────────────────────────────────────────
+ONTOLOGY_CACHE_SUFFIX = ".ontology.npz"
+ONTOLOGY_CACHE_VERSION = 1
+
+
+
+# ================================================================
+# 1. Section: Ontology Index
+# ================================================================
+class OntologyIndex:
+    """Index of the Allen ontology (the ``annotations_info.csv`` table), built once and reused.
+
+        Rows are referred to by their position in ``table``. The index holds the id → row mapping
+        (sorted ids, for ``searchsorted``), the children of each row (CSR adjacency), a depth-first
+        ordering (where every subtree is a contiguous slice) and the ancestors of each row (one
+        column per depth). Every query is then an array operation over the requested labels.
+
+        Parameters
+        ----------
+        table : pandas.DataFrame
+            Ontology table with, at least, the ``'id'`` and ``'parent_id'`` columns (NaN for the root).
+        arrays : dict[str, numpy.ndarray] | None
+            Precomputed index arrays (e.g. loaded from the cache). If None, they are built from the table.
+
+        Examples
+        --------
+        >>> ontology = OntologyIndex.from_csv("data/annotations_info.csv")  # doctest: +SKIP
+        >>> ontology.descendants(315)  # every structure of the isocortex  # doctest: +SKIP
+        >>> ontology.collapse_to_depth(mouse.segmentation.labels, 5)  # doctest: +SKIP"""
+
+    ARRAY_NAMES = ('ids', 'parent_rows', 'sorted_ids', 'sorted_rows', 'child_offsets', 'child_rows', 'dfs_order', 'dfs_positions', 'subtree_ends', 'depths', 'ancestor_rows')
+
+    def __init__(self, table: pd.DataFrame, arrays: dict[str, np.ndarray] | None = None) -> None:
+        self.table = table.reset_index(drop=True)
+        if arrays is None: arrays = build_ontology_arrays(self.table)
+        for name in self.ARRAY_NAMES: setattr(self, name, arrays[name])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __repr__(self) -> str:
+        return f"OntologyIndex(structures={len(self)}, max_depth={int(self.depths.max(initial=0))})"
+
+    # ──────────────────────────────────────────────────────
+    # 1.1 Subsection: Constructors and Cache
+    # ──────────────────────────────────────────────────────
+    @classmethod
+    def from_csv(cls, path: str, use_cache: bool = True) -> "OntologyIndex":
+        table = pd.read_csv(path)
+        if not use_cache: return cls(table)
+
+        # Reuse the arrays cached next to the CSV if they were built from the same file
+        cache_path = f"{os.path.splitext(path)[0]}{ONTOLOGY_CACHE_SUFFIX}"
+        fingerprint = fingerprint_file(path)
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as data:
+                if str(data['fingerprint']) == fingerprint and int(data['version']) == ONTOLOGY_CACHE_VERSION:
+                    logger.debug(f"Loaded ontology index from {cache_path}")
+                    return cls(table, {name: data[name] for name in cls.ARRAY_NAMES})
+
+        ontology = cls(table)
+        ontology.save(cache_path, fingerprint)
+        return ontology
+
+    def save(self, cache_path: str, fingerprint: str = '') -> None:
+        # Write to a temporary file first so that a crash never leaves a partial cache
+        arrays = {name: getattr(self, name) for name in self.ARRAY_NAMES}
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as file:
+            np.savez(file, fingerprint=np.array(fingerprint), version=np.array(ONTOLOGY_CACHE_VERSION), **arrays)
+        os.replace(temp_path, cache_path)
+
+        logger.debug(f"Saved ontology index to {cache_path}")
+
+    # ──────────────────────────────────────────────────────
+    # 1.2 Subsection: Lookups
+    # ──────────────────────────────────────────────────────
+    def rows(self, ids: np.ndarray | int) -> np.ndarray:
+        # Row of each id (-1 for the ids that are not in the ontology)
+        ids = np.asarray(ids)
+        positions = np.minimum(np.searchsorted(self.sorted_ids, ids), len(self.sorted_ids) - 1)
+        return np.where(self.sorted_ids[positions] == ids, self.sorted_rows[positions], -1)
+
+    def contains(self, ids: np.ndarray | int) -> np.ndarray:
+        return self.rows(ids) >= 0
+
+    def present_mask(self, labels: np.ndarray) -> np.ndarray:
+        # Which rows of the table are in the labels (e.g. the labels of a segmentation)
+        mask = np.zeros(len(self), dtype=bool)
+        rows = self.rows(labels)
+        mask[rows[rows >= 0]] = True
+        return mask
+
+    def parents(self, ids: np.ndarray | int) -> np.ndarray:
+        # Parent id of each id (-1 for the root and for missing ids)
+        parent_rows = self.parent_rows[self.rows(ids)]
+        return np.where((self.rows(ids) >= 0) & (parent_rows >= 0), self.ids[parent_rows], -1)
+
+    def children(self, structure_id: int) -> np.ndarray:
+        row = int(self.rows(structure_id))
+        if row < 0: return np.array([], dtype=self.ids.dtype)
+        return self.ids[self.child_rows[self.child_offsets[row]:self.child_offsets[row + 1]]]
+
+    def descendants(self, structure_id: int, include_self: bool = True) -> np.ndarray:
+        # Every subtree is a contiguous slice of the depth-first order
+        row = int(self.rows(structure_id))
+        if row < 0: return np.array([], dtype=self.ids.dtype)
+        start = self.dfs_positions[row] + (0 if include_self else 1)
+        return self.ids[self.dfs_order[start:self.subtree_ends[row]]]
+
+    def ancestors(self, structure_id: int, include_self: bool = True) -> np.ndarray:
+        # From the root down to the structure
+        row = int(self.rows(structure_id))
+        if row < 0: return np.array([], dtype=self.ids.dtype)
+        path = self.ancestor_rows[row, :self.depths[row] + (1 if include_self else 0)]
+        return self.ids[path]
+
+    def is_descendant(self, ids: np.ndarray | int, structure_id: int, include_self: bool = True) -> np.ndarray:
+        # A row is in the subtree when its depth-first position is inside the subtree slice
+        row, rows = int(self.rows(structure_id)), self.rows(ids)
+        if row < 0: return np.zeros(np.shape(rows), dtype=bool)
+        positions = self.dfs_positions[rows]
+        start = self.dfs_positions[row] + (0 if include_self else 1)
+        return (rows >= 0) & (positions >= start) & (positions < self.subtree_ends[row])
+
+    # ──────────────────────────────────────────────────────
+    # 1.3 Subsection: Collapsing
+    # ──────────────────────────────────────────────────────
+    def collapse_to_depth(self, ids: np.ndarray, depth: int) -> np.ndarray:
+        # Ancestor of each id at the given depth (ids that are not deeper, or not in the ontology, are kept)
+        ids = np.asarray(ids)
+        rows = self.rows(ids)
+        is_deeper = (rows >= 0) & (self.depths[rows] > depth)
+        return np.where(is_deeper, self.ids[self.ancestor_rows[rows, min(depth, self.ancestor_rows.shape[1] - 1)]], ids)
+
+    def collapse_to(self, ids: np.ndarray, level_ids: np.ndarray) -> np.ndarray:
+        # Closest ancestor (or itself) of each id that is one of the level ids (ids without any are kept)
+        ids = np.asarray(ids)
+        rows = self.rows(ids)
+        is_level = np.append(self.present_mask(level_ids), False)
+
+        # Path of each id from the root (-1 after its depth, which maps to the appended False)
+        paths = self.ancestor_rows[rows]
+        paths_is_level = is_level[paths] & (rows >= 0)[..., None]
+
+        # Deepest level in the path of each id
+        deepest = paths.shape[-1] - 1 - np.argmax(paths_is_level[..., ::-1], axis=-1)
+        has_level = paths_is_level.any(axis=-1)
+        return np.where(has_level, self.ids[np.take_along_axis(paths, deepest[..., None], axis=-1)[..., 0]], ids)
+
+
+
+# ================================================================
+# 2. Section: Index Construction
+# ================================================================
+def build_ontology_arrays(table: pd.DataFrame) -> dict[str, np.ndarray]:
+    ids = table['id'].to_numpy().astype(np.int64)
+    nr_rows = len(ids)
+
+    # Map the ids to rows (parents that are not in the table make their child a root)
+    sorted_rows = np.argsort(ids, kind='stable')
+    sorted_ids = ids[sorted_rows]
+    parent_ids = table['parent_id'].to_numpy(dtype=float)
+    parent_positions = np.minimum(np.searchsorted(sorted_ids, np.nan_to_num(parent_ids, nan=-1).astype(np.int64)), max(nr_rows - 1, 0))
+    has_parent = ~np.isnan(parent_ids) & (sorted_ids[parent_positions] == np.nan_to_num(parent_ids, nan=-1))
+    parent_rows = np.where(has_parent, sorted_rows[parent_positions], -1)
+
+    # Children of each row, in table order (CSR)
+    child_rows = np.argsort(np.where(has_parent, parent_rows, nr_rows), kind='stable')[:np.count_nonzero(has_parent)]
+    child_offsets = np.concatenate(([0], np.cumsum(np.bincount(parent_rows[has_parent], minlength=nr_rows))))
+
+    # Depth-first (pre-order) traversal from every root, keeping the path to get the ancestors
+    dfs_order, depths = np.empty(nr_rows, dtype=np.int64), np.zeros(nr_rows, dtype=np.int64)
+    subtree_ends = np.empty(nr_rows, dtype=np.int64)
+    ancestor_paths, position = {}, 0
+    stack = [(row, 0, ()) for row in np.flatnonzero(~has_parent)[::-1]]
+    while stack:
+        row, depth, path = stack.pop()
+        if row < 0:
+            subtree_ends[~row] = position
+            continue
+
+        dfs_order[position], depths[row] = row, depth
+        ancestor_paths[row] = path + (row,)
+        position += 1
+
+        # Close the subtree after every child (pushed in reverse to keep the table order)
+        stack.append((~row, depth, path))
+        children = child_rows[child_offsets[row]:child_offsets[row + 1]]
+        stack.extend((child, depth + 1, ancestor_paths[row]) for child in children[::-1])
+
+    if position != nr_rows: raise ValueError("The ontology has cycles (some structures are not reachable from a root)")
+    dfs_positions = np.empty(nr_rows, dtype=np.int64)
+    dfs_positions[dfs_order] = np.arange(nr_rows)
+
+    # Ancestors of each row, one column per depth (padded with -1)
+    ancestor_rows = np.full((nr_rows, int(depths.max(initial=0)) + 1), -1, dtype=np.int64)
+    for row, path in ancestor_paths.items(): ancestor_rows[row, :len(path)] = path
+
+    return {'ids': ids, 'parent_rows': parent_rows, 'sorted_ids': sorted_ids, 'sorted_rows': sorted_rows,
+            'child_offsets': child_offsets, 'child_rows': child_rows, 'dfs_order': dfs_order, 'dfs_positions': dfs_positions,
+            'subtree_ends': subtree_ends, 'depths': depths, 'ancestor_rows': ancestor_rows}
@@ -6,12 +6,13 @@ import pandas as pd
 from ..mouse import Mouse
 from ..logger import logger
 from ..assertions import assert_no_missing_layers
+from .ontology import OntologyIndex
 
 
 # ================================================================
 # 1. Section: Preprocessing for Reference DataFrame
 # ================================================================
-def preprocess_reference_df(mouse: Mouse, reference_df: pd.DataFrame) -> pd.DataFrame:
+def preprocess_reference_df(mouse: Mouse, reference_df: pd.DataFrame | OntologyIndex) -> pd.DataFrame:
     """Preprocesses a reference DataFrame based on mouse segmentation data.
 
         This function filters the `reference_df` to include only the entries
@@ -22,8 +23,9 @@ def preprocess_reference_df(mouse: Mouse, reference_df: pd.DataFrame) -> pd.Data
         ----------
         mouse : Mouse
             A `Mouse` object containing segmentation data, specifically `mouse.segmentation.labels`.
-        reference_df : pd.DataFrame
+        reference_df : pd.DataFrame | OntologyIndex
             The reference DataFrame to be processed. It must contain an 'id' column.
+            If an `OntologyIndex` is given, its table is filtered with the prebuilt id index.
 
         Returns
         -------
@@ -69,7 +71,8 @@ def preprocess_reference_df(mouse: Mouse, reference_df: pd.DataFrame) -> pd.Data
     labels = mouse.segmentation.labels
 
     # Remove every entry from the reference DataFrame that does not correspond to any segmentation label
-    reference_df = reference_df[reference_df['id'].isin(labels)]
+    if(isinstance(reference_df, OntologyIndex)): reference_df = reference_df.table[reference_df.present_mask(labels)]
+    else: reference_df = reference_df[reference_df['id'].isin(labels)]
 
     # Print any entry that was present in the labels but not in the reference DataFrame
     assert_no_missing_layers(labels, reference_df)
@@ -1,3 +1,8 @@
 from .stereotaxic_dataclass import StereotaxicConfig
+from .separation_cache import SeparationCache
+from .stereotaxic_results import StereotaxicResults, read_columns, read_cohort
+from .result_log import ResultLog
+from .coordinate_frame import CoordinateFrame
+from .region_lookup import RegionLookup
 
-__all__ = ["StereotaxicConfig"]
+__all__ = ["StereotaxicConfig", "SeparationCache", "StereotaxicResults", "read_columns", "read_cohort", "ResultLog", "CoordinateFrame", "RegionLookup"]
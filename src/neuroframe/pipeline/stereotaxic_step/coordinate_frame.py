@@ -0,0 +1,109 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import numpy as np
+
+
+
+# ──────────────────────────────────────────────────────
+# 0.1 Subsection: Universal Constants
+# ──────────────────────────────────────────────────────
+# The y and x axes point the other way in the bregma-lambda space (in [z, y, x] order)
+BL_AXIS_SIGNS = np.array([1, -1, -1])
+COORDINATE_SPACES = ('voxel', 'aligned', 'bl')
+
+
+
+# ================================================================
+# 1. Section: Coordinate Frame
+# ================================================================
+class CoordinateFrame:
+    """Vectorized conversion of points between the voxel, aligned voxel and bregma-lambda spaces.
+
+        - ``voxel``: indices of the original volume, in [z, y, x] order.
+        - ``aligned``: indices of the volume after the bregma-lambda alignment, in [z, y, x] order.
+        - ``bl``: micrometers from bregma, in [x, y, z] order (as the ``xyz (um)`` columns of the results).
+
+        Every method takes (and returns) arrays of points with shape (..., 3), so thousands of
+        points are converted at once.
+
+        Parameters
+        ----------
+        bregma : np.ndarray
+            Bregma in the aligned space.
+        lambda_ : np.ndarray
+            Lambda in the aligned space.
+        voxel_size : float | tuple
+            Size of the voxel (in micrometers) along each axis.
+        transform : np.ndarray | None
+            4x4 homogeneous matrix from the voxel to the aligned space. If None, the volume was not aligned.
+
+        Examples
+        --------
+        >>> bregma, lambda_, frame = align_to_bl(mouse, bregma, lambda_, return_frame=True)  # doctest: +SKIP
+        >>> voxels = frame.convert(planned_targets_um, 'bl', 'voxel')  # doctest: +SKIP"""
+
+    def __init__(self, bregma: np.ndarray, lambda_: np.ndarray, voxel_size: float | tuple, transform: np.ndarray | None = None) -> None:
+        self.bregma = np.asarray(bregma, dtype=float)
+        self.lambda_ = np.asarray(lambda_, dtype=float)
+        self.voxel_size = np.broadcast_to(np.asarray(voxel_size, dtype=float), (3,)).copy()
+        self.transform = np.eye(4) if transform is None else np.asarray(transform, dtype=float)
+        self.inverse_transform = np.linalg.inv(self.transform)
+
+    def __repr__(self) -> str:
+        return f"CoordinateFrame(bregma={self.bregma.tolist()}, lambda_={self.lambda_.tolist()}, voxel_size={self.voxel_size.tolist()})"
+
+    @classmethod
+    def from_steps(cls, bregma: np.ndarray, lambda_: np.ndarray, voxel_size: float | tuple, steps: list[tuple[np.ndarray, np.ndarray]]) -> "CoordinateFrame":
+        # Each step is a (rotation_matrix, offset) pair as applied to the volumes (see rotate_mice), in the order they were applied
+        return cls(bregma, lambda_, voxel_size, compose_steps(steps))
+
+    # ──────────────────────────────────────────────────────
+    # 1.1 Subsection: Conversions
+    # ──────────────────────────────────────────────────────
+    def voxel_to_aligned(self, points: np.ndarray) -> np.ndarray:
+        return apply_homogeneous(self.transform, points)
+
+    def aligned_to_voxel(self, points: np.ndarray) -> np.ndarray:
+        return apply_homogeneous(self.inverse_transform, points)
+
+    def aligned_to_bl(self, points: np.ndarray) -> np.ndarray:
+        bl_points = (np.asarray(points, dtype=float) - self.bregma) * BL_AXIS_SIGNS * self.voxel_size
+        return bl_points[..., ::-1]
+
+    def bl_to_aligned(self, points: np.ndarray) -> np.ndarray:
+        return np.asarray(points, dtype=float)[..., ::-1] / self.voxel_size * BL_AXIS_SIGNS + self.bregma
+
+    def voxel_to_bl(self, points: np.ndarray) -> np.ndarray:
+        return self.aligned_to_bl(self.voxel_to_aligned(points))
+
+    def bl_to_voxel(self, points: np.ndarray) -> np.ndarray:
+        return self.aligned_to_voxel(self.bl_to_aligned(points))
+
+    def convert(self, points: np.ndarray, source: str, target: str) -> np.ndarray:
+        if source not in COORDINATE_SPACES or target not in COORDINATE_SPACES:
+            raise ValueError(f"Unknown coordinate space, expected any of {COORDINATE_SPACES} (got {source} → {target})")
+        if(source == target): return np.array(points, dtype=float)
+
+        return getattr(self, f"{source}_to_{target}")(points)
+
+
+
+# ================================================================
+# 2. Section: Homogeneous Transforms
+# ================================================================
+def compose_steps(steps: list[tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+    # affine_transform(volume, rotation_matrix.T, offset) samples the input at rotation_matrix.T @ output + offset,
+    # so each point of the input moves to rotation_matrix @ (input - offset)
+    transform = np.eye(4)
+    for rotation_matrix, offset in steps:
+        step = np.eye(4)
+        step[:3, :3] = rotation_matrix
+        step[:3, 3] = -np.asarray(rotation_matrix) @ np.asarray(offset, dtype=float)
+        transform = step @ transform
+
+    return transform
+
+def apply_homogeneous(transform: np.ndarray, points: np.ndarray) -> np.ndarray:
+    points = np.asarray(points, dtype=float)
+    return points @ transform[:3, :3].T + transform[:3, 3]
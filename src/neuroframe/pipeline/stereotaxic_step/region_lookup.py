@@ -0,0 +1,139 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import os
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from ...utils import crop_to_content
+from .coordinate_frame import CoordinateFrame
+
+
+
+# ──────────────────────────────────────────────────────
+# 0.1 Subsection: Universal Constants
+# ──────────────────────────────────────────────────────
+REGION_LOOKUP_VOLUME = "volume.npy"
+REGION_LOOKUP_INDEX = "index.npz"
+
+
+
+# ================================================================
+# 1. Section: Region Lookup
+# ================================================================
+class RegionLookup:
+    """Batched "which structure is at this coordinate?" queries over an aligned segmentation.
+
+        The segmentation is cropped to its content and stored with compact labels (uint8/uint16
+        when possible). Points that fall on the background (or outside the volume) take the label
+        of the closest surface voxel, found with a KD-tree in micrometers. Once saved, the volume
+        is memory-mapped when loading, so a query only reads the voxels it touches.
+
+        Parameters
+        ----------
+        segmentation : np.ndarray
+            Labelled volume in the aligned space (e.g. ``mouse.segmentation.data`` after ``align_to_bl``).
+        frame : CoordinateFrame
+            Frame of the aligned volume, used to convert the query points.
+
+        Examples
+        --------
+        >>> lookup = RegionLookup(mouse.segmentation.data, frame)  # doctest: +SKIP
+        >>> lookup.save("data/P874/region_lookup")  # doctest: +SKIP
+        >>> labels, distances = RegionLookup.load("data/P874/region_lookup").query(sites_um, return_distance=True)  # doctest: +SKIP"""
+
+    def __init__(self, segmentation: np.ndarray | None, frame: CoordinateFrame, arrays: dict[str, np.ndarray] | None = None) -> None:
+        self.frame = frame
+        if arrays is None: arrays = build_lookup_arrays(segmentation)
+
+        self.volume = arrays['volume']
+        self.origin = arrays['origin']
+        self.labels = arrays['labels']
+        self.surface_voxels = arrays['surface_voxels']
+        self.surface_labels = arrays['surface_labels']
+        self._tree = None
+
+    def __repr__(self) -> str:
+        return f"RegionLookup(labels={len(self.labels) - 1}, shape={tuple(self.volume.shape)})"
+
+    @property
+    def tree(self) -> cKDTree:
+        # Built on the first fallback query (in micrometers, so that anisotropic voxels are handled)
+        if self._tree is None: self._tree = cKDTree(self.surface_voxels * self.frame.voxel_size)
+        return self._tree
+
+    # ──────────────────────────────────────────────────────
+    # 1.1 Subsection: Queries
+    # ──────────────────────────────────────────────────────
+    def query(self, points: np.ndarray, space: str = 'bl', max_distance: float = np.inf, return_distance: bool = False) -> np.ndarray | tuple[np.ndarray, np.ndarray]:
+        # Round each point to its voxel in the (cropped) aligned volume
+        aligned = self.frame.convert(points, space, 'aligned')
+        batch_shape = aligned.shape[:-1]
+        aligned = aligned.reshape(-1, 3)
+        voxels = np.rint(aligned).astype(np.int64) - self.origin
+        is_inside = np.all((voxels >= 0) & (voxels < self.volume.shape), axis=1)
+
+        compact = np.zeros(len(aligned), dtype=np.int64)
+        compact[is_inside] = self.volume[tuple(voxels[is_inside].T)]
+        labels = self.labels[compact]
+        distances = np.zeros(len(aligned))
+
+        # Points on the background take the label of the closest surface voxel (if close enough)
+        is_missing = compact == 0
+        if is_missing.any() and len(self.surface_voxels) > 0:
+            missing_distances, neighbours = self.tree.query(aligned[is_missing] * self.frame.voxel_size, distance_upper_bound=max_distance)
+            is_found = neighbours < len(self.surface_voxels)
+            labels[np.flatnonzero(is_missing)[is_found]] = self.labels[self.surface_labels[neighbours[is_found]]]
+            distances[is_missing] = missing_distances
+
+        labels, distances = labels.reshape(batch_shape), distances.reshape(batch_shape)
+        if return_distance: return labels, distances
+        return labels
+
+    # ──────────────────────────────────────────────────────
+    # 1.2 Subsection: Save and Load
+    # ──────────────────────────────────────────────────────
+    def save(self, folder: str) -> None:
+        os.makedirs(folder, exist_ok=True)
+        np.save(os.path.join(folder, REGION_LOOKUP_VOLUME), np.asarray(self.volume))
+        np.savez(os.path.join(folder, REGION_LOOKUP_INDEX), origin=self.origin, labels=self.labels,
+                 surface_voxels=self.surface_voxels, surface_labels=self.surface_labels,
+                 bregma=self.frame.bregma, lambda_=self.frame.lambda_, voxel_size=self.frame.voxel_size, transform=self.frame.transform)
+
+    @classmethod
+    def load(cls, folder: str, mmap: bool = True) -> "RegionLookup":
+        with np.load(os.path.join(folder, REGION_LOOKUP_INDEX)) as data:
+            arrays = {name: data[name] for name in ('origin', 'labels', 'surface_voxels', 'surface_labels')}
+            frame = CoordinateFrame(data['bregma'], data['lambda_'], data['voxel_size'], data['transform'])
+
+        arrays['volume'] = np.load(os.path.join(folder, REGION_LOOKUP_VOLUME), mmap_mode='r' if mmap else None)
+        return cls(None, frame, arrays)
+
+
+
+# ================================================================
+# 2. Section: Lookup Arrays
+# ================================================================
+def build_lookup_arrays(segmentation: np.ndarray) -> dict[str, np.ndarray]:
+    # Crop to the labelled voxels and replace the labels by their position (0 is the background)
+    cropped, slices = crop_to_content(segmentation)
+    labels, compact = np.unique(cropped, return_inverse=True)
+    if labels[0] != 0: labels, compact = np.concatenate(([0], labels)), compact + 1
+    compact = compact.reshape(cropped.shape).astype(np.min_scalar_type(len(labels) - 1))
+
+    # The surface voxels are the labelled voxels with a background face neighbour (or at the border).
+    # The closest labelled voxel to a background point is always one of them.
+    padded = np.pad(compact != 0, 1)
+    core = (slice(1, -1),) * 3
+    interior = padded[core].copy()
+    for axis in range(3):
+        for start, stop in ((None, -2), (2, None)):
+            neighbour = list(core)
+            neighbour[axis] = slice(start, stop)
+            interior &= padded[tuple(neighbour)]
+    surface_voxels = np.argwhere(padded[core] & ~interior)
+
+    origin = np.array([box.start or 0 for box in slices], dtype=np.int64)
+    return {'volume': compact, 'origin': origin, 'labels': labels,
+            'surface_voxels': surface_voxels + origin, 'surface_labels': compact[tuple(surface_voxels.T)]}
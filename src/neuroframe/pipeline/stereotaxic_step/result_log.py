@@ -0,0 +1,132 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import os
+import json
+
+import numpy as np
+
+from ...logger import logger
+
+
+
+# ================================================================
+# 1. Section: Result Log
+# ================================================================
+class ResultLog:
+    """Append-only log with the results of each segment, written as soon as they are computed.
+
+        Each line is a JSON record with the results of one segment (for one or more modes), flushed
+        and synced to disk before the next one. Records of the same segment are merged when loading,
+        so the log can also be kept as a result cache that grows with new modes. The first line is a
+        header that identifies the run (segmentation fingerprint and voxel size): a log written by a
+        different run is discarded instead of resumed. A line left incomplete by a crash is dropped
+        when loading.
+
+        Parameters
+        ----------
+        path : str
+            Path of the log file (usually next to the final results, ending in ``.partial.jsonl``).
+        header : dict
+            JSON serializable description of the run.
+
+        Examples
+        --------
+        >>> result_log = ResultLog("data/P874/stereotaxic_coordinates.partial.jsonl", header)  # doctest: +SKIP
+        >>> done_results = result_log.load()  # doctest: +SKIP
+        >>> result_log.append({'full_mean': {'id': 385, ...}})  # doctest: +SKIP"""
+
+    def __init__(self, path: str, header: dict) -> None:
+        self.path = path
+        self.header = json.loads(json.dumps(header))
+        self._file = None
+
+    def __repr__(self) -> str:
+        return f'ResultLog(path="{self.path}")'
+
+    def __enter__(self) -> "ResultLog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # ──────────────────────────────────────────────────────
+    # 1.1 Subsection: Load and Append
+    # ──────────────────────────────────────────────────────
+    def load(self) -> dict[int, dict]:
+        results, valid_size = {}, 0
+
+        # Read every complete record (stopping at the first incomplete one)
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as file:
+                lines = file.readlines()
+
+            if lines and self._read_line(lines[0]) == self.header:
+                valid_size = len(lines[0])
+                for line in lines[1:]:
+                    record = self._read_line(line)
+                    if record is None: break
+                    segment_id = int(record['id'])
+                    complete = {mode: rec for mode, rec in record['results'].items() if is_complete_record(rec)}
+                    if complete: results[segment_id] = {**results.get(segment_id, {}), **decode_results(complete)}
+                    valid_size += len(line)
+            else: logger.debug(f"Discarding {self.path}, it was written by a different run")
+
+        # Drop whatever is after the last complete record (or start a new log with the header)
+        self._file = open(self.path, 'ab' if valid_size > 0 else 'wb')
+        self._file.truncate(valid_size)
+        if valid_size == 0: self._write_line(self.header)
+
+        if results: logger.info(f"Resuming from {self.path}: {len(results)} segments already processed")
+        return results
+
+    def append(self, results: dict) -> None:
+        # Every mode has the same segment id
+        segment_id = int(next(iter(results.values()))['id'])
+
+        # A failed segment is not logged, so that a resumed run computes it again
+        if not all(is_complete_record(rec) for rec in results.values()):
+            logger.warning(f"Segment {segment_id} failed, it is not logged (it will be computed again when resuming)")
+            return
+
+        self._write_line({'id': segment_id, 'results': encode_results(results)})
+
+    def close(self) -> None:
+        if self._file is not None: self._file.close()
+        self._file = None
+
+    def remove(self) -> None:
+        self.close()
+        if os.path.exists(self.path): os.remove(self.path)
+
+    def _write_line(self, record: dict) -> None:
+        if self._file is None: raise RuntimeError("The result log must be loaded before appending to it")
+
+        self._file.write((json.dumps(record) + '\n').encode())
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    @staticmethod
+    def _read_line(line: bytes) -> dict | None:
+        if not line.endswith(b'\n'): return None
+        try: return json.loads(line)
+        except json.JSONDecodeError: return None
+
+
+
+# ================================================================
+# 2. Section: Encoding
+# ================================================================
+def encode_results(results: dict) -> dict:
+    # Numpy values are stored as (nested) lists and numbers
+    return {mode: {key: value.tolist() if isinstance(value, np.ndarray) else value.item() if isinstance(value, np.generic) else value
+                   for key, value in rec.items()}
+            for mode, rec in results.items()}
+
+def is_complete_record(rec: dict) -> bool:
+    # The worker returns only the id of a segment that failed
+    return bool(rec.get('Separation Method')) and 'centroids' in rec
+
+def decode_results(results: dict) -> dict:
+    return {mode: {key: np.array(value, dtype=float) if key in ('centroids', 'volumes') else value for key, value in rec.items()}
+            for mode, rec in results.items()}
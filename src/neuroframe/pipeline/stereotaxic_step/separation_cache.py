@@ -0,0 +1,85 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import os
+
+import numpy as np
+
+from ...logger import logger
+from ...utils import compress_mask, decompress_mask
+
+
+
+# ================================================================
+# 1. Section: Separation Cache
+# ================================================================
+class SeparationCache:
+    """On-disk cache of the hemisphere separation of each segment.
+
+        The separation of a segment (connectivity, opening or KMeans) does not depend on the
+        centroid mode, so it is stored once per segmentation and reused by every mode and run.
+        Each segment is a small ``.npz`` file, named after its label, inside a folder named after
+        the segmentation fingerprint. Only separations that cannot be rebuilt from the midline
+        split store their (cropped and bit-packed) left and right masks.
+
+        Parameters
+        ----------
+        cache_folder : str
+            Folder where the caches of every segmentation are stored.
+        fingerprint : str
+            Fingerprint of the segmentation data (see ``MedicalImage.fingerprint``).
+
+        Examples
+        --------
+        >>> cache = SeparationCache("data/P874/.separation_cache", mouse.segmentation.fingerprint)  # doctest: +SKIP
+        >>> cache.save(385, 'Opening Separation', (left_mask, right_mask))  # doctest: +SKIP
+        >>> method, masks = cache.load(385)  # doctest: +SKIP"""
+
+    def __init__(self, cache_folder: str, fingerprint: str) -> None:
+        self.fingerprint = fingerprint
+        self.folder = os.path.join(cache_folder, fingerprint)
+        os.makedirs(self.folder, exist_ok=True)
+
+    def __contains__(self, segment_id: int) -> bool:
+        return os.path.exists(self._segment_path(segment_id))
+
+    def __repr__(self) -> str:
+        return f'SeparationCache(folder="{self.folder}")'
+
+    # ──────────────────────────────────────────────────────
+    # 1.1 Subsection: Save and Load
+    # ──────────────────────────────────────────────────────
+    def save(self, segment_id: int, separation_method: str, hemispheres: tuple[np.ndarray, np.ndarray] | None = None) -> None:
+        data = {'separation_method': np.array(separation_method)}
+
+        # Store the compressed masks of each hemisphere (when they cannot be rebuilt)
+        if hemispheres is not None:
+            for side, mask in zip(('left', 'right'), hemispheres):
+                data.update({f"{side}_{key}": value for key, value in compress_mask(mask).items()})
+
+        # Write to a temporary file first so that a crash never leaves a partial entry
+        path = self._segment_path(segment_id)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as file: np.savez_compressed(file, **data)
+        os.replace(temp_path, path)
+
+        logger.debug(f"Cached separation of segment {segment_id}: {separation_method}")
+
+    def load(self, segment_id: int) -> tuple[str, tuple[np.ndarray, np.ndarray] | None] | None:
+        path = self._segment_path(segment_id)
+        if not os.path.exists(path): return None
+
+        with np.load(path) as data:
+            separation_method = str(data['separation_method'])
+
+            # Rebuild the masks of each hemisphere (if they were stored)
+            hemispheres = None
+            if 'left_bits' in data:
+                hemispheres = tuple(decompress_mask({key: data[f"{side}_{key}"] for key in ('shape', 'bounds', 'bits')})
+                                    for side in ('left', 'right'))
+
+        logger.debug(f"Loaded cached separation of segment {segment_id}: {separation_method}")
+        return separation_method, hemispheres
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.folder, f"{int(segment_id)}.npz")
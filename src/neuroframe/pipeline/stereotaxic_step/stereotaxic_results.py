@@ -0,0 +1,196 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import os
+import glob
+
+import pandas as pd
+import numpy as np
+
+from numpy.typing import NDArray
+from dataclasses import dataclass, fields
+
+
+
+# ──────────────────────────────────────────────────────
+# 0.1 Subsection: Universal Constants
+# ──────────────────────────────────────────────────────
+COLUMNAR_FORMAT_VERSION = 1
+
+# Legacy CSV columns (in order) and the field (and rounding) they are built from
+LEGACY_COLUMNS = {
+    'Separation Method': ('separation_method', None),
+    'xyz (um) - L': ('xyz_um_left', 3), 'xyz (um) - R': ('xyz_um_right', 3),
+    'mean xyz (um)': ('xyz_um_mean', 3), 'ste xyz (um)': ('xyz_um_ste', 3), 'std xyz (um)': ('xyz_um_std', 3),
+    'volume (um^3) - L': ('volume_um_left', None), 'volume (um^3) - R': ('volume_um_right', None),
+    'xyz (voxel) - L': ('xyz_voxel_left', 0), 'xyz (voxel) - R': ('xyz_voxel_right', 0),
+    'volume (voxel) - L': ('volume_voxel_left', None), 'volume (voxel) - R': ('volume_voxel_right', None)
+}
+
+
+
+# ================================================================
+# 1. Section: Stereotaxic Results
+# ================================================================
+@dataclass
+class StereotaxicResults:
+    """Struct-of-arrays with the stereotaxic coordinates of every segment.
+
+        Each field is a column with one row per segment: the coordinates are (N, 3) float arrays
+        in [x, y, z] order and the volumes are (N,) float arrays. Segments that failed to be
+        processed have an empty separation method and NaN values.
+
+        Examples
+        --------
+        >>> results.xyz_um_mean[results.id == 385]  # doctest: +SKIP
+        >>> results.to_csv("p874_stereotaxic_coordinates.csv", reference_df)  # doctest: +SKIP"""
+
+    id: NDArray[np.int64]
+    separation_method: NDArray[np.str_]
+
+    xyz_um_left: NDArray[np.float64]
+    xyz_um_right: NDArray[np.float64]
+    xyz_um_mean: NDArray[np.float64]
+    xyz_um_std: NDArray[np.float64]
+    xyz_um_ste: NDArray[np.float64]
+    volume_um_left: NDArray[np.float64]
+    volume_um_right: NDArray[np.float64]
+
+    xyz_voxel_left: NDArray[np.float64]
+    xyz_voxel_right: NDArray[np.float64]
+    volume_voxel_left: NDArray[np.float64]
+    volume_voxel_right: NDArray[np.float64]
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    @property
+    def columns(self) -> dict[str, np.ndarray]:
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+    @property
+    def is_valid(self) -> NDArray[np.bool_]:
+        return self.separation_method != ''
+
+    # ──────────────────────────────────────────────────────
+    # 1.1 Subsection: Tables
+    # ──────────────────────────────────────────────────────
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(flatten_columns(self.columns))
+
+    def to_legacy_dataframe(self) -> pd.DataFrame:
+        # Format the valid rows as in the legacy CSV (stringified and rounded coordinates)
+        is_valid = self.is_valid
+        data = {'id': self.id[is_valid]}
+        for column_name, (name, rounding) in LEGACY_COLUMNS.items():
+            column = getattr(self, name)[is_valid]
+            if(rounding is not None): column = [str(row) for row in np.round(column, rounding).tolist()]
+            elif(name.startswith('volume_voxel')): column = column.astype(np.int64)
+            data[column_name] = column
+
+        # Failed segments only keep their id (as when the legacy records were missing the keys)
+        valid_df = pd.DataFrame(data, index=np.flatnonzero(is_valid))
+        failed_df = pd.DataFrame({'id': self.id[~is_valid]}, index=np.flatnonzero(~is_valid))
+        if(len(failed_df) == 0): return valid_df.reset_index(drop=True)
+
+        return pd.concat([valid_df, failed_df]).sort_index().reset_index(drop=True)
+
+    # ──────────────────────────────────────────────────────
+    # 1.2 Subsection: Export
+    # ──────────────────────────────────────────────────────
+    def to_csv(self, path: str, reference_df: pd.DataFrame | None = None) -> pd.DataFrame:
+        # Legacy CSV, merged into the reference (if given)
+        data = self.to_legacy_dataframe()
+        if(reference_df is not None): data = reference_df.merge(data, on='id', how='left')
+
+        data.to_csv(path, index=False)
+        return data
+
+    def save_npz(self, path: str, mouse_id: str | None = None, mode: str | None = None) -> None:
+        # Uncompressed, so that each column can be read on its own without parsing the others
+        metadata = {'format_version': np.array(COLUMNAR_FORMAT_VERSION), 'mouse_id': np.array(mouse_id or ''), 'mode': np.array(mode or '')}
+        np.savez(path, **metadata, **self.columns)
+
+    @classmethod
+    def load_npz(cls, path: str) -> "StereotaxicResults":
+        return cls(**read_columns(path))
+
+
+
+# ================================================================
+# 2. Section: Columnar Readers
+# ================================================================
+def read_columns(path: str, columns: list[str] | None = None) -> dict[str, np.ndarray]:
+    """Read some columns of a typed columnar (``.npz``) stereotaxic file.
+
+        Only the requested columns are read from disk (the ``id`` is always included).
+
+        Parameters
+        ----------
+        path : str
+            Path of the ``.npz`` file written by ``StereotaxicResults.save_npz``.
+        columns : list[str] | None
+            Fields of ``StereotaxicResults`` to read (e.g. ``['xyz_um_mean', 'volume_um_left']``). If None, all are read.
+
+        Returns
+        -------
+        dict[str, np.ndarray]
+            The requested columns."""
+
+    field_names = [field.name for field in fields(StereotaxicResults)]
+    if columns is None: columns = field_names
+    unknown_columns = set(columns) - set(field_names)
+    if unknown_columns: raise ValueError(f"Unknown columns {sorted(unknown_columns)}, expected any of {field_names}")
+
+    with np.load(path) as data:
+        if int(data['format_version']) > COLUMNAR_FORMAT_VERSION:
+            raise ValueError(f"{path} was written with a newer format (version {int(data['format_version'])})")
+        return {name: data[name] for name in ['id', *[column for column in columns if column != 'id']]}
+
+def read_cohort(paths: str | list[str], columns: list[str] | None = None, mode: str | None = None) -> pd.DataFrame:
+    """Load the stereotaxic coordinates of a whole cohort into a single typed table.
+
+        Parameters
+        ----------
+        paths : str | list[str]
+            Folder with the ``.npz`` files of every mouse, a glob pattern (e.g. ``"data/group/*_MEAN.npz"``) or the list of files.
+        columns : list[str] | None
+            Fields to read (see ``read_columns``). If None, all are read.
+        mode : str | None
+            Only read the files of this centroid mode (e.g. ``'full_mean'``). If None, every file is read.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per mouse, mode and segment, with ``mouse`` and ``mode`` columns and one numeric column per axis.
+
+        Examples
+        --------
+        >>> cohort = read_cohort("data/group", columns=['xyz_um_mean'], mode='full_mean')  # doctest: +SKIP
+        >>> cohort.groupby('id')[['x_um_mean', 'y_um_mean', 'z_um_mean']].mean()  # doctest: +SKIP"""
+
+    if isinstance(paths, str): paths = sorted(glob.glob(os.path.join(paths, '*.npz') if os.path.isdir(paths) else paths))
+
+    tables = []
+    for path in paths:
+        # Identify the mouse by the stored id (or by the file name), and the centroid mode (empty in older files)
+        with np.load(path) as data: mouse_id, file_mode = str(data['mouse_id']), str(data['mode']) if 'mode' in data.files else ''
+        if(mouse_id == ''): mouse_id = os.path.splitext(os.path.basename(path))[0]
+        if(mode is not None and file_mode != mode): continue
+
+        table = pd.DataFrame(flatten_columns(read_columns(path, columns)))
+        table.insert(0, 'mouse', mouse_id)
+        table.insert(1, 'mode', file_mode)
+        tables.append(table)
+
+    if(len(tables) == 0): return pd.DataFrame(columns=['mouse', 'mode', 'id'])
+    return pd.concat(tables, ignore_index=True)
+
+def flatten_columns(columns: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    # One numeric column per axis of each coordinate (e.g. xyz_um_left → x_um_left, y_um_left, z_um_left)
+    flat_columns = {}
+    for name, column in columns.items():
+        if(column.ndim == 1): flat_columns[name] = column
+        else: flat_columns.update({f"{axis}{name[3:]}": column[:, index] for index, axis in enumerate('xyz')})
+
+    return flat_columns
@@ -3,6 +3,7 @@
 # ================================================================
 import SimpleITK as sitk
 from ..logger import logger
+from .registration_telemetry import RegistrationTelemetry
 
 
 
@@ -86,6 +87,55 @@ class Definers:
             self.rigid_type = 'moments'
             return self.define_center_type()
     
+    def define_sampling(self, method: sitk.ImageRegistrationMethod) -> sitk.ImageRegistrationMethod:
+        # Without a strategy the metric uses every voxel (the sampling percentage would be ignored)
+        if(self.sampling_percentage >= 1 or self.sampling_strategy == 'none'): method.SetMetricSamplingStrategy(method.NONE)
+        elif(self.sampling_strategy == 'random'): method.SetMetricSamplingStrategy(method.RANDOM)
+        elif(self.sampling_strategy == 'regular'): method.SetMetricSamplingStrategy(method.REGULAR)
+        else:
+            logger.warning("Sampling strategy not supported yet, alter the class to add it. Deafulted to 'random'.")
+            self.sampling_strategy = 'random'
+            return self.define_sampling(method)
+
+        # Fixed seed so that the same inputs always give the same transform
+        method.SetMetricSamplingPercentage(min(self.sampling_percentage, 1.0), self.sampling_seed)
+
+        return method
+
+    def define_masks(self, method: sitk.ImageRegistrationMethod, fixed_mask: sitk.Image | None = None, moving_mask: sitk.Image | None = None) -> sitk.ImageRegistrationMethod:
+        # The metric only uses the samples inside the fixed mask that are mapped inside the moving mask
+        if fixed_mask is not None: method.SetMetricFixedMask(fixed_mask)
+        if moving_mask is not None: method.SetMetricMovingMask(moving_mask)
+
+        return method
+
+    def define_level_schedule(self, method: sitk.ImageRegistrationMethod) -> sitk.ImageRegistrationMethod:
+        # Report how each level of the pyramid ends (and stop it once its iteration budget is used)
+        self.level_reports = []
+
+        def start_level():
+            if self.level_reports and self.level_reports[-1]['stop_condition'] is None:
+                self.level_reports[-1]['stop_condition'] = method.GetOptimizerStopConditionDescription()
+            self.level_reports.append({'level': method.GetCurrentLevel(), 'iterations': 0, 'metric_value': None, 'stop_condition': None})
+
+        def end_iteration():
+            report = self.level_reports[-1]
+            report['iterations'], report['metric_value'] = method.GetOptimizerIteration() + 1, method.GetMetricValue()
+            if self.level_iterations is not None and report['iterations'] >= self.level_iterations[report['level']]:
+                report['stop_condition'] = f"Iteration budget of the level ({report['iterations']}) reached"
+                method.StopRegistration()
+
+        method.AddCommand(sitk.sitkMultiResolutionIterationEvent, start_level)
+        method.AddCommand(sitk.sitkIterationEvent, end_iteration)
+        return method
+
+    def define_telemetry(self, method: sitk.ImageRegistrationMethod) -> sitk.ImageRegistrationMethod:
+        # A new record for each registration (also needed to stop the levels on a plateau)
+        if self.record_telemetry or self.plateau_window is not None:
+            self.last_telemetry = RegistrationTelemetry(self.plateau_window, self.plateau_tolerance).attach(method)
+
+        return method
+
     def define_multiple_resolutions(self, method: sitk.ImageRegistrationMethod) -> sitk.ImageRegistrationMethod:
         if self.multiple_resolutions:
             method.SetShrinkFactorsPerLevel(shrinkFactors=self.shrinkFactors)
@@ -5,7 +5,9 @@ import SimpleITK as sitk
 import numpy as np
 
 from ..logger import logger
-from .registrator_utils import convert_input
+from .registrator_utils import convert_input, convert_mask, apply_shape
+from .displacement_field import transform_cost, field_cost, use_displacement_field, displacement_field_transform, grid_key
+from .transform_cache import fingerprint_transform
 from .Definers import Definers
 
 
@@ -23,7 +25,7 @@ class RegistratorSupport(Definers):
         resampler = sitk.ResampleImageFilter()
         resampler.SetReferenceImage(fixed_image)
         resampler = self.define_resample_interpolator(resampler)
-        resampler.SetTransform(transform)
+        resampler.SetTransform(self.resampling_transform(fixed_image, transform))
         logger.debug("Resampler setup complete.")
 
         # Resample the image
@@ -31,6 +33,37 @@ class RegistratorSupport(Definers):
         logger.debug("Resampling executed.")
 
         return resampled_image
+
+    def resample_registered(self, fixed_image: sitk.Image | np.ndarray, moving_image: sitk.Image | np.ndarray, transform: sitk.Transform) -> np.ndarray:
+        # Same output as the registration methods (for a transform that was already computed)
+        fixed_image = convert_input(fixed_image)
+        moving_image = convert_input(moving_image)
+        if(self.check_shape): moving_image = apply_shape(fixed_image, moving_image)
+
+        return sitk.GetArrayFromImage(self.resample(fixed_image, moving_image, transform))
+
+    def resample_many(self, fixed_image: sitk.Image | np.ndarray, moving_images: list[sitk.Image | np.ndarray], transform: sitk.Transform) -> list[sitk.Image]:
+        # Several images through the same transform (with a displacement field when it is cheaper)
+        fixed_image = convert_input(fixed_image)
+        transform = self.resampling_transform(fixed_image, transform, len(moving_images))
+
+        return [self.resample(fixed_image, moving_image, transform) for moving_image in moving_images]
+
+    def resampling_transform(self, fixed_image: sitk.Image, transform: sitk.Transform, n_images: int = 1) -> sitk.Transform:
+        # Rigid and affine transforms are always cheaper than a field (and are not fingerprinted)
+        if transform_cost(transform) <= field_cost(fixed_image.GetDimension()): return transform
+
+        # The last displacement field is kept, so the next images resampled with the same transform reuse it
+        key = (fingerprint_transform(transform), grid_key(fixed_image))
+        cached_key, field_transform = getattr(self, '_displacement_field', (None, None))
+        if not use_displacement_field(transform, fixed_image, n_images, is_cached=key == cached_key): return transform
+
+        if key != cached_key:
+            field_transform = displacement_field_transform(transform, fixed_image)
+            self._displacement_field = (key, field_transform)
+            logger.debug(f"Displacement field computed for {n_images} images.")
+
+        return field_transform
     
 
 
@@ -48,4 +81,43 @@ class RegistratorSupport(Definers):
 
         transformed_image = sitk.GetArrayFromImage(resampled)
 
-        return transformed_image
\ No newline at end of file
+        return transformed_image
+
+
+
+    # ================================================================
+    # 3. Section: Registration Results
+    # ================================================================
+    def log_registration(self, registration_method: sitk.ImageRegistrationMethod, registration_time: float) -> None:
+        # Kept so that the transform cache (and the caller) know how the registration ended
+        self.last_registration = {
+            'metric_value': registration_method.GetMetricValue(),
+            'stop_condition': registration_method.GetOptimizerStopConditionDescription(),
+            'iterations': registration_method.GetOptimizerIteration(),
+            'registration_time': registration_time
+        }
+
+        # Convergence of each level (when the level schedule was used)
+        level_reports = getattr(self, 'level_reports', [])
+        if level_reports and level_reports[-1]['stop_condition'] is None: level_reports[-1]['stop_condition'] = self.last_registration['stop_condition']
+        if level_reports: self.last_registration['levels'] = level_reports
+        for report in level_reports:
+            logger.info(f"Level {report['level']}: {report['iterations']} iterations, metric value {report['metric_value']} ({report['stop_condition']})")
+
+        logger.info(f"Final metric value: {self.last_registration['metric_value']}")
+        logger.info(f"Optimizer's stopping condition, {self.last_registration['stop_condition']}")
+
+
+
+    # ================================================================
+    # 4. Section: Metric Masks
+    # ================================================================
+    def convert_masks(self, fixed_image: sitk.Image, moving_image: sitk.Image, fixed_mask: sitk.Image | np.ndarray | None, moving_mask: sitk.Image | np.ndarray | None) -> tuple[sitk.Image | None, sitk.Image | None]:
+        if fixed_mask is not None: fixed_mask = convert_mask(fixed_mask, fixed_image)
+        if moving_mask is not None: moving_mask = convert_mask(moving_mask, moving_image)
+
+        # The moving mask follows the moving image when it is resampled to the fixed shape
+        if moving_mask is not None and self.check_shape and moving_image.GetSize() != fixed_image.GetSize():
+            moving_mask = sitk.Resample(moving_mask, fixed_image, sitk.Transform(), sitk.sitkNearestNeighbor, 0, sitk.sitkUInt8)
+
+        return fixed_mask, moving_mask
\ No newline at end of file
@@ -1,3 +1,6 @@
 from .registrator import Registrator, inspect_template
+from .registration_config import RegistrationConfig
+from .transform_cache import TransformCache
+from .registration_telemetry import RegistrationTelemetry
 from .registrator_utils import *
 from .registrator_methods import *
\ No newline at end of file
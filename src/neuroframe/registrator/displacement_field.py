@@ -0,0 +1,85 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import numpy as np
+import SimpleITK as sitk
+
+
+
+# ──────────────────────────────────────────────────────
+# 0.1 Subsection: Universal Constants
+# ──────────────────────────────────────────────────────
+# Largest displacement field kept in memory (each voxel holds one float64 per dimension)
+MAX_FIELD_BYTES = 1024 ** 3
+
+
+
+# ================================================================
+# 1. Section: Resampling Cost
+# ================================================================
+def transform_cost(transform: sitk.Transform) -> float:
+    """
+    Estimates the cost of evaluating a transform at one point (relative to a linear transform).
+
+    Parameters:
+        transform (sitk.Transform): The transform (composite transforms add the cost of each one).
+
+    Returns:
+        float: The relative cost (1 for rigid and affine, the number of control points for a BSpline).
+    """
+    if not isinstance(transform, sitk.CompositeTransform): transform = transform.Downcast()
+
+    if isinstance(transform, sitk.CompositeTransform):
+        return sum(transform_cost(transform.GetNthTransform(index)) for index in range(transform.GetNumberOfTransforms()))
+    if isinstance(transform, sitk.BSplineTransform): return (transform.GetOrder() + 1) ** transform.GetDimension()
+    if isinstance(transform, sitk.DisplacementFieldTransform): return field_cost(transform.GetDimension())
+    return 1
+
+def field_cost(dimension: int) -> float:
+    # Linear interpolation of the displacement at the 2^dimension neighbouring voxels
+    return 2 ** dimension
+
+def use_displacement_field(transform: sitk.Transform, reference_image: sitk.Image, n_images: int, is_cached: bool = False) -> bool:
+    """
+    Checks whether resampling the images through a precomputed displacement field is cheaper than
+    evaluating the transform at every voxel of every image.
+
+    Parameters:
+        transform (sitk.Transform): The transform the images are resampled with.
+        reference_image (sitk.Image): The image that defines the output grid.
+        n_images (int): Number of images resampled with the transform.
+        is_cached (bool): If the field of this transform (on this grid) was already computed.
+
+    Returns:
+        bool: True if the displacement field should be used.
+    """
+    # Too large to be kept in memory
+    field_bytes = np.prod(reference_image.GetSize()) * reference_image.GetDimension() * 8
+    if field_bytes > MAX_FIELD_BYTES: return False
+
+    # The field costs one evaluation of the transform per voxel (unless cached) and then an interpolation per image
+    direct = n_images * transform_cost(transform)
+    field = (0 if is_cached else transform_cost(transform)) + n_images * field_cost(reference_image.GetDimension())
+    return field < direct
+
+def displacement_field_transform(transform: sitk.Transform, reference_image: sitk.Image) -> sitk.DisplacementFieldTransform:
+    """
+    Evaluates a transform at every voxel of the reference grid, as a displacement field transform.
+
+    Parameters:
+        transform (sitk.Transform): The transform (e.g. a BSpline or a composite transform).
+        reference_image (sitk.Image): The image that defines the grid of the field.
+
+    Returns:
+        sitk.DisplacementFieldTransform: The transform (exact at the voxels of the grid).
+    """
+    field = sitk.TransformToDisplacementField(transform,
+                                              sitk.sitkVectorFloat64,
+                                              reference_image.GetSize(),
+                                              reference_image.GetOrigin(),
+                                              reference_image.GetSpacing(),
+                                              reference_image.GetDirection())
+    return sitk.DisplacementFieldTransform(field)
+
+def grid_key(reference_image: sitk.Image) -> tuple:
+    return (reference_image.GetSize(), reference_image.GetOrigin(), reference_image.GetSpacing(), reference_image.GetDirection())
@@ -0,0 +1,159 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import itertools
+
+import SimpleITK as sitk
+import numpy as np
+from scipy.ndimage import binary_erosion
+from scipy.spatial import cKDTree
+
+
+
+# ================================================================
+# 1. Section: Surface Points
+# ================================================================
+def surface_points(image: sitk.Image, mask: sitk.Image | None = None, max_points: int | None = None, seed: int = 42) -> np.ndarray:
+    """
+    Extracts the surface of the non-zero voxels of an image as physical points.
+
+    Parameters:
+        image (sitk.Image): The (binary or labelled) image, every non-zero voxel is inside the object.
+        mask (sitk.Image | None): Optional mask, only the surface voxels inside it are kept.
+        max_points (int | None): Maximum number of points (a seeded random subset is taken above it).
+        seed (int): Seed of the random subset.
+
+    Returns:
+        np.ndarray: The surface points with shape (N, dimension), in physical (x, y, z) coordinates.
+    """
+    inside = sitk.GetArrayViewFromImage(image) != 0
+    surface = inside & ~binary_erosion(inside)
+    if mask is not None: surface &= sitk.GetArrayViewFromImage(mask) != 0
+
+    # Array indices are in [z, y, x] order, the physical points in [x, y, z]
+    indices = np.argwhere(surface)[:, ::-1]
+    if max_points is not None and len(indices) > max_points:
+        indices = indices[np.random.default_rng(seed).choice(len(indices), max_points, replace=False)]
+
+    return index_to_physical(image, indices)
+
+def index_to_physical(image: sitk.Image, indices: np.ndarray) -> np.ndarray:
+    # Vectorized TransformIndexToPhysicalPoint
+    dimension = image.GetDimension()
+    direction = np.array(image.GetDirection()).reshape(dimension, dimension)
+    return np.array(image.GetOrigin()) + (indices * np.array(image.GetSpacing())) @ direction.T
+
+def object_points(image: sitk.Image) -> np.ndarray:
+    # Physical points of every non-zero voxel (for the principal axes)
+    return index_to_physical(image, np.argwhere(sitk.GetArrayViewFromImage(image) != 0)[:, ::-1])
+
+
+
+# ================================================================
+# 2. Section: Principal Axes
+# ================================================================
+def principal_axes_candidates(fixed_points: np.ndarray, moving_points: np.ndarray) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Builds the rigid transforms (fixed to moving) that match the centroids and the principal axes of two objects.
+
+    The direction of each axis is ambiguous, so every proper rotation (one per sign combination)
+    is returned, together with the transform that only matches the centroids.
+
+    Parameters:
+        fixed_points (np.ndarray): Points of the fixed object, with shape (N, dimension).
+        moving_points (np.ndarray): Points of the moving object, with shape (M, dimension).
+
+    Returns:
+        list[tuple[np.ndarray, np.ndarray]]: (rotation_matrix, translation) pairs, so that a fixed point p goes to rotation_matrix @ p + translation.
+    """
+    fixed_centroid, moving_centroid = fixed_points.mean(axis=0), moving_points.mean(axis=0)
+    fixed_axes = np.linalg.eigh(np.cov((fixed_points - fixed_centroid).T))[1]
+    moving_axes = np.linalg.eigh(np.cov((moving_points - moving_centroid).T))[1]
+
+    dimension = fixed_points.shape[1]
+    rotations = [np.eye(dimension)]
+    for signs in itertools.product((1, -1), repeat=dimension):
+        rotation = moving_axes @ np.diag(signs) @ fixed_axes.T
+        if np.linalg.det(rotation) > 0: rotations.append(rotation)
+
+    return [(rotation, moving_centroid - rotation @ fixed_centroid) for rotation in rotations]
+
+
+
+# ================================================================
+# 3. Section: Trimmed ICP
+# ================================================================
+def trimmed_icp(fixed_points: np.ndarray, moving_tree: cKDTree, rotation: np.ndarray, translation: np.ndarray, trim: float = 0.9, max_iterations: int = 50, tolerance: float = 1e-4) -> tuple[np.ndarray, np.ndarray, float, int]:
+    """
+    Refines a rigid transform (fixed to moving) with the trimmed iterative closest point algorithm.
+
+    At each iteration every fixed point is paired with its closest moving point, the worst pairs
+    (1 - trim of them) are ignored and the rigid transform that best fits the others is solved
+    in closed form (Kabsch). The trimming makes it robust to the parts that only exist in one of
+    the objects (e.g. the olfactory bulbs or the cerebellum cut by the field of view).
+
+    Parameters:
+        fixed_points (np.ndarray): Surface points of the fixed object, with shape (N, dimension).
+        moving_tree (cKDTree): KD-tree with the surface points of the moving object.
+        rotation (np.ndarray): Initial rotation matrix.
+        translation (np.ndarray): Initial translation.
+        trim (float): Fraction of the pairs (the closest ones) used at each iteration.
+        max_iterations (int): Maximum number of iterations.
+        tolerance (float): Relative change of the error below which it stops.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, float, int]: The rotation, translation, final trimmed RMS distance (in physical units) and number of iterations.
+    """
+    moving_points = moving_tree.data
+    kept = max(fixed_points.shape[1] + 1, int(round(trim * len(fixed_points))))
+    error = np.inf
+
+    for iteration in range(1, max_iterations + 1):
+        distances, neighbours = moving_tree.query(fixed_points @ rotation.T + translation, workers=-1)
+        pairs = np.argpartition(distances, kept - 1)[:kept]
+        previous_error, error = error, np.sqrt(np.mean(distances[pairs] ** 2))
+
+        rotation, translation = fit_rigid(fixed_points[pairs], moving_points[neighbours[pairs]])
+        if previous_error - error <= tolerance * error: break
+
+    # Error of the final transform
+    distances = moving_tree.query(fixed_points @ rotation.T + translation, workers=-1)[0]
+    error = np.sqrt(np.mean(np.partition(distances, kept - 1)[:kept] ** 2))
+
+    return rotation, translation, float(error), iteration
+
+def fit_rigid(source: np.ndarray, target: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Least squares rotation and translation from source to target (Kabsch, without reflections)
+    source_centroid, target_centroid = source.mean(axis=0), target.mean(axis=0)
+    u, _, vt = np.linalg.svd((source - source_centroid).T @ (target - target_centroid))
+    signs = np.ones(source.shape[1])
+    signs[-1] = np.sign(np.linalg.det(vt.T @ u.T))
+    rotation = vt.T @ np.diag(signs) @ u.T
+
+    return rotation, target_centroid - rotation @ source_centroid
+
+
+
+# ================================================================
+# 4. Section: SimpleITK Transform
+# ================================================================
+def rigid_to_sitk(rotation: np.ndarray, translation: np.ndarray, center: np.ndarray) -> sitk.Transform:
+    """
+    Converts a rigid transform (fixed to moving) to the transform type of the rigid registration.
+
+    Parameters:
+        rotation (np.ndarray): The rotation matrix.
+        translation (np.ndarray): The translation, so that a fixed point p goes to rotation @ p + translation.
+        center (np.ndarray): The center of rotation (e.g. the centroid of the fixed object).
+
+    Returns:
+        sitk.Transform: A VersorRigid3DTransform (3D) or Euler2DTransform (2D), as returned by the rigid registration.
+    """
+    dimension = len(center)
+    transform = sitk.VersorRigid3DTransform() if dimension == 3 else sitk.Euler2DTransform()
+    transform.SetCenter(np.asarray(center, dtype=float).tolist())
+    transform.SetMatrix(np.asarray(rotation, dtype=float).ravel().tolist())
+
+    # ITK applies rotation @ (p - center) + center + sitk_translation
+    transform.SetTranslation((translation + rotation @ center - center).tolist())
+    return transform
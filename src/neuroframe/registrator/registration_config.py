@@ -0,0 +1,111 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import json
+import hashlib
+
+from dataclasses import dataclass, fields, asdict
+from SimpleITK import ImageRegistrationMethod
+
+
+
+# ================================================================
+# 1. Section: Registration Config
+# ================================================================
+@dataclass(frozen=True)
+class RegistrationConfig:
+    """Hashable and serializable description of everything that changes the result of a registration.
+
+        The fields are named as the ``Registrator`` arguments, so ``Registrator(**config.to_dict())``
+        rebuilds an equivalent registrator. Options that only change how the result is shown or
+        resampled (``view_update``, ``verbose``, ``res_interpolator``, ``record_telemetry``) are not part of it.
+
+        Examples
+        --------
+        >>> config = Registrator(method="rigid", multiple_resolutions=True).config  # doctest: +SKIP
+        >>> config.key  # doctest: +SKIP
+        '5b0c...'"""
+
+    method: str = 'rigid'
+    loss: str = 'MI'
+    optimizer: str = 'GD'
+    dimension: int = 3
+    check_shape: bool = False
+
+    numberOfIterations: int = 100
+    sampling_percentage: float = 0.1
+    sampling_strategy: str = 'random'
+    sampling_seed: int = 42
+    interpolator: str = 'linear'
+    rigid_type: str = 'moments'
+    multiple_resolutions: bool = False
+    shrinkFactors: tuple = (4, 2, 1)
+    smoothingSigmas: tuple = (2, 1, 0)
+    level_iterations: tuple | None = None
+    plateau_window: int | None = None
+    plateau_tolerance: float = 1e-4
+
+    gradientConvergenceTolerance: float = 1e-5
+    maximumNumberOfCorrections: int = 5
+
+    learning_rate: float = 1
+    convergenceMinimumValue: float = 1e-6
+    convergenceWindowSize: int = 10
+    estimateLearningRate: int = ImageRegistrationMethod.Once
+    maximumStepSizeInPhysicalUnits: float = 1.0
+
+    numberOfSteps: tuple = (0, 1, 1, 0, 0, 0)
+    stepLength: float = 1.0
+
+    grid_size: int | tuple = 2
+    bin_size: int = 50
+    mesh_scale_factors: tuple | None = None
+    affine_stage: bool = False
+
+    start_rotations: tuple | None = None
+    screening_iterations: int = 20
+    start_survivors: int = 2
+
+    icp_points: int = 20000
+    icp_trim: float = 0.9
+    icp_tolerance: float = 1e-4
+    icp_principal_axes: bool = True
+
+    def __post_init__(self) -> None:
+        # Lists are stored as tuples, so that the config stays hashable
+        for field in fields(self):
+            value = getattr(self, field.name)
+            if isinstance(value, list): object.__setattr__(self, field.name, as_tuple(value))
+
+    @property
+    def key(self) -> str:
+        return hashlib.blake2b(self.to_json().encode(), digest_size=16).hexdigest()
+
+    # ──────────────────────────────────────────────────────
+    # 1.1 Subsection: Serialization
+    # ──────────────────────────────────────────────────────
+    def to_dict(self) -> dict:
+        return {name: as_list(value) if isinstance(value, tuple) else value for name, value in asdict(self).items()}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    @classmethod
+    def from_dict(cls, config: dict) -> "RegistrationConfig":
+        return cls(**{field.name: config[field.name] for field in fields(cls) if field.name in config})
+
+    @classmethod
+    def from_json(cls, config: str) -> "RegistrationConfig":
+        return cls.from_dict(json.loads(config))
+
+
+
+# ================================================================
+# 2. Section: Nested Sequences
+# ================================================================
+def as_tuple(value: list | tuple) -> tuple:
+    # Nested lists too (e.g. the start rotations)
+    return tuple(as_tuple(item) if isinstance(item, (list, tuple)) else item for item in value)
+
+def as_list(value: list | tuple) -> list:
+    return [as_list(item) if isinstance(item, (list, tuple)) else item for item in value]
@@ -0,0 +1,117 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import json
+import time
+
+import SimpleITK as sitk
+
+from ..logger import logger
+
+
+
+# ================================================================
+# 1. Section: Registration Telemetry
+# ================================================================
+class RegistrationTelemetry:
+    """Convergence history of a single registration, recorded by observers of its events.
+
+        Every optimizer iteration is stored with its level, iteration, metric value and the
+        time since the registration started. Unlike the notebook viewer (``view_update``) it keeps
+        no global state and draws nothing, so it can be used in batch and in parallel runs.
+        Optionally, a level is stopped once its metric plateaus: when the improvement over the
+        last ``plateau_window`` iterations is below ``plateau_tolerance`` times the metric.
+
+        Parameters
+        ----------
+        plateau_window : int | None
+            Number of iterations over which the plateau is checked. If None, the levels are never stopped.
+        plateau_tolerance : float
+            Relative improvement below which the metric is considered on a plateau.
+
+        Examples
+        --------
+        >>> registrator = Registrator(method="rigid", multiple_resolutions=True, record_telemetry=True)  # doctest: +SKIP
+        >>> _, transform = registrator.register(fixed, moving)  # doctest: +SKIP
+        >>> registrator.last_telemetry.save("data/P874/rigid_convergence.json")  # doctest: +SKIP"""
+
+    def __init__(self, plateau_window: int | None = None, plateau_tolerance: float = 1e-4) -> None:
+        self.plateau_window = plateau_window
+        self.plateau_tolerance = plateau_tolerance
+        self.history = []
+        self.level_starts = []
+        self.plateau_levels = []
+        self._start_time = None
+
+    def __repr__(self) -> str:
+        return f"RegistrationTelemetry(iterations={len(self.history)}, levels={len(self.level_starts)})"
+
+    def attach(self, method: sitk.ImageRegistrationMethod) -> "RegistrationTelemetry":
+        method.AddCommand(sitk.sitkStartEvent, self.start)
+        method.AddCommand(sitk.sitkMultiResolutionIterationEvent, self.start_level)
+        method.AddCommand(sitk.sitkIterationEvent, lambda: self.record(method))
+        return self
+
+    # ──────────────────────────────────────────────────────
+    # 1.1 Subsection: Observers
+    # ──────────────────────────────────────────────────────
+    def start(self) -> None:
+        self._start_time = time.perf_counter()
+
+    def start_level(self) -> None:
+        self.level_starts.append(len(self.history))
+
+    def record(self, method: sitk.ImageRegistrationMethod) -> None:
+        level = method.GetCurrentLevel()
+        self.history.append({
+            'level': level,
+            'iteration': method.GetOptimizerIteration(),
+            'metric_value': method.GetMetricValue(),
+            'elapsed': time.perf_counter() - self._start_time
+        })
+
+        # Only the current level stops (the next one still runs)
+        if self.is_plateau():
+            self.plateau_levels.append(level)
+            logger.debug(f"Level {level} stopped on a plateau after {self.history[-1]['iteration'] + 1} iterations.")
+            method.StopRegistration()
+
+    def is_plateau(self) -> bool:
+        if self.plateau_window is None: return False
+
+        level_history = self.history[self.level_starts[-1] if self.level_starts else 0:]
+        if len(level_history) <= self.plateau_window: return False
+
+        # The metrics are minimized, so the improvement is the decrease of the metric
+        current, previous = level_history[-1]['metric_value'], level_history[-1 - self.plateau_window]['metric_value']
+        return previous - current < self.plateau_tolerance * abs(current)
+
+    # ──────────────────────────────────────────────────────
+    # 1.2 Subsection: Summary and Export
+    # ──────────────────────────────────────────────────────
+    def summary(self) -> list[dict]:
+        # Iterations, final metric and time of each level
+        levels = {}
+        for event in self.history:
+            levels.setdefault(event['level'], []).append(event)
+
+        summary, previous_end = [], 0.0
+        for level, events in levels.items():
+            summary.append({'level': level,
+                            'iterations': len(events),
+                            'metric_value': events[-1]['metric_value'],
+                            'elapsed': events[-1]['elapsed'] - previous_end,
+                            'plateau': level in self.plateau_levels})
+            previous_end = events[-1]['elapsed']
+
+        return summary
+
+    def to_dict(self) -> dict:
+        return {'plateau_window': self.plateau_window, 'plateau_tolerance': self.plateau_tolerance,
+                'levels': self.summary(), 'history': self.history}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=4)
+
+    def save(self, path: str) -> None:
+        with open(path, 'w') as file: file.write(self.to_json())
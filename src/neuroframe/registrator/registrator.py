@@ -9,14 +9,16 @@ from SimpleITK import ImageRegistrationMethod
 
 from ..logger import logger
 from .registrator_utils import *
-from .types import Rigid, Affine, BSpline
+from .types import Rigid, Affine, BSpline, ICP
+from .registration_config import RegistrationConfig
+from .transform_cache import TransformCache, fingerprint_transform
 
 
 
 # ================================================================
 # 1. Section: Registrator Class
 # ================================================================
-class Registrator(Rigid, Affine, BSpline):
+class Registrator(Rigid, Affine, BSpline, ICP):
     def __init__(self, 
                  method: str = 'rigid', 
                  loss: str = 'MI', 
@@ -39,6 +41,8 @@ class Registrator(Rigid, Affine, BSpline):
         # Kwargs Default Parameters
         self.numberOfIterations = kwargs['numberOfIterations'] if 'numberOfIterations' in kwargs else 100
         self.sampling_percentage = kwargs['sampling_percentage'] if 'sampling_percentage' in kwargs else 0.1
+        self.sampling_strategy = kwargs['sampling_strategy'] if 'sampling_strategy' in kwargs else 'random'
+        self.sampling_seed = kwargs['sampling_seed'] if 'sampling_seed' in kwargs else 42
         self.reg_interpolator = kwargs['interpolator'] if 'interpolator' in kwargs else 'linear'
         self.res_interpolator = kwargs['res_interpolator'] if 'res_interpolator' in kwargs else 'nearest'
         self.rigid_type = kwargs['rigid_type'] if 'rigid_type' in kwargs else 'moments'
@@ -64,21 +68,74 @@ class Registrator(Rigid, Affine, BSpline):
         ## |----- Default Parameters for Bspline -----|
         self.grid_size = kwargs['grid_size'] if 'grid_size' in kwargs else 2
         self.bin_size = kwargs['bin_size'] if 'bin_size' in kwargs else 50
+        self.mesh_scale_factors = kwargs['mesh_scale_factors'] if 'mesh_scale_factors' in kwargs else None
+        self.affine_stage = kwargs['affine_stage'] if 'affine_stage' in kwargs else False
+
+        ## |----- Multi-Resolution Schedule -----|
+        self.level_iterations = kwargs['level_iterations'] if 'level_iterations' in kwargs else None
+
+        ## |----- Telemetry (and plateau stopping of the levels) -----|
+        self.record_telemetry = kwargs['record_telemetry'] if 'record_telemetry' in kwargs else False
+        self.plateau_window = kwargs['plateau_window'] if 'plateau_window' in kwargs else None
+        self.plateau_tolerance = kwargs['plateau_tolerance'] if 'plateau_tolerance' in kwargs else 1e-4
+        self.last_telemetry = None
+
+        ## |----- Multi-Start Rigid Registration -----|
+        self.start_rotations = kwargs['start_rotations'] if 'start_rotations' in kwargs else None
+        self.screening_iterations = kwargs['screening_iterations'] if 'screening_iterations' in kwargs else 20
+        self.start_survivors = kwargs['start_survivors'] if 'start_survivors' in kwargs else 2
+        self.start_processes = kwargs['start_processes'] if 'start_processes' in kwargs else None
+        self.itk_threads = kwargs['itk_threads'] if 'itk_threads' in kwargs else None
+
+        ## |----- Surface ICP (method 'icp' or rigid_type 'icp') -----|
+        self.icp_points = kwargs['icp_points'] if 'icp_points' in kwargs else 20000
+        self.icp_trim = kwargs['icp_trim'] if 'icp_trim' in kwargs else 0.9
+        self.icp_tolerance = kwargs['icp_tolerance'] if 'icp_tolerance' in kwargs else 1e-4
+        self.icp_principal_axes = kwargs['icp_principal_axes'] if 'icp_principal_axes' in kwargs else True
 
         ## |----- Composite Transform -----|
         self.isComposite = kwargs['isComposite'] if 'isComposite' in kwargs else False
         self.composite = kwargs['composite'] if 'composite' in kwargs else []
 
+        ## |----- Transform Cache -----|
+        self.cache_folder = kwargs['cache_folder'] if 'cache_folder' in kwargs else None
+        self.last_registration = None
+
+    @property
+    def config(self) -> RegistrationConfig:
+        # The config fields are named as the arguments (only the registration interpolator is stored with another name)
+        return RegistrationConfig.from_dict({**vars(self), 'interpolator': self.reg_interpolator})
+
+    @classmethod
+    def from_config(cls, config: RegistrationConfig, **kwargs) -> "Registrator":
+        return cls(**config.to_dict(), **kwargs)
+
     def register(self, fixed_image: sitk.Image | np.ndarray, moving_image: sitk.Image | np.ndarray, **kwargs) -> sitk.Image:
 
         self.composite = kwargs['composite'] if 'composite' in kwargs else self.composite
+        fixed_mask = kwargs['fixed_mask'] if 'fixed_mask' in kwargs else None
+        moving_mask = kwargs['moving_mask'] if 'moving_mask' in kwargs else None
+        cache_folder = kwargs['cache_folder'] if 'cache_folder' in kwargs else self.cache_folder
+
+        # Reuse the transform of a previous registration of the same images with the same config
+        if cache_folder is not None:
+            transform_cache = TransformCache(cache_folder)
+            composite_fingerprints = ''.join(fingerprint_transform(transform) for transform in self.composite) if self.isComposite else ''
+            key = transform_cache.key(self.config, fixed_image, moving_image, fixed_mask, moving_mask, extra=composite_fingerprints)
+            cached = transform_cache.load(key)
+            if cached is not None:
+                transform, self.last_registration = cached
+                logger.info(f"Using the cached transform (final metric value: {self.last_registration['metric_value']})")
+                return self.resample_registered(fixed_image, moving_image, transform), transform
 
         if(self.verbose >= 1): print(f"NR_Registrator: Registrator initialized with method: {self.method}, loss: {self.loss}, optimizer: {self.optimizer}, dimension: {self.dimension}")
-        if(self.method == 'rigid'): results = self.rigid_transform(fixed_image, moving_image)
-        elif(self.method == 'bspline' or self.method == 'deform'): results = self.deform_transform(fixed_image, moving_image)
-        elif(self.method == 'affine'): results = self.affine_transform(fixed_image, moving_image)
-        else: logger.error(f"Method {self.method} not supported yet.")
+        if(self.method == 'rigid'): results = self.rigid_transform(fixed_image, moving_image, fixed_mask, moving_mask)
+        elif(self.method == 'bspline' or self.method == 'deform'): results = self.deform_transform(fixed_image, moving_image, fixed_mask, moving_mask)
+        elif(self.method == 'affine'): results = self.affine_transform(fixed_image, moving_image, fixed_mask, moving_mask)
+        elif(self.method == 'icp'): results = self.icp_transform(fixed_image, moving_image, fixed_mask, moving_mask)
+        else: raise ValueError(f"Method {self.method} not supported yet, use 'rigid', 'affine', 'bspline' or 'icp'.")
 
+        if cache_folder is not None: transform_cache.save(key, results[1], {**self.last_registration, 'config': self.config.to_dict()})
         return results
 
 def inspect_template(skull_surface, template, deformed):
@@ -19,4 +19,24 @@ SUTURE_REGISTRATOR = Registrator(method="deform",
                                     convergenceWindowSize=100, 
                                     learningRate=1e-20, 
                                     sampling_percentage=1, 
+                                    bin_size=100)
+
+# Opt-in coarse-to-fine alternative (faster, not yet validated on the bregma and lambda landmarks):
+# the 5x5 mesh is fitted on the shrunk images and only doubled (to the 10x10 mesh) at full resolution
+SUTURE_PYRAMID_REGISTRATOR = Registrator(method="deform", 
+                                    loss="MI", 
+                                    optimizer="GD", 
+                                    dimension=2, 
+                                    numberOfIterations=1000, 
+                                    check_shape=True, 
+                                    grid_size=5,
+                                    multiple_resolutions=True,
+                                    shrinkFactors=[4, 2, 1],
+                                    smoothingSigmas=[2, 1, 0],
+                                    mesh_scale_factors=[1, 1, 2],
+                                    level_iterations=[300, 200, 50],
+                                    convergenceMinimumValue=1e-25, 
+                                    convergenceWindowSize=100, 
+                                    learningRate=1e-20, 
+                                    sampling_percentage=0.25, 
                                     bin_size=100)
\ No newline at end of file
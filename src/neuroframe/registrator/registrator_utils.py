@@ -6,27 +6,211 @@ import cv2
 import SimpleITK as sitk
 import numpy as np
 
+from contextlib import contextmanager
+
 from ..logger import logger
+from ..mouse_data import MedicalImage
 from .itk_utils import *
 
+# Converted images of the arrays in the current conversion_cache block (None outside of it)
+_CONVERSION_CACHE: dict | None = None
+
 
 
 # ================================================================
 # 1. Section: Utils
 # ================================================================
-def convert_input(input: sitk.Image | np.ndarray) -> sitk.Image:
+def convert_input(input: sitk.Image | np.ndarray | MedicalImage, spacing: tuple | None = None, origin: tuple | None = None, direction: tuple | None = None) -> sitk.Image:
     """
-    Converts the input to a SimpleITK image if it is a numpy array.
-    
+    Converts the input to a float32 SimpleITK image if it is a numpy array (or a MedicalImage).
+
+    The array is only copied once (SimpleITK always copies it), not when it is already float32.
+    A MedicalImage keeps the voxel size and orientation of its file; a plain array has unit
+    spacing unless the geometry is given. Inside a ``conversion_cache`` block, each array is
+    only converted once.
+
     Parameters:
-        input (sitk.Image | np.ndarray): The input image to be converted.
-        
+        input (sitk.Image | np.ndarray | MedicalImage): The input image to be converted.
+        spacing (tuple | None): Spacing of the [x, y, z] axes (the reversed array axes).
+        origin (tuple | None): Physical position of the first voxel.
+        direction (tuple | None): Flattened direction cosines matrix.
+
     Returns:
         sitk.Image: The converted SimpleITK image.
     """
-    if isinstance(input, np.ndarray):
-        return sitk.GetImageFromArray(input.astype(np.float32))
-    return input
+    if isinstance(input, sitk.Image): return input
+    if isinstance(input, MedicalImage):
+        spacing, origin, direction = medical_image_geometry(input)
+        input = input.data
+
+    # Reuse the conversion of the same array (with the same geometry) within a conversion_cache block
+    spacing, origin, direction = [None if value is None else tuple(value) for value in (spacing, origin, direction)]
+    key = (id(input), spacing, origin, direction)
+    if _CONVERSION_CACHE is not None and key in _CONVERSION_CACHE: return _CONVERSION_CACHE[key][1]
+
+    image = sitk.GetImageFromArray(input.astype(np.float32, copy=False))
+    if spacing is not None: image.SetSpacing(spacing)
+    if origin is not None: image.SetOrigin(origin)
+    if direction is not None: image.SetDirection(direction)
+
+    # The array is kept with its image, so that its id is not reused by another array in the block
+    if _CONVERSION_CACHE is not None: _CONVERSION_CACHE[key] = (input, image)
+    return image
+
+def medical_image_geometry(image: MedicalImage) -> tuple[tuple, tuple, tuple]:
+    """
+    Converts the affine of a MedicalImage (NIfTI, RAS) to the geometry of a SimpleITK image (LPS).
+
+    Parameters:
+        image (MedicalImage): The image, with the affine of its file.
+
+    Returns:
+        tuple[tuple, tuple, tuple]: The spacing, origin and (flattened) direction of the SimpleITK image.
+    """
+    # The array axes [i, j, k] are the [z, y, x] axes of the SimpleITK image, and ITK is in LPS
+    affine = np.diag([-1, -1, 1, 1]) @ np.asarray(image.affine, dtype=float)
+    axes = affine[:3, :3][:, ::-1]
+    spacing = np.linalg.norm(axes, axis=0)
+
+    return tuple(spacing.tolist()), tuple(affine[:3, 3].tolist()), tuple((axes / spacing).ravel().tolist())
+
+@contextmanager
+def conversion_cache():
+    """
+    Within the block, each array given to convert_input is converted once and then reused
+    (e.g. the template that several volumes are resampled to). The arrays must not be
+    modified in place inside the block, and they are kept alive until it ends.
+    """
+    global _CONVERSION_CACHE
+    if _CONVERSION_CACHE is not None:
+        yield
+        return
+
+    _CONVERSION_CACHE = {}
+    try: yield
+    finally: _CONVERSION_CACHE = None
+
+def convert_mask(mask: sitk.Image | np.ndarray, reference_image: sitk.Image) -> sitk.Image:
+    """
+    Converts a mask to a SimpleITK image in the same physical space as the reference image.
+
+    Parameters:
+        mask (sitk.Image | np.ndarray): The mask (non-zero voxels are inside).
+        reference_image (sitk.Image): The image the mask belongs to.
+
+    Returns:
+        sitk.Image: The mask as an 8-bit SimpleITK image.
+    """
+    if isinstance(mask, np.ndarray):
+        mask = sitk.GetImageFromArray((mask != 0).astype(np.uint8))
+        mask.CopyInformation(reference_image)
+        return mask
+    return sitk.Cast(mask != 0, sitk.sitkUInt8)
+
+def build_registration_mask(image: sitk.Image | np.ndarray, dilation: int = 0) -> sitk.Image:
+    """
+    Builds a metric mask with the non-zero voxels of an image, optionally dilated.
+
+    Parameters:
+        image (sitk.Image | np.ndarray): The image (e.g. a binary segmentation or a skull surface).
+        dilation (int): Radius (in voxels) of the dilation, so that the borders of the object are kept.
+
+    Returns:
+        sitk.Image: The mask as an 8-bit SimpleITK image (in the same physical space as the image).
+    """
+    mask = convert_mask(image, convert_input(image))
+    if(dilation > 0): mask = sitk.BinaryDilate(mask, [dilation] * mask.GetDimension())
+    return mask
+
+def compose_transforms(transforms: list[sitk.Transform], dimension: int) -> sitk.CompositeTransform:
+    """
+    Composes the transforms in the order they are applied to the moving image (as a CompositeTransform).
+
+    Parameters:
+        transforms (list[sitk.Transform]): The transforms, the last one is the first applied to the points.
+        dimension (int): The dimension of the transforms.
+
+    Returns:
+        sitk.CompositeTransform: The composed transform.
+    """
+    composite_transform = sitk.CompositeTransform(dimension)
+    for transform in transforms: composite_transform.AddTransform(transform)
+    return composite_transform
+
+def inverse_transform_point(transform: sitk.Transform, point: np.ndarray, tolerance: float = 1e-4, max_iterations: int = 50) -> np.ndarray:
+    """
+    Finds the point that the transform maps to the given point (the inverse of TransformPoint).
+
+    A registration transform maps the fixed image to the moving one, so a landmark of the moving
+    image is brought to the fixed image with its inverse. Deformable transforms have no closed
+    form inverse, so it is solved with Newton's method (with a finite differences Jacobian).
+
+    Parameters:
+        transform (sitk.Transform): The (fixed to moving) transform.
+        point (np.ndarray): The point in the moving space (physical coordinates).
+        tolerance (float): Maximum distance between the transformed solution and the point.
+        max_iterations (int): Maximum number of Newton iterations.
+
+    Returns:
+        np.ndarray: The point in the fixed space.
+    """
+    point = np.asarray(point, dtype=float)
+    transform_point = lambda position: np.array(transform.TransformPoint(position.tolist()))
+
+    solution = point.copy()
+    for _ in range(max_iterations):
+        residual = transform_point(solution) - point
+        if np.linalg.norm(residual) < tolerance: break
+
+        # Jacobian of the transform at the current solution (central differences, one unit step)
+        jacobian = np.stack([(transform_point(solution + step) - transform_point(solution - step)) / 2 for step in np.eye(len(point))], axis=1)
+        solution = solution - np.linalg.solve(jacobian, residual)
+    else: logger.warning(f"The inverse of the transform did not converge for the point {point} (residual {np.linalg.norm(residual)}).")
+
+    return solution
+
+def axis_rotation_starts(angle: float, dimension: int) -> list[tuple]:
+    """
+    Builds the initial rotations of a multi-start registration: no rotation and ±angle about each axis.
+
+    Parameters:
+        angle (float): The rotation (in degrees) about each axis.
+        dimension (int): The dimension of the registration (2 has a single rotation axis).
+
+    Returns:
+        list[tuple]: The rotations in degrees, (x, y, z) angles in 3D and (angle,) in 2D.
+    """
+    axes = 3 if dimension == 3 else 1
+    starts = [(0.0,) * axes]
+    for axis in range(axes):
+        for sign in (1, -1):
+            rotation = [0.0] * axes
+            rotation[axis] = sign * float(angle)
+            starts.append(tuple(rotation))
+    return starts
+
+def rotate_transform(transform: sitk.Transform, rotation: tuple) -> sitk.Transform:
+    """
+    Returns a copy of a rigid transform with an extra rotation about its center.
+
+    Parameters:
+        transform (sitk.Transform): The rigid transform (e.g. from CenteredTransformInitializer).
+        rotation (tuple): The rotation in degrees, (x, y, z) angles in 3D and (angle,) in 2D.
+
+    Returns:
+        sitk.Transform: The rotated transform (same type, center and translation).
+    """
+    dimension = transform.GetDimension()
+    if(dimension == 3): extra = sitk.Euler3DTransform((0, 0, 0), *np.radians(rotation))
+    else: extra = sitk.Euler2DTransform((0, 0), float(np.radians(rotation[0])))
+
+    # The rotation is applied on top of the current one, so the center and translation are kept
+    transform = transform.Downcast()
+    rotated = type(transform)(transform)
+    matrix = np.array(transform.GetMatrix()).reshape(dimension, dimension)
+    rotated.SetMatrix((matrix @ np.array(extra.GetMatrix()).reshape(dimension, dimension)).ravel().tolist())
+    return rotated
+
 def apply_shape(fixed_image: sitk.Image, moving_image: sitk.Image) -> sitk.Image:
     """
     Resizes the fixed_image to match the shape of moving_image if they differ.
@@ -0,0 +1,116 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import os
+import json
+import hashlib
+
+import numpy as np
+import SimpleITK as sitk
+
+from ..logger import logger
+from ..mouse_data import MedicalImage
+from ..utils.cache_utils import fingerprint_array
+from .registration_config import RegistrationConfig
+
+
+
+# ================================================================
+# 1. Section: Transform Cache
+# ================================================================
+class TransformCache:
+    """On-disk cache of the transforms found by a registration.
+
+        Each entry is a ``.tfm`` file with the transform and a ``.json`` file with its metadata
+        (final metric value, optimizer stop condition, registration time and config). Entries are
+        keyed by the fingerprints of the fixed and moving images (and masks) and by the
+        ``RegistrationConfig``, so any change of the inputs or of the parameters is a new entry.
+
+        Parameters
+        ----------
+        folder : str
+            Folder where the transforms are stored.
+
+        Examples
+        --------
+        >>> cache = TransformCache("data/P874/.transform_cache")  # doctest: +SKIP
+        >>> key = cache.key(config, fixed_image, moving_image)  # doctest: +SKIP
+        >>> transform, metadata = cache.load(key)  # doctest: +SKIP"""
+
+    def __init__(self, folder: str) -> None:
+        self.folder = folder
+        os.makedirs(self.folder, exist_ok=True)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._path(key, 'json'))
+
+    def __repr__(self) -> str:
+        return f'TransformCache(folder="{self.folder}")'
+
+    # ──────────────────────────────────────────────────────
+    # 1.1 Subsection: Keys
+    # ──────────────────────────────────────────────────────
+    @staticmethod
+    def key(config: RegistrationConfig, *images: sitk.Image | np.ndarray | MedicalImage | None, extra: str = '') -> str:
+        # Every image (or mask) is identified by its content and its physical space (None for missing masks)
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(config.key.encode())
+        for image in images:
+            hasher.update(fingerprint_image(image).encode())
+        hasher.update(extra.encode())
+
+        return hasher.hexdigest()
+
+    # ──────────────────────────────────────────────────────
+    # 1.2 Subsection: Save and Load
+    # ──────────────────────────────────────────────────────
+    def save(self, key: str, transform: sitk.Transform, metadata: dict) -> None:
+        # Write to temporary files first, the metadata last, so that a crash never leaves a partial entry
+        temp_key = f"{key}.{os.getpid()}.tmp"
+        sitk.WriteTransform(flatten_transform(transform), self._path(temp_key, 'tfm'))
+        with open(self._path(temp_key, 'json'), 'w') as file: json.dump(metadata, file, indent=4)
+        os.replace(self._path(temp_key, 'tfm'), self._path(key, 'tfm'))
+        os.replace(self._path(temp_key, 'json'), self._path(key, 'json'))
+
+        logger.debug(f"Cached transform {key} (metric {metadata.get('metric_value')})")
+
+    def load(self, key: str) -> tuple[sitk.Transform, dict] | None:
+        if key not in self: return None
+
+        transform = sitk.ReadTransform(self._path(key, 'tfm'))
+        with open(self._path(key, 'json')) as file: metadata = json.load(file)
+
+        logger.debug(f"Loaded cached transform {key} (metric {metadata.get('metric_value')})")
+        return transform, metadata
+
+    def _path(self, key: str, extension: str) -> str:
+        return os.path.join(self.folder, f"{key}.{extension}")
+
+
+
+# ================================================================
+# 2. Section: Fingerprints
+# ================================================================
+def fingerprint_image(image: sitk.Image | np.ndarray | MedicalImage | None) -> str:
+    if image is None: return 'none'
+    if isinstance(image, np.ndarray): return fingerprint_array(image)
+    if isinstance(image, MedicalImage): return fingerprint_array(image.data, np.asarray(image.affine, dtype=float))
+
+    # The physical space is part of the image (the same voxels with a different spacing register differently)
+    geometry = np.array([*image.GetSpacing(), *image.GetOrigin(), *image.GetDirection()])
+    return fingerprint_array(sitk.GetArrayViewFromImage(image), geometry)
+
+def flatten_transform(transform: sitk.Transform) -> sitk.Transform:
+    # A .tfm file cannot hold nested composite transforms (the flattening is done on a copy)
+    if not isinstance(transform, sitk.CompositeTransform): return transform
+    transform = sitk.CompositeTransform(transform)
+    transform.FlattenTransform()
+    return transform
+
+def fingerprint_transform(transform: sitk.Transform) -> str:
+    # A composite transform only exposes the parameters of its last transform, so each one is included
+    if isinstance(transform, sitk.CompositeTransform):
+        hasher = hashlib.blake2b(digest_size=16)
+        for index in range(transform.GetNumberOfTransforms()): hasher.update(fingerprint_transform(transform.GetNthTransform(index)).encode())
+        return hasher.hexdigest()
+    return fingerprint_array(np.array(transform.GetParameters()), np.array(transform.GetFixedParameters()))
@@ -17,17 +17,18 @@ from ..RegistratorSupport import RegistratorSupport
 # 1. Section: Affine Class
 # ================================================================
 class Affine(RegistratorSupport):
-    def affine_transform(self, fixed_image: sitk.Image | np.ndarray, moving_image: sitk.Image | np.ndarray) -> tuple[np.ndarray, sitk.Transform]:
+    def affine_transform(self, fixed_image: sitk.Image | np.ndarray, moving_image: sitk.Image | np.ndarray, fixed_mask: sitk.Image | np.ndarray | None = None, moving_mask: sitk.Image | np.ndarray | None = None) -> tuple[np.ndarray, sitk.Transform]:
         
         # Properly convert the images to SimpleITK format
         fixed_image = convert_input(fixed_image)
         moving_image = convert_input(moving_image)
+        fixed_mask, moving_mask = self.convert_masks(fixed_image, moving_image, fixed_mask, moving_mask)
 
         # Check if the fixed and moving images have the same size, if not resamples the moving image
         if(self.check_shape): moving_image = apply_shape(fixed_image, moving_image)
 
         # Initialize the affine registration
-        registration_method = self.setup_affine(fixed_image, moving_image)
+        registration_method = self.setup_affine(fixed_image, moving_image, fixed_mask, moving_mask)
 
         # Execute registration
         start_time = time.time()
@@ -42,8 +43,7 @@ class Affine(RegistratorSupport):
         registered_np = sitk.GetArrayFromImage(resampled_image)
 
         # Log final metrics
-        logger.info(f"Final metric value: {registration_method.GetMetricValue()}")
-        logger.info(f"Optimizer's stopping condition, {registration_method.GetOptimizerStopConditionDescription()}")
+        self.log_registration(registration_method, registration_time)
 
         return registered_np, transform
     
@@ -51,7 +51,7 @@ class Affine(RegistratorSupport):
     # ──────────────────────────────────────────────────────
     # 1.1 Subsection: Setup Affine Registration
     # ──────────────────────────────────────────────────────
-    def setup_affine(self, fixed_image: sitk.Image, moving_image: sitk.Image) -> sitk.ImageRegistrationMethod:
+    def setup_affine(self, fixed_image: sitk.Image, moving_image: sitk.Image, fixed_mask: sitk.Image | None = None, moving_mask: sitk.Image | None = None) -> sitk.ImageRegistrationMethod:
         # Initialize the registration method
         registration_method = sitk.ImageRegistrationMethod()
 
@@ -59,14 +59,17 @@ class Affine(RegistratorSupport):
         registration_method = self.define_loss(registration_method)
         registration_method = self.define_registration_interpolator(registration_method)
         registration_method = self.define_optimizer(registration_method)
-        registration_method.SetMetricSamplingPercentage(self.sampling_percentage)
+        registration_method = self.define_sampling(registration_method)
+        registration_method = self.define_masks(registration_method, fixed_mask, moving_mask)
         registration_method.SetOptimizerScalesFromPhysicalShift()
 
         # Connect all of the observers so that we can perform plotting during registration.
         if(self.view_update): registration_method = view_registration(registration_method)
 
-        # Allow for multi-resolution registration
+        # Allow for multi-resolution registration (with a per level iteration budget)
         registration_method = self.define_multiple_resolutions(registration_method)
+        registration_method = self.define_level_schedule(registration_method)
+        registration_method = self.define_telemetry(registration_method)
         
         # Create the transform
         initial_transform = sitk.CenteredTransformInitializer(fixed_image,
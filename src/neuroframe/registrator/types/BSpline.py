@@ -6,7 +6,7 @@ import time
 import SimpleITK as sitk
 import numpy as np
 
-from ..registrator_utils import convert_input, apply_shape, view_registration
+from ..registrator_utils import convert_input, apply_shape, view_registration, compose_transforms
 from ...logger import logger
 from ..itk_utils import *
 from ..RegistratorSupport import RegistratorSupport
@@ -17,16 +17,21 @@ from ..RegistratorSupport import RegistratorSupport
 # 1. Section: BSpline Class
 # ================================================================
 class BSpline(RegistratorSupport):
-    def deform_transform(self, fixed_image: sitk.Image | np.ndarray, moving_image: sitk.Image | np.ndarray) -> tuple[np.ndarray, sitk.Transform]:
+    def deform_transform(self, fixed_image: sitk.Image | np.ndarray, moving_image: sitk.Image | np.ndarray, fixed_mask: sitk.Image | np.ndarray | None = None, moving_mask: sitk.Image | np.ndarray | None = None) -> tuple[np.ndarray, sitk.Transform]:
         # Properly convert the images to SimpleITK format
         fixed_image = convert_input(fixed_image)
         moving_image = convert_input(moving_image)
+        fixed_mask, moving_mask = self.convert_masks(fixed_image, moving_image, fixed_mask, moving_mask)
 
         # Check if the fixed and moving images have the same size, if not resamples the moving image
         if(self.check_shape): moving_image = apply_shape(fixed_image, moving_image)
 
+        # Transforms applied before the BSpline: the previous ones and, optionally, an affine stage
+        initial_transforms = list(self.composite) if self.isComposite else []
+        if(self.affine_stage): initial_transforms.append(self.affine_stage_transform(fixed_image, moving_image, fixed_mask, moving_mask, initial_transforms))
+
         # Initialize the deformable registration
-        registration_method = self.setup_deform(fixed_image, moving_image)
+        registration_method = self.setup_deform(fixed_image, moving_image, fixed_mask, moving_mask, initial_transforms)
         
         # Execute registration
         start_time = time.time()
@@ -34,6 +39,9 @@ class BSpline(RegistratorSupport):
         registration_time = time.time() - start_time
         logger.debug(f"BSpline registration executed in {registration_time}.")
 
+        # In the staged schedule only the BSpline is optimized, so the initial transforms are added back
+        if(self.is_staged_bspline): transform = compose_transforms([*initial_transforms, transform], fixed_image.GetDimension())
+
         # Resample moving image
         resampled_image = self.resample(fixed_image, moving_image, transform)
 
@@ -41,14 +49,17 @@ class BSpline(RegistratorSupport):
         deformed_np = sitk.GetArrayFromImage(resampled_image)
 
         # Log final metrics
-        logger.info(f"Final metric value: {registration_method.GetMetricValue()}")
-        logger.info(f"Optimizer's stopping condition, {registration_method.GetOptimizerStopConditionDescription()}")
+        self.log_registration(registration_method, registration_time)
 
         return deformed_np, transform
     
 
+    @property
+    def is_staged_bspline(self) -> bool:
+        return self.mesh_scale_factors is not None or self.affine_stage
+
     # |----- Setup -----|
-    def setup_deform(self, fixed_image: sitk.Image, moving_image: sitk.Image) -> sitk.ImageRegistrationMethod:
+    def setup_deform(self, fixed_image: sitk.Image, moving_image: sitk.Image, fixed_mask: sitk.Image | None = None, moving_mask: sitk.Image | None = None, initial_transforms: list[sitk.Transform] | None = None) -> sitk.ImageRegistrationMethod:
         # Initialize the registration method
         registration_method = sitk.ImageRegistrationMethod()
 
@@ -56,20 +67,30 @@ class BSpline(RegistratorSupport):
         registration_method = self.define_loss(registration_method)
         registration_method = self.define_registration_interpolator(registration_method)
         registration_method = self.define_optimizer(registration_method)
-        registration_method.SetMetricSamplingPercentage(self.sampling_percentage)
+        registration_method = self.define_sampling(registration_method)
+        registration_method = self.define_masks(registration_method, fixed_mask, moving_mask)
         registration_method.SetOptimizerScalesFromPhysicalShift()
 
         # Connect all of the observers so that we can perform plotting during registration.
         if(self.view_update): registration_method = view_registration(registration_method)
 
-        # Allow for multi-resolution registration
+        # Allow for multi-resolution registration (with a per level iteration budget)
         registration_method = self.define_multiple_resolutions(registration_method)
+        registration_method = self.define_level_schedule(registration_method)
+        registration_method = self.define_telemetry(registration_method)
 
         # Deformable transform
         if isinstance(self.grid_size, int):
             grid_size = [self.grid_size] * fixed_image.GetDimension()
         else:
             grid_size = self.grid_size
+
+        if(self.is_staged_bspline):
+            # The initial transforms stay fixed and the BSpline mesh is refined at each level (e.g. [1, 2, 4] doubles it)
+            if initial_transforms: registration_method.SetMovingInitialTransform(compose_transforms(initial_transforms, fixed_image.GetDimension()))
+            bspline_transform = sitk.BSplineTransformInitializer(fixed_image, grid_size)
+            registration_method.SetInitialTransformAsBSpline(bspline_transform, inPlace=False, scaleFactors=list(self.mesh_scale_factors or []))
+            return registration_method
         
         if(self.isComposite):
             # Create BSpline transform
@@ -86,4 +107,14 @@ class BSpline(RegistratorSupport):
 
         registration_method.SetInitialTransform(composite_transform, inPlace=False)
 
-        return registration_method
\ No newline at end of file
+        return registration_method
+
+    # |----- Affine Stage -----|
+    def affine_stage_transform(self, fixed_image: sitk.Image, moving_image: sitk.Image, fixed_mask: sitk.Image | None, moving_mask: sitk.Image | None, initial_transforms: list[sitk.Transform]) -> sitk.Transform:
+        # Affine registration (after the initial transforms) so that the BSpline only models the local deformation
+        registration_method = self.setup_affine(fixed_image, moving_image, fixed_mask, moving_mask)
+        if initial_transforms: registration_method.SetMovingInitialTransform(compose_transforms(initial_transforms, fixed_image.GetDimension()))
+        affine_transform = registration_method.Execute(fixed_image, moving_image)
+
+        logger.info(f"Affine stage final metric value: {registration_method.GetMetricValue()}")
+        return affine_transform
\ No newline at end of file
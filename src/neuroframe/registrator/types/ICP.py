@@ -0,0 +1,80 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import time
+
+import SimpleITK as sitk
+import numpy as np
+from scipy.spatial import cKDTree
+
+from ..registrator_utils import convert_input, apply_shape
+from ..point_cloud import surface_points, object_points, principal_axes_candidates, trimmed_icp, rigid_to_sitk
+from ...logger import logger
+from ..RegistratorSupport import RegistratorSupport
+
+# ──────────────────────────────────────────────────────
+# 0.1 Subsection: Universal Constants
+# ──────────────────────────────────────────────────────
+# Minimum number of points used to choose the initial transform
+ICP_SCREENING_POINTS = 1000
+
+
+
+# ================================================================
+# 1. Section: ICP Class
+# ================================================================
+class ICP(RegistratorSupport):
+    def icp_transform(self, fixed_image: sitk.Image | np.ndarray, moving_image: sitk.Image | np.ndarray, fixed_mask: sitk.Image | np.ndarray | None = None, moving_mask: sitk.Image | np.ndarray | None = None) -> tuple[np.ndarray, sitk.Transform]:
+
+        # Properly convert the images to SimpleITK format
+        fixed_image = convert_input(fixed_image)
+        moving_image = convert_input(moving_image)
+        fixed_mask, moving_mask = self.convert_masks(fixed_image, moving_image, fixed_mask, moving_mask)
+
+        # Check if the fixed and moving images have the same size, if not resamples the moving image
+        if(self.check_shape): moving_image = apply_shape(fixed_image, moving_image)
+
+        # Align the surfaces of the (binary) objects
+        transform = self.execute_icp(fixed_image, moving_image, fixed_mask, moving_mask)
+
+        # Resample moving image
+        resampled_image = self.resample(fixed_image, moving_image, transform)
+        logger.debug("Resampling complete.")
+
+        # Convert back to numpy
+        registered_np = sitk.GetArrayFromImage(resampled_image)
+
+        return registered_np, transform
+
+    def execute_icp(self, fixed_image: sitk.Image, moving_image: sitk.Image, fixed_mask: sitk.Image | None = None, moving_mask: sitk.Image | None = None) -> sitk.Transform:
+        start_time = time.time()
+
+        # Surface points of both objects (the non-zero voxels), the moving ones in a KD-tree
+        fixed_points = surface_points(fixed_image, fixed_mask, self.icp_points, self.sampling_seed)
+        moving_tree = cKDTree(surface_points(moving_image, moving_mask, self.icp_points, self.sampling_seed))
+        logger.debug(f"ICP with {len(fixed_points)} fixed and {moving_tree.n} moving surface points.")
+
+        # Start from the principal axes (every axis orientation) or only from the centroids
+        candidates = principal_axes_candidates(object_points(fixed_image), object_points(moving_image))
+        if not self.icp_principal_axes: candidates = candidates[:1]
+
+        # Keep the candidate that converges to the smallest trimmed distance (on a subset of the points), then refine it with all of them
+        screening_size = max(len(fixed_points) // 10, ICP_SCREENING_POINTS)
+        screening_points = fixed_points[np.random.default_rng(self.sampling_seed).permutation(len(fixed_points))[:screening_size]]
+        results = [trimmed_icp(screening_points, moving_tree, rotation, translation, self.icp_trim, self.numberOfIterations, self.icp_tolerance) for rotation, translation in candidates]
+        rotation, translation = min(results, key=lambda result: result[2])[:2]
+        rotation, translation, error, iterations = trimmed_icp(fixed_points, moving_tree, rotation, translation, self.icp_trim, self.numberOfIterations, self.icp_tolerance)
+        transform = rigid_to_sitk(rotation, translation, fixed_points.mean(axis=0))
+        registration_time = time.time() - start_time
+        logger.debug(f"ICP registration executed in {registration_time}.")
+
+        # Same results as the intensity registrations (the metric is the trimmed RMS distance)
+        self.last_registration = {
+            'metric_value': error,
+            'stop_condition': f"Trimmed ICP from {len(candidates)} initial transforms",
+            'iterations': iterations,
+            'registration_time': registration_time
+        }
+        logger.info(f"Final metric value: {error}")
+
+        return transform
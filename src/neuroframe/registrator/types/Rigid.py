@@ -1,12 +1,15 @@
 # ================================================================
 # 0. Section: Imports
 # ================================================================
+import os
+import copy
 import time
+from multiprocessing import Pool
 
 import SimpleITK as sitk
 import numpy as np
 
-from ..registrator_utils import convert_input, apply_shape, view_registration
+from ..registrator_utils import convert_input, apply_shape, view_registration, rotate_transform
 from ...logger import logger
 from ..itk_utils import *
 from ..RegistratorSupport import RegistratorSupport
@@ -17,17 +20,33 @@ from ..RegistratorSupport import RegistratorSupport
 # 1. Section: Rigid Class
 # ================================================================
 class Rigid(RegistratorSupport):
-    def rigid_transform(self, fixed_image: sitk.Image | np.ndarray, moving_image: sitk.Image | np.ndarray) -> tuple[np.ndarray, sitk.Transform]:
-        
+    def rigid_transform(self, fixed_image: sitk.Image | np.ndarray, moving_image: sitk.Image | np.ndarray, fixed_mask: sitk.Image | np.ndarray | None = None, moving_mask: sitk.Image | np.ndarray | None = None) -> tuple[np.ndarray, sitk.Transform]:
+
         # Properly convert the images to SimpleITK format
         fixed_image = convert_input(fixed_image)
         moving_image = convert_input(moving_image)
+        fixed_mask, moving_mask = self.convert_masks(fixed_image, moving_image, fixed_mask, moving_mask)
 
         # Check if the fixed and moving images have the same size, if not resamples the moving image
         if(self.check_shape): moving_image = apply_shape(fixed_image, moving_image)
 
+        # Register from the centered transform, or from the best of several initial rotations
+        if(self.start_rotations): transform = self.multi_start_rigid(fixed_image, moving_image, fixed_mask, moving_mask)
+        else: transform = self.execute_rigid(fixed_image, moving_image, fixed_mask, moving_mask)
+
+        # Resample moving image
+        resampled_image = self.resample(fixed_image, moving_image, transform)
+        logger.debug("Resampling complete.")
+
+        # Convert back to numpy
+        registered_np = sitk.GetArrayFromImage(resampled_image)
+
+        return registered_np, transform
+
+    def execute_rigid(self, fixed_image: sitk.Image, moving_image: sitk.Image, fixed_mask: sitk.Image | None = None, moving_mask: sitk.Image | None = None, initial_transform: sitk.Transform | None = None) -> sitk.Transform:
+
         # Initialize the rigid registration
-        registration_method = self.setup_rigid(fixed_image, moving_image)
+        registration_method = self.setup_rigid(fixed_image, moving_image, fixed_mask, moving_mask, initial_transform)
         logger.debug("Rigid registration setup complete.")
 
         # Execute registration
@@ -36,24 +55,17 @@ class Rigid(RegistratorSupport):
         registration_time = time.time() - start_time
         logger.debug(f"Rigid registration executed in {registration_time}.")
 
-        # Resample moving image
-        resampled_image = self.resample(fixed_image, moving_image, transform)
-        logger.debug("Resampling complete.")
+        # Log final metrics
+        self.log_registration(registration_method, registration_time)
 
-        # Convert back to numpy
-        registered_np = sitk.GetArrayFromImage(resampled_image)
+        return transform
 
-        logger.info(f"Final metric value: {registration_method.GetMetricValue()}")
-        logger.info(f"Optimizer's stopping condition, {registration_method.GetOptimizerStopConditionDescription()}")
-
-        return registered_np, transform
-    
 
     # ──────────────────────────────────────────────────────
     # 1.1 Subsection: Setup Rigid Registration
     # ──────────────────────────────────────────────────────
-    def setup_rigid(self, fixed_image: sitk.Image, moving_image: sitk.Image) -> sitk.ImageRegistrationMethod:
-        
+    def setup_rigid(self, fixed_image: sitk.Image, moving_image: sitk.Image, fixed_mask: sitk.Image | None = None, moving_mask: sitk.Image | None = None, initial_transform: sitk.Transform | None = None) -> sitk.ImageRegistrationMethod:
+
         # Initialize the registration method
         registration_method = sitk.ImageRegistrationMethod()
 
@@ -61,22 +73,105 @@ class Rigid(RegistratorSupport):
         registration_method = self.define_loss(registration_method)
         registration_method = self.define_registration_interpolator(registration_method)
         registration_method = self.define_optimizer(registration_method)
-        registration_method.SetMetricSamplingPercentage(self.sampling_percentage)
+        registration_method = self.define_sampling(registration_method)
+        registration_method = self.define_masks(registration_method, fixed_mask, moving_mask)
         if(self.optimizer != 'LBFGS'): registration_method.SetOptimizerScalesFromPhysicalShift()
 
         # Connect all of the observers so that we can perform plotting during registration.
         if(self.view_update): registration_method = view_registration(registration_method)
 
-        # Allow for multi-resolution registration
+        # Allow for multi-resolution registration (with a per level iteration budget)
         registration_method = self.define_multiple_resolutions(registration_method)
-        
-        # Create the transform
-        initial_transform = sitk.CenteredTransformInitializer(fixed_image,
-                                                            moving_image,
-                                                            self.define_dimension_transform(),
-                                                            self.define_center_type())
-        
+        registration_method = self.define_level_schedule(registration_method)
+        registration_method = self.define_telemetry(registration_method)
+
+        # Create the transform (unless the registration continues from a given one)
+        if initial_transform is None: initial_transform = self.centered_transform(fixed_image, moving_image, fixed_mask, moving_mask)
+
         # Set the initial transform
         registration_method.SetInitialTransform(initial_transform, inPlace=False)
 
-        return registration_method
\ No newline at end of file
+        return registration_method
+
+    def centered_transform(self, fixed_image: sitk.Image, moving_image: sitk.Image, fixed_mask: sitk.Image | None = None, moving_mask: sitk.Image | None = None) -> sitk.Transform:
+        # The surface alignment of the objects is already rigid, the intensities only refine it
+        if(self.rigid_type == 'icp'): return self.execute_icp(fixed_image, moving_image, fixed_mask, moving_mask)
+
+        return sitk.CenteredTransformInitializer(fixed_image,
+                                                moving_image,
+                                                self.define_dimension_transform(),
+                                                self.define_center_type())
+
+
+    # ──────────────────────────────────────────────────────
+    # 1.2 Subsection: Multi-Start Registration
+    # ──────────────────────────────────────────────────────
+    def multi_start_rigid(self, fixed_image: sitk.Image, moving_image: sitk.Image, fixed_mask: sitk.Image | None = None, moving_mask: sitk.Image | None = None) -> sitk.Transform:
+        images = (fixed_image, moving_image, fixed_mask, moving_mask)
+        centered_transform = self.centered_transform(fixed_image, moving_image, fixed_mask, moving_mask)
+        starts = [rotate_transform(centered_transform, rotation) for rotation in self.start_rotations]
+
+        # Screening: a short registration from every start, only the best ones are registered until convergence
+        screened = self.run_starts(self.start_registrator(screening=True), images, starts)
+        ranking = np.argsort([report['metric_value'] for _, report in screened])
+        survivors = ranking[:self.start_survivors]
+        logger.info(f"Multi-start screening: starts {[self.start_rotations[index] for index in survivors]} kept out of {len(starts)}")
+
+        # Full registration of the survivors, from where their screening ended
+        finals = self.run_starts(self.start_registrator(screening=False), images, [inner_transform(screened[index][0]) for index in survivors])
+        best = int(np.argmin([report['metric_value'] for _, report in finals]))
+        transform, self.last_registration = finals[best]
+
+        # Keep how every start did (the final metric is None for the dropped ones)
+        final_metrics = {int(index): report['metric_value'] for index, (_, report) in zip(survivors, finals)}
+        self.last_registration['starts'] = [{'rotation': list(rotation), 'screening_metric': report['metric_value'], 'final_metric': final_metrics.get(index)}
+                                            for index, (rotation, (_, report)) in enumerate(zip(self.start_rotations, screened))]
+        logger.info(f"Multi-start: best start {self.start_rotations[survivors[best]]} (final metric value: {self.last_registration['metric_value']})")
+
+        return transform
+
+    def start_registrator(self, screening: bool) -> "Rigid":
+        # Copy of this registrator that runs a single start (the screening only runs the first level, for a few iterations)
+        registrator = copy.copy(self)
+        registrator.start_rotations = None
+        registrator.view_update = False
+        if screening:
+            registrator.numberOfIterations = self.screening_iterations
+            registrator.level_iterations = None
+            registrator.shrinkFactors, registrator.smoothingSigmas = self.shrinkFactors[:1], self.smoothingSigmas[:1]
+
+        return registrator
+
+    def run_starts(self, registrator: "Rigid", images: tuple, initial_transforms: list[sitk.Transform]) -> list[tuple[sitk.Transform, dict]]:
+        processes = min(len(initial_transforms), self.start_processes or os.cpu_count() or 1)
+        if(processes <= 1): return [run_start(registrator, images, transform) for transform in initial_transforms]
+
+        # Each process gets an equal share of the ITK threads, so the starts do not compete for the cores
+        itk_threads = self.itk_threads or max(1, (os.cpu_count() or 1) // processes)
+        with Pool(processes, initializer=_init_start_worker, initargs=(registrator, images, itk_threads)) as pool:
+            return pool.map(_start_worker, initial_transforms)
+
+
+
+# ================================================================
+# 2. Section: Multi-Start Workers
+# ================================================================
+_START_INPUTS: tuple | None = None
+
+def _init_start_worker(registrator: Rigid, images: tuple, itk_threads: int) -> None:
+    # The registrator and images are sent once to each process instead of once per start
+    global _START_INPUTS
+    _START_INPUTS = (registrator, images)
+    sitk.ProcessObject.SetGlobalDefaultNumberOfThreads(itk_threads)
+
+def _start_worker(initial_transform: sitk.Transform) -> tuple[sitk.Transform, dict]:
+    return run_start(*_START_INPUTS, initial_transform)
+
+def run_start(registrator: Rigid, images: tuple, initial_transform: sitk.Transform) -> tuple[sitk.Transform, dict]:
+    transform = registrator.execute_rigid(*images, initial_transform=initial_transform)
+    return transform, registrator.last_registration
+
+def inner_transform(transform: sitk.Transform) -> sitk.Transform:
+    # The registration returns its result wrapped in a composite transform
+    if isinstance(transform, sitk.CompositeTransform) and transform.GetNumberOfTransforms() == 1: return transform.GetNthTransform(0).Downcast()
+    return transform.Downcast()
@@ -1,3 +1,4 @@
 from .Rigid import Rigid
 from .Affine import Affine
-from .BSpline import BSpline
\ No newline at end of file
+from .BSpline import BSpline
+from .ICP import ICP
\ No newline at end of file
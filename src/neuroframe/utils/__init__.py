@@ -3,4 +3,5 @@ from .nifty_utils import *
 from .array_utils import *
 from .geometry_utils import *
 from .save_utils import *
+from .cache_utils import *
 from .io_utils import get_folders
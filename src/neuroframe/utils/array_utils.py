@@ -31,4 +31,53 @@ def enlarge_shape(array: np.ndarray, reference_array: np.ndarray) -> np.ndarray:
         pad_width[axis] = (pad_before, pad_after)
         array = np.pad(array, pad_width, mode="constant")
 
-    return array
\ No newline at end of file
+    return array
+
+def crop_to_content(array: np.ndarray, margin: int = 0) -> tuple[np.ndarray, tuple[slice, ...]]:
+    # An empty array has no content to crop to
+    if not np.any(array): return array, tuple(slice(None) for _ in range(array.ndim))
+
+    # Get the bounding box of the non-zero values, enlarged by the margin (clipped to the array borders)
+    slices = []
+    for axis in range(array.ndim):
+        other_axes = tuple(other for other in range(array.ndim) if other != axis)
+        indexes = np.flatnonzero(np.any(array, axis=other_axes))
+        slices.append(slice(max(indexes[0] - margin, 0), min(indexes[-1] + margin + 1, array.shape[axis])))
+
+    slices = tuple(slices)
+    return array[slices], slices
+
+def uncrop(array: np.ndarray, slices: tuple[slice, ...], shape: tuple[int, ...]) -> np.ndarray:
+    # Place the cropped array back in an empty array with the original shape
+    full_array = np.zeros(shape, dtype=array.dtype)
+    full_array[slices] = array
+
+    return full_array
+
+
+
+# ================================================================
+# 3. Section: Compression
+# ================================================================
+def compress_mask(mask: np.ndarray) -> dict[str, np.ndarray]:
+    # Keep only the bounding box of the mask, packed as bits
+    cropped_mask, slices = crop_to_content(mask)
+    compressed = {
+        'shape': np.array(mask.shape),
+        'bounds': np.array([(box.start or 0, box.stop if box.stop is not None else size) for box, size in zip(slices, mask.shape)]),
+        'bits': np.packbits(cropped_mask.astype(bool), axis=None)
+    }
+
+    return compressed
+
+def decompress_mask(compressed: dict[str, np.ndarray]) -> np.ndarray:
+    # Unpack the bits of the bounding box
+    bounds = compressed['bounds']
+    cropped_shape = tuple(bounds[:, 1] - bounds[:, 0])
+    cropped_mask = np.unpackbits(compressed['bits'], count=int(np.prod(cropped_shape))).reshape(cropped_shape)
+
+    # Place the bounding box back in the full mask
+    slices = tuple(slice(start, stop) for start, stop in bounds)
+    mask = uncrop(cropped_mask.astype(int), slices, tuple(compressed['shape']))
+
+    return mask
@@ -0,0 +1,29 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import hashlib
+
+import numpy as np
+
+
+
+# ================================================================
+# 1. Section: Fingerprints
+# ================================================================
+def fingerprint_array(*arrays: np.ndarray) -> str:
+    # Hash the shape, type and content of every array (order matters)
+    hasher = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        hasher.update(f"{array.shape}{array.dtype.str}".encode())
+        hasher.update(array.data)
+
+    return hasher.hexdigest()
+
+def fingerprint_file(path: str, chunk_size: int = 1 << 20) -> str:
+    # Hash the content of the file (read in chunks)
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''): hasher.update(chunk)
+
+    return hasher.hexdigest()
@@ -4,12 +4,13 @@
 import numpy as np
 
 from scipy.spatial.transform import Rotation
-from scipy.ndimage import affine_transform
+from scipy.ndimage import affine_transform, distance_transform_edt, find_objects
 
 from ..logger import logger
 from ..mouse import Mouse
 from ..assertions import assert_points_transformed_properly
 from .image_utils import get_z_coord
+from .array_utils import crop_to_content, uncrop
 
 
 
@@ -166,22 +167,122 @@ def xy_fine_tune(mouse: Mouse, bregma_coords: np.array, deviation: int) -> tuple
 # ================================================================
 # 3. Section: Center Calculation Functions
 # ================================================================
-def compute_inner_center(binary_mask: np.ndarray, get_map: bool = False) -> np.ndarray:
+def compute_inner_center(binary_mask: np.ndarray, get_map: bool = False, voxel_size: float | tuple | None = None) -> np.ndarray:
     """Compute the inner center of a binary mask using the Euclidean Distance Transform (EDT).
 
+    The EDT is only computed on the bounding box of the mask (padded with one background voxel, so
+    the borders of the volume count as background), using the voxel size as sampling. When several
+    voxels are equally deep, the one closest to their mean is chosen (and then the first in C order).
+
     Parameters:
         binary_mask (numpy.ndarray): A 3D binary mask where the object of interest is represented by non-zero values.
+        get_map (bool): If True, also returns the distance map (with the shape of the mask).
+        voxel_size (float | tuple | None): Size of the voxel along each axis. If None, the voxels are isotropic with size 1.
 
     Returns:
-        numpy.ndarray: A 1D array containing the 3D coordinates of the inner center of the binary mask.
+        numpy.ndarray: A 1D array containing the 3D coordinates of the inner center of the binary mask (NaN if the mask is empty).
     """
-    
-    # Compute the Euclidean Distance Transform (EDT)
-    distances = distance_transform_edt(binary_mask) 
-    
-    # Find the 3d coordinate of the maximum distance
-    max_index = np.argmax(distances)
-    center = np.unravel_index(max_index, binary_mask.shape)
+    # An empty mask has no inner center
+    if not np.any(binary_mask):
+        center = np.full(binary_mask.ndim, np.nan)
+        if get_map: return center, np.zeros(binary_mask.shape)
+        return center
+
+    # Compute the Euclidean Distance Transform (EDT) on the cropped mask
+    cropped_mask, slices = crop_to_content(binary_mask > 0)
+    distances = distance_transform_edt(np.pad(cropped_mask, 1), sampling=voxel_size)[(slice(1, -1),) * binary_mask.ndim]
+
+    # Find the 3d coordinate of the maximum distance (in the full volume)
+    center = select_deepest_voxel(distances, voxel_size) + np.array([box.start for box in slices])
+
+    if get_map: return center, uncrop(distances, slices, binary_mask.shape)
+    return center
 
-    if get_map: return np.array(center), distances
-    return np.array(center)
\ No newline at end of file
+def compute_inner_centers(labeled_array: np.ndarray, labels: np.ndarray | None = None, voxel_size: float | tuple | None = None,
+                          max_batch_voxels: int = 2**24) -> np.ndarray:
+    """Compute the inner center of many labels of a labeled array, packing them in a few EDT passes.
+
+    Each label is cropped to its bounding box and padded with one background voxel (as in
+    ``compute_inner_center``, which gives the same centers). The padded crops are stacked along the
+    first axis, so a single EDT handles many small structures at once. For one or two large
+    structures, calling ``compute_inner_center`` on each mask is faster.
+
+    Parameters:
+        labeled_array (numpy.ndarray): A 3D array where each structure has its own label (0 is the background).
+        labels (numpy.ndarray | None): Labels to compute the center of. If None, every non-zero label is used.
+        voxel_size (float | tuple | None): Size of the voxel along each axis. If None, the voxels are isotropic with size 1.
+        max_batch_voxels (int): Maximum number of voxels of each stacked volume.
+
+    Returns:
+        numpy.ndarray: A (N, 3) array with the inner center of each label (NaN for labels that are not present).
+    """
+    # Only the bounding box of the requested labels is searched (the whole volume is never sorted)
+    _, crop_slices = crop_to_content(labeled_array if labels is None else np.isin(labeled_array, labels))
+    labeled_array = labeled_array[crop_slices]
+    offset = np.array([box.start or 0 for box in crop_slices])
+
+    # Map the labels to consecutive indexes, so that the bounding boxes are found in a single pass
+    present_labels, compact_array = np.unique(labeled_array, return_inverse=True)
+    compact_array = compact_array.reshape(labeled_array.shape)
+    if(present_labels[0] != 0): compact_array += 1
+    else: present_labels = present_labels[1:]
+    bounding_boxes = find_objects(compact_array)
+
+    if labels is None: labels = present_labels
+    labels = np.atleast_1d(labels)
+    centers = np.full((len(labels), labeled_array.ndim), np.nan)
+    if(len(present_labels) == 0): return centers
+
+    # Get the bounding box of each label present in the array (biggest footprint first, to waste less space when stacking)
+    positions = np.searchsorted(present_labels, labels)
+    positions[positions == len(present_labels)] = 0
+    is_present = (labels != 0) & (present_labels[positions] == labels)
+    pieces = [(index, bounding_boxes[positions[index]]) for index in np.flatnonzero(is_present)]
+    pieces.sort(key=lambda piece: -np.prod([box.stop - box.start for box in piece[1][1:]]))
+
+    # Group the pieces in batches that fit in the maximum number of voxels when stacked
+    batches, batch_shape = [], None
+    for index, slices in pieces:
+        padded_shape = np.array([box.stop - box.start + 2 for box in slices])
+        if batches:
+            new_shape = np.concatenate(([batch_shape[0] + padded_shape[0]], np.maximum(batch_shape[1:], padded_shape[1:])))
+            if(np.prod(new_shape) <= max_batch_voxels):
+                batches[-1].append((index, slices)); batch_shape = new_shape
+                continue
+        batches.append([(index, slices)]); batch_shape = padded_shape
+
+    # Compute a single EDT per batch and extract the deepest voxel of each piece
+    for batch in batches:
+        stacked, piece_slices = stack_padded_pieces(labeled_array, labels, batch)
+        distances = distance_transform_edt(stacked, sampling=voxel_size)
+
+        for (index, slices), piece_slice in zip(batch, piece_slices):
+            centers[index] = select_deepest_voxel(distances[piece_slice], voxel_size) + np.array([box.start for box in slices]) + offset
+
+    return centers
+
+def stack_padded_pieces(labeled_array: np.ndarray, labels: np.ndarray, batch: list) -> tuple[np.ndarray, list]:
+    # Get the shape of the stack, each piece has one voxel of background on every side
+    shapes = np.array([[box.stop - box.start for box in slices] for _, slices in batch])
+    depths = np.cumsum(shapes[:, 0] + 2)
+    stacked = np.zeros((depths[-1], *(shapes[:, 1:].max(axis=0) + 2)), dtype=bool)
+
+    # Place each piece after the previous one
+    piece_slices = []
+    for (index, slices), shape, depth in zip(batch, shapes, depths):
+        piece_slice = (slice(depth - shape[0] - 1, depth - 1), *(slice(1, size + 1) for size in shape[1:]))
+        stacked[piece_slice] = labeled_array[slices] == labels[index]
+        piece_slices.append(piece_slice)
+
+    return stacked, piece_slices
+
+def select_deepest_voxel(distances: np.ndarray, voxel_size: float | tuple | None = None) -> np.ndarray:
+    # Get every voxel at the maximum distance
+    candidates = np.argwhere(distances == distances.max())
+    if(len(candidates) == 1): return candidates[0]
+
+    # Break ties by choosing the candidate closest to their mean (argmin keeps the first in C order)
+    scale = np.ones(distances.ndim) if voxel_size is None else np.broadcast_to(np.asarray(voxel_size, dtype=float), (distances.ndim,))
+    deviations = ((candidates - candidates.mean(axis=0)) * scale)**2
+
+    return candidates[np.argmin(deviations.sum(axis=1))]
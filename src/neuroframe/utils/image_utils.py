@@ -93,11 +93,12 @@ def get_z_coord(volume: np.ndarray, coords: tuple, window_size: int = 10) -> int
 # 3. Section: Separations of Hemispheres
 # ================================================================
 def compute_separation(volume: np.ndarray) -> float:
-    # Split the volume into left and right hemispheres
-    left_hemisphere, right_hemisphere = separate_volume(volume)
+    # Count the voxels in each side of the midline (on views, without copying the volume)
+    left_count, right_count = (np.count_nonzero(half > 0) for half in split_midline(volume))
+    total_count = left_count + right_count
 
-    left_per = np.sum(left_hemisphere > 0) / np.sum(volume > 0)
-    right_per = np.sum(right_hemisphere > 0) / np.sum(volume > 0)
+    left_per = left_count / total_count
+    right_per = right_count / total_count
     
     #print(f"Difference: {abs(left_per - right_per):.2%}")
     return round(abs(left_per - right_per) * 100, 2)
@@ -118,4 +119,63 @@ def separate_volume(volume: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
     right_hemisphere[:, :, volume.shape[2] // 2:] = 0
 
     hemispheres = (left_hemisphere, right_hemisphere)
-    return hemispheres
\ No newline at end of file
+    return hemispheres
+
+def split_midline(volume: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Views of the left (x >= midline) and right (x < midline) halves of the volume
+    midline_x = volume.shape[2] // 2
+    return volume[:, :, midline_x:], volume[:, :, :midline_x]
+
+# ──────────────────────────────────────────────────────
+# 3.1 Subsection: Hemisphere Index
+# ──────────────────────────────────────────────────────
+def build_hemisphere_index(volume: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Build a compact "label x side" index of a label volume, replacing the two copies of separate_volume.
+
+    Each voxel gets 2 * compact_label + side, where compact_label is the position of its label in
+    the sorted labels (0 is the background) and side is 0 for the left (x >= midline) and 1 for the
+    right (x < midline) hemisphere.
+
+    Parameters
+    ----------
+    volume : np.ndarray
+            Label volume (e.g. the segmentation data).
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+            The index volume (uint16 when possible) and the label of each compact label.
+
+    Examples
+    --------
+    >>> index, labels = build_hemisphere_index(segmentation)  # doctest: +SKIP
+    >>> counts = hemisphere_counts(index, len(labels))  # (L, 2) voxels of each label in each side
+    """
+    # Map every label to its position in the sorted labels (the background is always the first)
+    labels, compact_labels = np.unique(volume, return_inverse=True)
+    compact_labels = compact_labels.reshape(volume.shape)
+    if(labels[0] != 0):
+        labels = np.concatenate(([0], labels))
+        compact_labels += 1
+
+    # Combine the label and the side in a single (compact) index
+    dtype = np.uint16 if 2 * len(labels) <= np.iinfo(np.uint16).max else np.uint32
+    index = (2 * compact_labels).astype(dtype)
+    split_midline(index)[1][...] += 1
+
+    return index, labels
+
+def hemisphere_counts(index: np.ndarray, nr_labels: int) -> np.ndarray:
+    # Number of voxels of each label (rows) in each side (columns: left, right)
+    return np.bincount(index.ravel(), minlength=2 * nr_labels).reshape(nr_labels, 2)
+
+def midline_counts(index: np.ndarray, nr_labels: int) -> np.ndarray:
+    # Number of voxels of each label in the midline plane
+    midline_x = index.shape[2] // 2
+    return np.bincount(index[:, :, midline_x].ravel() // 2, minlength=nr_labels)
+
+def trivial_separations(index: np.ndarray, nr_labels: int) -> np.ndarray:
+    # A label is trivially separated when it has voxels in both sides and none in the midline
+    counts = hemisphere_counts(index, nr_labels)
+    return (counts[:, 0] > 0) & (counts[:, 1] > 0) & (midline_counts(index, nr_labels) == 0)
@@ -2,4 +2,7 @@ from .integration.pipeline.test_align import *
 from .integration.pipeline.test_extract_bl import *
 from .integration.pipeline.test_extract_skull import *
 from .integration.pipeline.test_align_bl import *
+from .integration.pipeline.test_layer_colapse import *
+from .integration.pipeline.test_extract_frame import *
+from .integration.registrator.test_registrator import *
 from .integration.test_integration import *
\ No newline at end of file
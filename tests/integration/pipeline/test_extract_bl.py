@@ -26,16 +26,11 @@ class Test03ExtractBL(unittest.TestCase):
 
     def test_get_referece_points_are_within_bounds(self):
         mouse = load_object(TEMP_FOLDER + '01_align_mouse.pkl')
-        skull = load_object(TEMP_FOLDER + '02_extract_skull_skull.pkl')
         transform = load_object(TEMP_FOLDER + '03_extract_bl_transform.pkl')
 
-        bregma_template, lambda_template = REF_TEMPLATES
-        reference_slide = convert_input(mouse.segmentation.volume[100,:,:])
-        bregma_template = apply_shape(reference_slide, bregma_template)
-        lambda_template = apply_shape(reference_slide, lambda_template)
-
-        bregma_coords = np.round(get_reference_point(bregma_template, skull, transform)).astype(int)
-        lambda_coords = np.round(get_reference_point(lambda_template, skull, transform)).astype(int)
+        bregma_point, lambda_point = REF_POINTS
+        bregma_coords = np.round(get_reference_point(bregma_point, transform)).astype(int)
+        lambda_coords = np.round(get_reference_point(lambda_point, transform)).astype(int)
 
         # Get the z coordinates
         bregma_z = get_z_coord(mouse.micro_ct.data, bregma_coords)
@@ -51,16 +46,11 @@ class Test03ExtractBL(unittest.TestCase):
 
     def test_compute_deviation_is_within_reason(self):
         mouse = load_object(TEMP_FOLDER + '01_align_mouse.pkl')
-        skull = load_object(TEMP_FOLDER + '02_extract_skull_skull.pkl')
         transform = load_object(TEMP_FOLDER + '03_extract_bl_transform.pkl')
 
-        bregma_template, lambda_template = REF_TEMPLATES
-        reference_slide = convert_input(mouse.segmentation.volume[100,:,:])
-        bregma_template = apply_shape(reference_slide, bregma_template)
-        lambda_template = apply_shape(reference_slide, lambda_template)
-
-        bregma_coords = np.round(get_reference_point(bregma_template, skull, transform)).astype(int)
-        lambda_coords = np.round(get_reference_point(lambda_template, skull, transform)).astype(int)
+        bregma_point, lambda_point = REF_POINTS
+        bregma_coords = np.round(get_reference_point(bregma_point, transform)).astype(int)
+        lambda_coords = np.round(get_reference_point(lambda_point, transform)).astype(int)
 
         # Get the z coordinates
         bregma_z = get_z_coord(mouse.micro_ct.data, bregma_coords)
@@ -0,0 +1,277 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import tempfile
+import unittest
+from unittest import mock
+
+from src.neuroframe.pipeline.extract_frame import *
+from src.neuroframe.utils.array_utils import crop_to_content, uncrop
+from src.neuroframe.pipeline.stereotaxic_step import StereotaxicResults, ResultLog, CoordinateFrame, RegionLookup, read_cohort
+from src.neuroframe.utils.image_utils import build_hemisphere_index, hemisphere_counts, trivial_separations, compute_separation
+from src.neuroframe.utils.geometry_utils import compute_inner_center, compute_inner_centers, transform_points
+from scipy.spatial.transform import Rotation
+
+
+
+# ================================================================
+# 1. Section: Helpers
+# ================================================================
+def build_bridged_volume(shape: tuple = (40, 40, 60), bridge: int = 1) -> np.ndarray:
+    # Two spheres connected by a thin bridge (with a small knot in the middle) along the x-axis
+    z, y, x = np.indices(shape)
+    volume = ((z - 20)**2 + (y - 20)**2 + (x - 15)**2 <= 8**2) | ((z - 20)**2 + (y - 20)**2 + (x - 45)**2 <= 8**2)
+    volume |= (z - 20)**2 + (y - 20)**2 + (x - 30)**2 <= 3**2
+    volume[20-bridge:20+bridge+1, 20-bridge:20+bridge+1, 15:45] = True
+
+    return volume.astype(int)
+
+
+
+# ================================================================
+# 2. Section: Test Cases
+# ================================================================
+class Test06ExtractFrame(unittest.TestCase):
+    def test_ball_opening_from_distances_matches_opening(self):
+        volume = build_bridged_volume()
+        distances = distance_transform_edt(volume)
+
+        for radius in range(1, 6):
+            expected = opening(volume, ball(radius)) > 0
+            obtained = ball_opening_from_distances(distances, radius) > 0
+            self.assertTrue(np.array_equal(expected, obtained), f"Ball opening of radius {radius} should match skimage's opening")
+
+    def test_crop_to_content_roundtrip(self):
+        volume = build_bridged_volume()
+        cropped, slices = crop_to_content(volume, margin=3)
+
+        self.assertLess(cropped.size, volume.size, "Cropped volume should be smaller than the full volume")
+        self.assertTrue(np.array_equal(uncrop(cropped, slices, volume.shape), volume), "Uncropping should recover the full volume")
+
+    def test_loop_opening_breaks_bridge(self):
+        volume = build_bridged_volume()
+        found_separation, labeled_array = loop_opening(volume, method='ball', verbose=0)
+
+        self.assertTrue(found_separation, "Opening should break the thin bridge between both spheres")
+        self.assertEqual(labeled_array.shape, volume.shape, "Labeled array should have the shape of the full volume")
+        self.assertEqual(len(np.unique(labeled_array)), 4, "Labeled array should have the background, both spheres and the knot")
+
+    def test_clustering_hemispheres_is_deterministic(self):
+        volume = build_bridged_volume(bridge=4)
+        first_labels = try_clustering_hemispheres(volume, verbose=0, max_samples=500, seed=3)
+        second_labels = try_clustering_hemispheres(volume, verbose=0, max_samples=500, seed=3)
+
+        self.assertTrue(np.array_equal(first_labels, second_labels), "Clustering should be deterministic under the same seed")
+        self.assertEqual(set(np.unique(first_labels[volume > 0])), {1, 2}, "Every voxel should be assigned to one of both hemispheres")
+
+    def test_clustering_hemispheres_splits_along_x(self):
+        volume = build_bridged_volume(bridge=4)
+        labeled_array = try_clustering_hemispheres(volume, verbose=0, max_samples=500)
+
+        # Each sphere center should belong to a different cluster
+        self.assertNotEqual(labeled_array[20, 20, 15], labeled_array[20, 20, 45], "Both spheres should be in different clusters")
+
+    def test_reorder_labels_array_sorts_by_size(self):
+        labeled_array = np.array([[0, 1, 2, 2], [3, 3, 3, 3], [2, 0, 0, 0]])
+        sorted_labels, sizes = reorder_labels_array(labeled_array)
+        top_labels, top_sizes = reorder_labels_array(labeled_array, top_k=1)
+
+        self.assertTrue(np.array_equal(sorted_labels, [[0, 3, 2, 2], [1, 1, 1, 1], [2, 0, 0, 0]]), "Labels should be ordered by size")
+        self.assertTrue(np.array_equal(sizes, [4, 3, 1]), "Sizes should follow the new labels")
+        self.assertTrue(np.array_equal(top_labels, np.where(sorted_labels == 1, 1, 0)), "Only the biggest region should be kept")
+        self.assertTrue(np.array_equal(top_sizes, [4]), "Only the size of the biggest region should be kept")
+
+    def test_rebuild_hemispheres_merges_fragments_to_closest_side(self):
+        labeled_array = np.zeros((10, 10, 30), dtype=int)
+        labeled_array[2:8, 2:8, 20:28] = 1   # right most piece (left hemisphere, mirrored)
+        labeled_array[2:8, 2:8, 2:9] = 2     # left most piece (right hemisphere, mirrored)
+        labeled_array[4, 4, 17] = 3          # fragment close to the first piece
+        labeled_array[4, 4, 11] = 4          # fragment close to the second piece
+
+        left_hemisphere, right_hemisphere = rebuild_hemispheres(labeled_array, verbose=0)
+
+        self.assertEqual(left_hemisphere[4, 4, 17], 1, "Fragment should be merged to the closest hemisphere")
+        self.assertEqual(right_hemisphere[4, 4, 11], 1, "Fragment should be merged to the closest hemisphere")
+        self.assertEqual(np.count_nonzero(left_hemisphere) + np.count_nonzero(right_hemisphere), np.count_nonzero(labeled_array), "Every piece should be assigned to one hemisphere")
+
+    def test_separation_cache_roundtrip(self):
+        volume = build_bridged_volume()
+        left_hemisphere, right_hemisphere = np.zeros_like(volume), np.zeros_like(volume)
+        left_hemisphere[..., 30:], right_hemisphere[..., :30] = volume[..., 30:], volume[..., :30]
+
+        with tempfile.TemporaryDirectory() as cache_folder:
+            separation_cache = SeparationCache(cache_folder, "fingerprint")
+            separation_cache.save(7, 'Opening Separation', (left_hemisphere, right_hemisphere))
+            separation_cache.save(8, 'Trivial')
+
+            method, hemispheres = separation_cache.load(7)
+            self.assertEqual(method, 'Opening Separation', "Separation method should be cached")
+            self.assertTrue(np.array_equal(hemispheres[0], left_hemisphere), "Left hemisphere should be recovered")
+            self.assertTrue(np.array_equal(hemispheres[1], right_hemisphere), "Right hemisphere should be recovered")
+            self.assertEqual(separation_cache.load(8), ('Trivial', None), "Trivial separations should not store masks")
+            self.assertIsNone(separation_cache.load(9), "Missing segments should not be found")
+
+    def test_inner_center_uses_voxel_size(self):
+        # A box that is longer in x (in voxels) but shorter in x (in physical units)
+        mask = np.zeros((20, 20, 40), dtype=int)
+        mask[2:16, 2:16, 5:35] = 1
+        isotropic_center = compute_inner_center(mask)
+        anisotropic_center = compute_inner_center(mask, voxel_size=(1.0, 1.0, 0.2))
+
+        self.assertTrue(np.array_equal(isotropic_center, [8, 8, 19]), "Ties should be broken by the closest voxel to their mean")
+        self.assertTrue(np.array_equal(anisotropic_center, [8, 8, 19]), "Anisotropic center should be deterministic")
+
+    def test_inner_centers_match_single_centers(self):
+        volume = build_bridged_volume()
+        labeled_array, _ = label(loop_opening(volume, method='ball', verbose=0)[1] > 0)
+        labeled_array = np.where(labeled_array > 0, labeled_array + 1000, 0)
+        labeled_array = np.pad(labeled_array, ((3, 0), (5, 2), (0, 4)))    # empty margins, cropped before the search
+        labels = np.append(np.unique(labeled_array)[1:], 7)
+        centers = compute_inner_centers(labeled_array, labels, voxel_size=(1.0, 0.5, 0.8), max_batch_voxels=5000)
+
+        for center, segment in zip(centers[:-1], labels[:-1]):
+            expected = compute_inner_center(labeled_array == segment, voxel_size=(1.0, 0.5, 0.8))
+            self.assertTrue(np.array_equal(center, expected), "Batched centers should match the single center computation")
+        self.assertTrue(np.all(np.isnan(centers[-1])), "Missing labels should have a NaN center")
+
+    def test_build_results_is_columnar(self):
+        ref_coords = (np.array([20, 20, 20]), np.array([20, 30, 20]))
+        records = [
+            {'id': 3},
+            {'id': 5, 'Separation Method': 'Trivial', 'centroids': np.array([[10., 20, 30], [10, 20, 10]]), 'volumes': np.array([5., 6])}
+        ]
+        results = build_results(records, ref_coords, (0.1, 0.1, 0.1), verbose=0)
+        legacy_df = results.to_legacy_dataframe()
+
+        self.assertEqual(results.xyz_um_left.shape, (2, 3), "Coordinates should be (N, 3) arrays")
+        self.assertTrue(np.array_equal(results.xyz_um_mean[1], [-1, 0, -1]), "Mean should mirror the right hemisphere")
+        self.assertTrue(np.all(np.isnan(results.xyz_um_mean[0])), "Failed segments should have NaN coordinates")
+        self.assertEqual(legacy_df.loc[1, 'xyz (um) - L'], "[-1.0, -0.0, -1.0]", "Legacy table should keep the stringified coordinates")
+        self.assertTrue(legacy_df.loc[0, ['xyz (um) - L', 'volume (voxel) - L']].isna().all(), "Failed segments should be empty in the legacy table")
+
+    def test_read_cohort_projects_columns(self):
+        ref_coords = (np.array([20, 20, 20]), np.array([20, 30, 20]))
+        records = [{'id': 5, 'Separation Method': 'Trivial', 'centroids': np.array([[10., 20, 30], [10, 20, 10]]), 'volumes': np.array([5., 6])}]
+        results = build_results(records, ref_coords, (0.1, 0.1, 0.1), verbose=0)
+
+        with tempfile.TemporaryDirectory() as folder:
+            results.save_npz(f"{folder}/m1.npz", mouse_id="M1")
+            results.save_npz(f"{folder}/m2.npz")
+            cohort = read_cohort(folder, columns=['xyz_um_mean'])
+            loaded = StereotaxicResults.load_npz(f"{folder}/m1.npz")
+
+        self.assertEqual(list(cohort.columns), ['mouse', 'mode', 'id', 'x_um_mean', 'y_um_mean', 'z_um_mean'], "Only the projected columns should be read")
+        self.assertEqual(list(cohort['mouse']), ['M1', 'm2'], "Mice should be identified by their id (or file name)")
+        self.assertEqual(cohort['id'].dtype, np.int64, "Ids should be integers")
+        self.assertTrue(np.array_equal(loaded.xyz_um_left, results.xyz_um_left), "Columns should be saved without loss")
+
+    def test_read_cohort_separates_modes(self):
+        ref_coords = (np.array([20, 20, 20]), np.array([20, 30, 20]))
+        records = [{'id': 5, 'Separation Method': 'Trivial', 'centroids': np.array([[10., 20, 30], [10, 20, 10]]), 'volumes': np.array([5., 6])}]
+        results = build_results(records, ref_coords, (0.1, 0.1, 0.1), verbose=0)
+
+        # The files of both modes of one mouse are in the same group folder
+        with tempfile.TemporaryDirectory() as folder:
+            results.save_npz(f"{folder}/m1_stereotaxic_coordinates_MEAN.npz", mouse_id="M1", mode='full_mean')
+            results.save_npz(f"{folder}/m1_stereotaxic_coordinates_INNER.npz", mouse_id="M1", mode='full_inner')
+            cohort = read_cohort(folder, columns=['xyz_um_mean'])
+            mean_cohort = read_cohort(folder, columns=['xyz_um_mean'], mode='full_mean')
+
+        self.assertEqual(sorted(cohort['mode']), ['full_inner', 'full_mean'], "Each row should keep the mode of its file")
+        self.assertFalse(cohort.duplicated(['mouse', 'mode', 'id']).any(), "Rows should be unique per mouse, mode and segment")
+        self.assertEqual(list(mean_cohort['mode']), ['full_mean'], "Only the files of the requested mode should be read")
+
+    def test_result_log_resumes_complete_records(self):
+        header = {'fingerprint': 'abc', 'modes': ['full_mean']}
+        result = {'full_mean': {'id': 5, 'Separation Method': 'Trivial', 'centroids': np.array([[1.5, 2, 3], [4, 5, 6]]), 'volumes': np.array([7., 8])}}
+
+        with tempfile.TemporaryDirectory() as folder:
+            with ResultLog(f"{folder}/log.partial.jsonl", header) as result_log:
+                result_log.load()
+                result_log.append(result)
+                result_log.append({'full_mean': {'id': 6}})    # failed segment, not logged
+            with open(f"{folder}/log.partial.jsonl", 'ab') as file: file.write(b'{"id": 7, "res')
+
+            with ResultLog(f"{folder}/log.partial.jsonl", header) as result_log: resumed = result_log.load()
+            with ResultLog(f"{folder}/log.partial.jsonl", {**header, 'fingerprint': 'other'}) as result_log: discarded = result_log.load()
+
+        self.assertEqual(sorted(resumed), [5], "Only the complete records should be resumed")
+        self.assertTrue(np.array_equal(resumed[5]['full_mean']['centroids'], result['full_mean']['centroids']), "Centroids should be logged without loss")
+        self.assertEqual(discarded, {}, "Logs of a different run should be discarded")
+
+    def test_result_log_retries_failed_segments(self):
+        volume = np.zeros((4, 4, 10), dtype=int)
+        volume[:, :, 1:3] = 385    # right side only
+        volume[:, :, 7:9] = 385    # left side only
+        hemisphere_index = HemisphereIndex(*build_hemisphere_index(volume))
+        header = {'fingerprint': 'abc', 'voxel_size': [1.0, 1.0, 1.0]}
+        labels = np.array([385])
+
+        with tempfile.TemporaryDirectory() as folder:
+            # The first run fails on the segment, the resumed one computes it
+            with mock.patch('src.neuroframe.pipeline.extract_frame.get_separation', side_effect=RuntimeError("interrupted")):
+                with ResultLog(f"{folder}/log.partial.jsonl", header) as result_log:
+                    result_log.load()
+                    failed = non_parallelized_process(None, hemisphere_index, labels, (1, 1, 1), ['full_mean'], verbose=0, result_log=result_log)
+
+            with ResultLog(f"{folder}/log.partial.jsonl", header) as result_log:
+                self.assertEqual(result_log.load(), {}, "A failed segment should not be resumed")
+                non_parallelized_process(None, hemisphere_index, labels, (1, 1, 1), ['full_mean'], verbose=0, result_log=result_log)
+            with ResultLog(f"{folder}/log.partial.jsonl", header) as result_log: resumed = result_log.load()
+
+        self.assertNotIn('Separation Method', failed[0]['full_mean'], "The first run should fail")
+        self.assertEqual(resumed[385]['full_mean']['Separation Method'], 'Trivial', "The resumed run should compute the segment")
+
+    def test_hemisphere_index_counts_each_side(self):
+        volume = np.zeros((4, 4, 10), dtype=int)
+        volume[:, :, 1:3] = 385    # right side only
+        volume[:, :, 7:9] = 385    # left side only (x >= midline)
+        volume[:, :, 4:6] = 12     # cut by the midline
+        index, labels = build_hemisphere_index(volume)
+        counts = hemisphere_counts(index, len(labels))
+
+        self.assertTrue(np.array_equal(labels, [0, 12, 385]), "Labels should be sorted with the background first")
+        self.assertTrue(np.array_equal(counts[1:], [[16, 16], [32, 32]]), "Each label should be counted in each side")
+        self.assertTrue(np.array_equal(trivial_separations(index, len(labels))[1:], [False, True]), "Only the label that is not cut should be trivial")
+        self.assertEqual(compute_separation(volume), 0.0, "Both sides have the same amount of voxels")
+
+    def test_select_structures_by_id_name_and_subtree(self):
+        reference_df = pd.DataFrame({'id': [997, 8, 385, 593, 12], 'name': ['root', 'Basic cell groups', 'Primary visual area', 'Primary visual area, layer 1', 'Other'],
+                                     'acronym': ['root', 'grey', 'VISp', 'VISp1', 'O'], 'parent_id': [np.nan, 997, 8, 385, 997]})
+        labels = np.array([12, 385, 593])
+
+        self.assertTrue(np.array_equal(select_structures(labels, [12, 'visp'], reference_df), [12, 385]), "Ids and acronyms should be selected")
+        self.assertTrue(np.array_equal(select_structures(labels, ['Basic cell groups'], reference_df, include_descendants=True), [385, 593]), "The subtree should be selected")
+        with self.assertRaises(ValueError): select_structures(labels, ['unknown'], reference_df)
+
+    def test_coordinate_frame_matches_volume_transforms(self):
+        rotation_matrix = Rotation.from_euler('x', 20, degrees=True).as_matrix()
+        offset = np.array([16, 16, 16]) - rotation_matrix.T @ np.array([16, 16, 16])
+        point = np.array([12, 20, 9])
+        frame = CoordinateFrame.from_steps([14, 10, 16], [14, 22, 16], (25, 25, 50), [(rotation_matrix, offset)])
+
+        aligned = frame.voxel_to_aligned(point[None])[0]
+        self.assertTrue(np.allclose(np.round(aligned), transform_points(point, (32, 32, 32), rotation_matrix, offset), atol=1), "Points should move as the volumes")
+        self.assertTrue(np.allclose(frame.bl_to_voxel(frame.voxel_to_bl(np.tile(point, (5, 1)))), point), "The conversions should be invertible")
+        self.assertTrue(np.allclose(frame.convert([[14, 11, 15]], 'aligned', 'bl'), [[50, -25, 0]]), "BL coordinates should be [x, y, z] micrometers from bregma")
+
+    def test_region_lookup_falls_back_to_closest_surface(self):
+        volume = np.zeros((20, 20, 20), dtype=np.int32)
+        volume[2:8, 2:8, 2:8] = 385
+        volume[12:18, 12:18, 12:18] = 100000
+        frame = CoordinateFrame([0, 0, 0], [0, 10, 0], 10)
+        points = np.array([[4, 4, 4], [14, 14, 14], [10, 5, 5], [30, 15, 15], [40, 40, 40]])
+        lookup = RegionLookup(volume, frame)
+
+        labels, distances = lookup.query(points, space='aligned', max_distance=200, return_distance=True)
+        self.assertTrue(np.array_equal(labels, [385, 100000, 385, 100000, 0]), "Points outside the structures should take the closest label (if close enough)")
+        self.assertTrue(np.allclose(distances[:4], [0, 0, 30, 130]), "Distances should be in micrometers")
+
+        with tempfile.TemporaryDirectory() as folder:
+            lookup.save(folder)
+            loaded = RegionLookup.load(folder)
+            self.assertTrue(np.array_equal(loaded.query(frame.convert(points, 'aligned', 'bl'), max_distance=200), labels), "The saved lookup should answer the same queries")
+
+
+if __name__ == "__main_":
+    unittest.main()
@@ -0,0 +1,91 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import os
+import tempfile
+import types
+import unittest
+
+from src.neuroframe.pipeline.layer_colapse import *
+from src.neuroframe.pipeline.ontology import OntologyIndex
+
+
+
+# ================================================================
+# 1. Section: Helpers
+# ================================================================
+class MockSegmentation:
+    def __init__(self, data: np.ndarray) -> None:
+        self.data = data
+
+    @property
+    def labels(self) -> np.ndarray:
+        labels = np.unique(self.data)
+        return labels[labels != 0]
+
+
+def build_ontology_table() -> pd.DataFrame:
+    # root(997) → grey(8) → cortex(315) → {area(10) → layers(11, 12)}, and root → fibers(1009)
+    return pd.DataFrame({
+        'id': [997, 8, 315, 10, 11, 12, 1009],
+        'name': ['root', 'Grey', 'Cortex', 'Area', 'Area layer 1', 'Area layer 2', 'Fibers'],
+        'parent_id': [np.nan, 997, 8, 315, 10, 10, 997]
+    })
+
+
+
+# ================================================================
+# 2. Section: Test Cases
+# ================================================================
+class Test05LayerColapse(unittest.TestCase):
+    def test_find_layer_runs_splits_by_parent(self):
+        data = pd.DataFrame({
+            'id': [1, 2, 3, 4, 5, 6],
+            'name': ['Area', 'Area Layer 1', 'Area Layer 2', 'Other layer 1', 'Other', 'Last Layer 1'],
+            'parent_id': [0, 1, 1, 9, 0, 5]
+        })
+        layer_runs = find_layer_runs(data)
+
+        self.assertEqual(list(layer_runs.index), [1, 2, 3, 5], "Only the layers should be in a run")
+        self.assertEqual(len(set(layer_runs.iloc[:2])), 1, "Contiguous layers with the same parent should share a run")
+        self.assertEqual(len(set(layer_runs)), 3, "A new parent or a non layer row should start a new run")
+
+    def test_layer_colapsing_relabels_to_parent(self):
+        data = pd.DataFrame({
+            'id': [20, 21, 10, 11, 12],
+            'name': ['Other Layer 1', 'Other Layer 2', 'Area', 'Area Layer 1', 'Area Layer 2'],
+            'parent_id': [11, 11, 1, 10, 10]
+        })
+        volume = np.array([[0, 10, 11], [12, 20, 21], [99, 11, 0]])
+        mouse = types.SimpleNamespace(segmentation=MockSegmentation(volume.copy()))
+        labels = layer_colapsing(mouse, data)
+
+        # The voxels of 20 and 21 first become 11, which is collapsed into 10 by the next run
+        self.assertTrue(np.array_equal(mouse.segmentation.data, [[0, 10, 10], [10, 10, 10], [99, 10, 0]]), "Layers should be collapsed into their parent")
+        self.assertTrue(np.array_equal(labels, [10, 99]), "Labels should be updated after collapsing")
+        self.assertTrue(np.array_equal(volume[1], [12, 20, 21]), "The original volume should not be modified")
+
+    def test_ontology_index_queries(self):
+        with tempfile.TemporaryDirectory() as folder:
+            build_ontology_table().to_csv(f"{folder}/annotations_info.csv", index=False)
+            OntologyIndex.from_csv(f"{folder}/annotations_info.csv")
+            self.assertTrue(os.path.exists(f"{folder}/annotations_info.ontology.npz"), "Index should be cached next to the CSV")
+            ontology = OntologyIndex.from_csv(f"{folder}/annotations_info.csv")
+
+        self.assertTrue(np.array_equal(ontology.descendants(315), [315, 10, 11, 12]), "Descendants should follow the depth-first order")
+        self.assertTrue(np.array_equal(ontology.ancestors(12), [997, 8, 315, 10, 12]), "Ancestors should go from the root to the structure")
+        self.assertTrue(np.array_equal(ontology.parents([11, 997, 5]), [10, -1, -1]), "Roots and unknown ids should have no parent")
+        self.assertTrue(np.array_equal(ontology.collapse_to_depth([12, 8, 1009], 2), [315, 8, 1009]), "Only deeper structures should be collapsed")
+        self.assertTrue(np.array_equal(ontology.collapse_to([11, 1009], [8, 10]), [10, 1009]), "Structures should collapse to their closest level")
+
+    def test_ontology_colapsing_relabels_to_level(self):
+        ontology = OntologyIndex(build_ontology_table())
+        mouse = types.SimpleNamespace(segmentation=MockSegmentation(np.array([[0, 10, 11], [12, 1009, 0]])))
+        labels = ontology_colapsing(mouse, ontology, depth=2)
+
+        self.assertTrue(np.array_equal(mouse.segmentation.data, [[0, 315, 315], [315, 1009, 0]]), "Segments should be collapsed to the depth")
+        self.assertTrue(np.array_equal(labels, [315, 1009]), "Labels should be updated after collapsing")
+
+
+if __name__ == "__main_":
+    unittest.main()
@@ -0,0 +1,209 @@
+# ================================================================
+# 0. Section: Imports
+# ================================================================
+import json
+import tempfile
+
+import nibabel as nib
+import unittest
+from unittest import mock
+
+from src.neuroframe.registrator import *
+from src.neuroframe.registrator.point_cloud import rigid_to_sitk
+from src.neuroframe.registrator.displacement_field import use_displacement_field
+from src.neuroframe.mouse_data import MedicalImage
+from scipy.spatial.transform import Rotation
+
+
+
+# ──────────────────────────────────────────────────────
+# 0.1 Subsection: Synthetic Volumes
+# ──────────────────────────────────────────────────────
+SHAPE = (40, 40, 40)
+TRUE_TRANSFORM = sitk.Euler3DTransform((20, 20, 20), 0.0, 0.0, np.radians(8), (2.0, -1.5, 1.0))
+
+def build_volumes(shape: tuple = SHAPE, transform: sitk.Transform = TRUE_TRANSFORM) -> tuple[sitk.Image, sitk.Image]:
+    # Smoothed ellipsoid with an off-center hole, and the same volume moved by the transform
+    z, y, x = np.indices(shape)
+    center = np.array(shape) / 2
+    brain = ((z - center[0]) / 12) ** 2 + ((y - center[1]) / 16) ** 2 + ((x - center[2]) / 10) ** 2 < 1
+    hole = ((z - center[0] - 3) / 3) ** 2 + ((y - center[1] + 4) / 6) ** 2 + ((x - center[2] - 3) / 3) ** 2 < 1
+    fixed = sitk.SmoothingRecursiveGaussian(sitk.GetImageFromArray((brain * 1.0 - hole * 0.6).astype(np.float32)), 1.0)
+    moving = sitk.Resample(fixed, transform.GetInverse(), sitk.sitkLinear, 0.0)
+    return fixed, moving
+
+
+
+# ================================================================
+# 1. Section: Test Cases
+# ================================================================
+class Test07Registrator(unittest.TestCase):
+    def test_define_sampling_sets_strategy(self):
+        strategies = {'random': sitk.ImageRegistrationMethod.RANDOM, 'regular': sitk.ImageRegistrationMethod.REGULAR}
+        for strategy, expected in strategies.items():
+            method = mock.MagicMock(NONE=sitk.ImageRegistrationMethod.NONE, RANDOM=sitk.ImageRegistrationMethod.RANDOM, REGULAR=sitk.ImageRegistrationMethod.REGULAR)
+            Registrator(sampling_strategy=strategy, sampling_percentage=0.2, sampling_seed=7).define_sampling(method)
+            method.SetMetricSamplingStrategy.assert_called_once_with(expected)
+            method.SetMetricSamplingPercentage.assert_called_once_with(0.2, 7)
+
+        # Every voxel is used for a full sampling percentage
+        method = mock.MagicMock(NONE=sitk.ImageRegistrationMethod.NONE, RANDOM=sitk.ImageRegistrationMethod.RANDOM, REGULAR=sitk.ImageRegistrationMethod.REGULAR)
+        Registrator(sampling_strategy='random', sampling_percentage=1).define_sampling(method)
+        method.SetMetricSamplingStrategy.assert_called_once_with(sitk.ImageRegistrationMethod.NONE)
+
+    def test_seeded_sampling_is_deterministic(self):
+        fixed, moving = build_volumes()
+        transforms = [Registrator(method='rigid', numberOfIterations=30, sampling_percentage=0.2, sampling_seed=3).register(fixed, moving)[1] for _ in range(2)]
+
+        self.assertEqual(transforms[0].GetParameters(), transforms[1].GetParameters(), "The same seed should give the same transform")
+
+    def test_config_roundtrip(self):
+        registrator = Registrator(method='bspline', grid_size=[4, 4, 4], multiple_resolutions=True, level_iterations=[10, 5, 2], start_rotations=[(0, 0, 15)])
+
+        self.assertEqual(Registrator.from_config(registrator.config).config, registrator.config, "The config should be rebuilt without loss")
+
+    def test_cache_reuses_transform(self):
+        fixed, moving = build_volumes()
+
+        with tempfile.TemporaryDirectory() as cache_folder:
+            registrator = Registrator(method='rigid', numberOfIterations=10, cache_folder=cache_folder)
+            _, transform = registrator.register(fixed, moving)
+            with mock.patch.object(Registrator, 'rigid_transform') as rigid_transform: _, cached = registrator.register(fixed, moving)
+
+        rigid_transform.assert_not_called()
+        self.assertTrue(np.allclose(transform.GetParameters(), cached.GetParameters()), "The cached transform should be returned")
+
+    def test_cache_key_changes_with_inputs(self):
+        fixed, moving = build_volumes()
+        mask = sitk.GetArrayFromImage(fixed) > 0.5
+        config = Registrator(method='rigid').config
+        key = TransformCache.key(config, fixed, moving, mask, None)
+
+        # A different config field, mask or spacing is a new entry
+        rescaled = sitk.Image(fixed)
+        rescaled.SetSpacing((2.0, 2.0, 2.0))
+        keys = [TransformCache.key(Registrator(method='rigid', sampling_seed=1).config, fixed, moving, mask, None),
+                TransformCache.key(config, fixed, moving, ~mask, None),
+                TransformCache.key(config, rescaled, moving, mask, None)]
+
+        self.assertEqual(key, TransformCache.key(config, fixed, moving, mask, None), "The same inputs should give the same key")
+        for other_key in keys: self.assertNotEqual(key, other_key, "A change of the inputs should give a new key")
+
+    def test_unsupported_method_raises(self):
+        fixed, moving = build_volumes()
+
+        with self.assertRaises(ValueError): Registrator(method='unknown').register(fixed, moving)
+
+    def test_inverse_transform_point_roundtrip(self):
+        # A smooth 2D BSpline (as the suture registration) and an affine transform
+        bspline = sitk.BSplineTransformInitializer(sitk.Image(64, 64, sitk.sitkFloat32), [4, 4])
+        bspline.SetParameters(np.random.default_rng(0).uniform(-3, 3, len(bspline.GetParameters())).tolist())
+        affine = sitk.AffineTransform(3)
+        affine.SetMatrix([1.1, 0.1, 0.0, -0.05, 0.9, 0.1, 0.0, 0.2, 1.0])
+        affine.SetTranslation((3.0, -2.0, 1.5))
+
+        for transform, point in [(bspline, np.array([20.0, 35.0])), (affine, np.array([10.0, 5.0, -4.0]))]:
+            moving_point = np.array(transform.TransformPoint(point.tolist()))
+            self.assertTrue(np.allclose(inverse_transform_point(transform, moving_point), point, atol=1e-3), "The inverse should bring the point back")
+
+    def test_multi_start_keeps_best_start(self):
+        fixed, moving = build_volumes()
+        rotations = axis_rotation_starts(15, 3)
+        registrator = Registrator(method='rigid', numberOfIterations=20, screening_iterations=5, start_survivors=2, start_rotations=rotations, start_processes=2)
+        registrator.register(fixed, moving)
+        starts = registrator.last_registration['starts']
+        final_metrics = [start['final_metric'] for start in starts if start['final_metric'] is not None]
+
+        self.assertEqual([tuple(start['rotation']) for start in starts], rotations, "Every start should be reported")
+        self.assertEqual(len(final_metrics), 2, "Only the survivors should be registered until convergence")
+        self.assertEqual(registrator.last_registration['metric_value'], min(final_metrics), "The start with the best final metric should be kept")
+
+    def test_icp_recovers_rigid_transform(self):
+        # Binary ellipsoid with a bump (so that it has no symmetry), moved by a known rotation and translation
+        z, y, x = np.indices((48, 48, 48))
+        ellipsoid = ((z - 24) / 14) ** 2 + ((y - 24) / 18) ** 2 + ((x - 24) / 10) ** 2 < 1
+        bump = ((z - 32) / 5) ** 2 + ((y - 30) / 5) ** 2 + ((x - 30) / 5) ** 2 < 1
+        fixed = sitk.GetImageFromArray((ellipsoid | bump).astype(np.float32))
+        true_transform = sitk.Euler3DTransform((24, 24, 24), np.radians(10), np.radians(-5), np.radians(20), (3.0, -2.0, 1.0))
+        moving = sitk.Resample(fixed, true_transform.GetInverse(), sitk.sitkNearestNeighbor, 0.0)
+
+        _, transform = Registrator(method='icp').register(fixed, moving)
+        points = np.argwhere(ellipsoid)[::50, ::-1].astype(float)
+        errors = [np.linalg.norm(np.subtract(transform.TransformPoint(point.tolist()), true_transform.TransformPoint(point.tolist()))) for point in points]
+
+        self.assertLess(np.mean(errors), 1.0, "ICP should recover the transform within a voxel")
+
+    def test_rigid_to_sitk_matches_matrix(self):
+        rotation = Rotation.from_euler('xyz', [30, -10, 45], degrees=True).as_matrix()
+        translation, center = np.array([4.0, -3.0, 2.0]), np.array([10.0, 20.0, 5.0])
+        transform = rigid_to_sitk(rotation, translation, center)
+
+        for point in np.random.default_rng(0).uniform(-20, 20, (5, 3)):
+            self.assertTrue(np.allclose(transform.TransformPoint(point.tolist()), rotation @ point + translation), "The SimpleITK transform should apply rotation @ p + translation")
+
+    def test_telemetry_plateau_stops_current_level(self):
+        telemetry = RegistrationTelemetry(plateau_window=3, plateau_tolerance=1e-3)
+        method = mock.MagicMock()
+        telemetry.start()
+
+        # The first level plateaus after a few iterations, the second one keeps improving
+        histories = {0: [-0.5, -0.6, -0.7, -0.7, -0.7, -0.7], 1: [-0.7, -0.8, -0.9, -1.0]}
+        for level, metrics in histories.items():
+            telemetry.start_level()
+            for iteration, metric in enumerate(metrics):
+                method.GetCurrentLevel.return_value, method.GetOptimizerIteration.return_value, method.GetMetricValue.return_value = level, iteration, metric
+                telemetry.record(method)
+            self.assertEqual(method.StopRegistration.call_count, 1, "Only the level on a plateau should be stopped")
+        summary = telemetry.summary()
+
+        self.assertFalse(telemetry.is_plateau(), "The plateau of a previous level should not stop the current one")
+        self.assertEqual([level['plateau'] for level in summary], [True, False], "Only the first level should be on a plateau")
+        self.assertEqual([level['iterations'] for level in summary], [6, 4], "Every iteration should be recorded")
+        self.assertEqual(json.loads(telemetry.to_json())['levels'], json.loads(json.dumps(summary)), "The summary should be exported")
+
+    def test_medical_image_geometry(self):
+        # Anisotropic voxels, flipped first axis and an offset (in RAS, as stored by nibabel)
+        affine = np.array([[-0.5, 0, 0, 10], [0, 0.25, 0, -5], [0, 0, 2, 3], [0, 0, 0, 1]])
+        data = np.random.default_rng(0).random((6, 5, 4))
+
+        with tempfile.TemporaryDirectory() as folder:
+            nib.save(nib.Nifti1Image(data, affine), f"{folder}/image.nii.gz")
+            medical_image = MedicalImage(f"{folder}/image.nii.gz")
+            image = convert_input(medical_image)
+            reference = sitk.ReadImage(f"{folder}/image.nii.gz")
+
+            # The transform cache identifies a medical image by its data and affine
+            config = Registrator(method='rigid').config
+            moved = MedicalImage(f"{folder}/image.nii.gz")
+            moved.nib.affine[:3, 3] += 1
+            keys = [TransformCache.key(config, medical_image), TransformCache.key(config, moved)]
+
+        # The array axes [i, j, k] are the [z, y, x] axes of SimpleITK, in LPS
+        self.assertEqual(image.GetSize(), (4, 5, 6), "The array axes should be reversed")
+        self.assertTrue(np.allclose(image.GetSpacing(), (2, 0.25, 0.5)), "The spacing should follow the affine")
+        self.assertTrue(np.allclose(image.GetOrigin(), (-10, 5, 3)), "The origin should be converted to LPS")
+        self.assertTrue(np.allclose(image.GetDirection(), (0, 0, 1, 0, -1, 0, 1, 0, 0)), "The direction should be converted to LPS")
+        for index in [(0, 0, 0), (5, 1, 3), (2, 4, 1)]:
+            # SimpleITK reads the file with the array axes in the other order, the voxels must be at the same physical points
+            self.assertTrue(np.allclose(image.TransformIndexToPhysicalPoint(index[::-1]), reference.TransformIndexToPhysicalPoint(index)), "The voxels should be where SimpleITK reads them")
+        self.assertNotEqual(keys[0], keys[1], "A different affine should give a new key")
+
+    def test_resample_many_matches_direct_resampling(self):
+        fixed, moving = build_volumes()
+        bspline = sitk.BSplineTransformInitializer(fixed, [4, 4, 4])
+        bspline.SetParameters(np.random.default_rng(0).uniform(-2, 2, len(bspline.GetParameters())).tolist())
+        registrator = Registrator(res_interpolator='linear')
+        resampled = registrator.resample_many(fixed, [moving, fixed], bspline)
+
+        self.assertIsInstance(registrator.resampling_transform(fixed, bspline, 2), sitk.DisplacementFieldTransform, "Two images should be resampled through the field")
+        for image, result in zip([moving, fixed], resampled):
+            direct = sitk.Resample(image, fixed, bspline, sitk.sitkLinear, 0.0)
+            self.assertTrue(np.allclose(sitk.GetArrayFromImage(result), sitk.GetArrayFromImage(direct), atol=1e-5), "The field should resample as the BSpline")
+
+    def test_displacement_field_cost_choice(self):
+        fixed, _ = build_volumes()
+        bspline = sitk.BSplineTransformInitializer(fixed, [4, 4, 4])
+
+        self.assertFalse(use_displacement_field(bspline, fixed, 1), "A single image should be resampled directly")
+        for n_images in (2, 5): self.assertTrue(use_displacement_field(bspline, fixed, n_images), "Several images should use the field")
+        for n_images in (1, 2, 10): self.assertFalse(use_displacement_field(TRUE_TRANSFORM, fixed, n_images), "A rigid transform should never use the field")